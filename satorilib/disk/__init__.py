@@ -3,6 +3,16 @@ from satorilib.disk.model import ModelApi
 from satorilib.disk.wallet import WalletApi
 from satorilib.disk.utils import safetify, safetifyWithResult
 from satorilib.disk.filetypes.csv import CSVManager
+from satorilib.disk.filetypes.segment import SegmentManager
+from satorilib.disk.filetypes.arrow import ArrowManager
+from satorilib.disk.filetypes.parquet import ParquetManager
+from satorilib.disk.filetypes.block import BlockManager
 from satorilib.disk.disk import Disk
+from satorilib.disk.observations import Observations
 from satorilib.disk.cache import Cache, Cached
+from satorilib.disk.registry import CacheRegistry
+from satorilib.disk.wal import WriteAheadLog
+from satorilib.disk.gather import GatherService
+from satorilib.disk.features import FeatureMatrix
+from satorilib.disk.cadence import CadenceViews
 from satorilib.disk.memory import getHashBefore
@@ -2,20 +2,44 @@
 
 from typing import Union
 import os
+import threading
+import numpy as np
 import pandas as pd
 from satorilib import logging
 from satorilib.concepts import StreamId
 from satorilib.utils import memory
 from satorilib.utils.time import datetimeToTimestamp, earliestDate, now
-from satorilib.utils.hash import hashIt, generatePathId, historyHashes, verifyHashes, cleanHashes, verifyRoot, verifyHashesReturnError, verifyHashesReturnLastGood
+from satorilib.utils.hash import hashIt, hashChain, chainInputs, walkChain, generatePathId, historyHashes, verifyHashes, cleanHashes, verifyRoot, verifyHashesReturnError, verifyHashesReturnLastGood, verifyHashesParallel
 from satorilib.disk import Disk
-from satorilib.disk.utils import safetify, safetifyWithResult
+from satorilib.disk.utils import safetify, safetifyWithResult, sidecarPath, timestampsToNanos, timestampToNanos, valuesToFloats
 from satorilib.disk.model import ModelApi
 from satorilib.disk.wallet import WalletApi
 from satorilib.disk.filetypes.csv import CSVManager
+from satorilib.disk.checkpoint import Checkpoints
+from satorilib.disk.merkle import MerkleSummary
+from satorilib.disk.rollup import Rollups
+from satorilib.disk.observations import Observations
+from satorilib.disk.snapshot import Snapshot, timesOf
+from satorilib.disk.transfer import Transfer, importHistory, exportHistory
+from satorilib.disk.gather import GatherService
+from satorilib.disk.cadence import CadenceViews
 from satorilib.concepts import Observation
 
 
+def writes(method):
+    '''
+    cache methods that change its contents (or how they're held) take the
+    cache's lock, so there is one writer at a time. readers don't need it,
+    they read a Snapshot.
+    '''
+    def locked(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    locked.__name__ = method.__name__
+    locked.__doc__ = method.__doc__
+    return locked
+
+
 class CachedResult():
     def __init__(
         self,
@@ -51,37 +75,410 @@ class Cache(Disk):
         id: StreamId = None,
         loc: str = None,
         ext: str = 'csv',
+        compact: bool = False,
         **kwargs,
     ):
+        '''
+        compact - hold the observations as an Observations container until
+        the dataframe is asked for (see compact)
+        '''
+        kwargs['indexEvery'] = kwargs.get('indexEvery', 1000)
+        self.lock = threading.RLock()
+        self._version = 0
+        self._snapshot = None
+        # told whenever our footprint may have changed, see CacheRegistry
+        self.onResize = None
+        self._measured = None
+        self._rowBytes = 100
         super().__init__(df=df, id=id, loc=loc, ext=ext, **kwargs)
+        self._checkpoints = None
+        self._merkle = None
+        self._rollups = None
+        self._moveSidecars()
         self.loadCache()
+        if compact:
+            self.compact()
         self.checkedHash = ''
         self.checkedIndex = None
 
     def __str__(self):
         return f'Cache({self.id}, {self.df.tail()})'
 
+    @property
+    def df(self) -> pd.DataFrame:
+        '''
+        frames are never modified once handed out, a change builds a new one,
+        so what this returns stays consistent while the cache moves on.
+        without the lock we only hand out the frame of the published snapshot,
+        the writer's fields can be half way through a change.
+        '''
+        snapshot = self._snapshot
+        if (
+            snapshot is not None and
+            snapshot.version == self._version and
+            snapshot.observations is None and
+            snapshot.tailLength == 0 and
+            isinstance(snapshot.frame, pd.DataFrame)
+        ):
+            return snapshot.frame
+        with self.lock:
+            if self._evicted is not None:
+                self._reload()
+            if self._compact is not None:
+                self._expand()
+            if len(self._tail) > 0:
+                self._consolidate()
+            return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        self._replace(df)
+
+    def _replace(self, df: Union[pd.DataFrame, None], evicted: tuple = None):
+        ''' swaps in new contents, a new version '''
+        self._df = df
+        self._compact = None
+        self._evicted = evicted
+        self._tail = []
+        self._times = None
+        self._timesBuilt = False
+        self._version += 1
+        self._measured = None
+        self._resized()
+
+    ### snapshots ###
+
+    def snapshot(self) -> Snapshot:
+        '''
+        the current version of the cache, to read from without holding up
+        (or being disturbed by) the writer. usually just a reference read, the
+        first call after a change publishes the new version.
+        '''
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+        with self.lock:
+            if self._snapshot is None or self._snapshot.version != self._version:
+                self._snapshot = self._publish()
+            return self._snapshot
+
+    def _publish(self) -> Snapshot:
+        if self._evicted is not None:
+            self._reload()
+        if len(self._tail) > 1024:
+            # fold a long buffer in so every snapshot doesn't re-read it
+            if self._compact is not None:
+                self.compact()
+            else:
+                self._consolidate()
+        times = self.times
+        prior = self._snapshot
+        # the buffer only grows until it's replaced, earlier rows keep their times
+        tailTimes = (
+            prior._tailTimes
+            if prior is not None and prior.tail is self._tail and
+            isinstance(prior._tailTimes, np.ndarray)
+            else None)
+        if self._compact is not None:
+            compact = self._compact
+            return Snapshot(
+                version=self._version,
+                observations=Observations(
+                    times=compact.times,
+                    values=compact.values,
+                    hashes=compact.hashes,
+                    kinds=compact.kinds,
+                    others=compact.others,
+                    name=compact.name),
+                times=times,
+                tail=self._tail,
+                tailLength=len(self._tail),
+                tailTimes=tailTimes)
+        return Snapshot(
+            version=self._version,
+            frame=self._df,
+            times=times,
+            tail=self._tail,
+            tailLength=len(self._tail),
+            tailTimes=tailTimes)
+
+    ### compact form ###
+
+    @property
+    def isCompact(self) -> bool:
+        return self._compact is not None
+
+    @writes
+    def compact(self) -> bool:
+        '''
+        swaps the dataframe for an Observations container, a fraction of the
+        memory. rowCount, tip, appends and time lookups keep working on it,
+        anything that asks for self.df turns it back into a dataframe. returns
+        False if the data can't be held compactly without losing anything.
+        '''
+        if self._compact is not None:
+            if len(self._tail) > 0 and self._compact.extend(self._tail):
+                self._tail = []
+                self._times = self._compact.times
+                self._measured = self._compact.nbytes
+                self._resized()
+            return len(self._tail) == 0
+        df = self.df
+        if df is None or self.times is None:
+            return False
+        observations = Observations.fromFrame(df)
+        if observations is None:
+            return False
+        self._compact = observations
+        self._df = None
+        self._times = observations.times
+        # same contents, but don't keep the big frame alive through it
+        self._snapshot = None
+        self._measured = observations.nbytes
+        self._resized()
+        return True
+
+    def _expand(self):
+        self._df = self._compact.toFrame()
+        self._compact = None
+        self._measured = None
+        self._resized()
+
+    ### eviction ###
+
+    @property
+    def isEvicted(self) -> bool:
+        return self._evicted is not None
+
+    @property
+    def footprint(self) -> int:
+        '''
+        approximate bytes of observations held in memory. the frame is only
+        measured after it's been replaced, buffered rows are estimated from
+        the size of the rows we measured.
+        '''
+        if self._evicted is not None:
+            return 0
+        if self._measured is None:
+            self._measured, rows = self._measure()
+            if rows > 0:
+                self._rowBytes = max(1, self._measured // rows)
+        return self._measured + len(self._tail) * self._rowBytes
+
+    def _measure(self) -> tuple[int, int]:
+        ''' bytes and rows of what we hold, not counting the buffer '''
+        if self._compact is not None:
+            return self._compact.nbytes, len(self._compact)
+        if not isinstance(self._df, pd.DataFrame) or self._df.empty:
+            return 0, 0
+        # measuring every string is slow, a spread out sample is close enough
+        sample = self._df.iloc[::max(1, self._df.shape[0] // 100)]
+        return int(
+            sample.memory_usage(index=True, deep=True).sum() *
+            self._df.shape[0] / sample.shape[0]), self._df.shape[0]
+
+    def _resized(self):
+        if self.onResize is not None:
+            self.onResize(self)
+
+    @writes
+    def evict(self):
+        '''
+        drops the observations from memory, keeping only the tip and row
+        count. everything we hold is already on disk so the next access that
+        needs more than that just reloads it.
+        '''
+        if self._evicted is not None:
+            return
+        self._replace(None, evicted=(self.tip, self.rowCount, self._compact is not None))
+        self._snapshot = None
+
+    def _reload(self):
+        ''' reads everything back in, swapped in in one step once it's loaded '''
+        _, _, compact = self._evicted
+        self._load()
+        if compact:
+            self.compact()
+
+    def _load(self):
+        stat = self._fileStat()
+        df = self._normalized(self.read())
+        self._stat = stat
+        self.df = df if df is not None else pd.DataFrame()
+
+    ### append buffer ###
+
+    def _consolidate(self):
+        '''
+        observations appended in order are buffered in self._tail as
+        (time, value, hash) tuples, this moves them into the frame in one go.
+        '''
+        tail = self._tail
+        self._tail = []
+        if self._measured is not None:
+            # same rows, now counted as part of the frame
+            self._measured += len(tail) * self._rowBytes
+        frame = pd.DataFrame(
+            {
+                'value': [row[1] for row in tail],
+                'hash': [row[2] for row in tail]},
+            index=pd.Index([row[0] for row in tail], name=self._df.index.name))
+        self._df = pd.concat([self._df, frame])
+        if self._timesBuilt and self._times is not None:
+            self._times = np.concatenate([
+                self._times,
+                timestampsToNanos(frame.index)])
+        else:
+            self._timesBuilt = False
+
+    @property
+    def tip(self) -> Union[tuple[str, object, str], None]:
+        ''' the latest (time, value, hash) without consolidating the buffer '''
+        if len(self._tail) > 0:
+            return self._tail[-1]
+        if self._evicted is not None:
+            return self._evicted[0]
+        if self._compact is not None:
+            return self._compact.row(-1) if len(self._compact) > 0 else None
+        if (
+            not isinstance(self._df, pd.DataFrame) or
+            self._df.empty or
+            'hash' not in self._df.columns
+        ):
+            return None
+        return (
+            self._df.index[-1],
+            self._df['value'].iloc[-1],
+            self._df['hash'].iloc[-1])
+
+    @property
+    def rowCount(self) -> int:
+        if self._evicted is not None:
+            return self._evicted[1]
+        if self._compact is not None:
+            return len(self._compact) + len(self._tail)
+        if not isinstance(self._df, pd.DataFrame):
+            return 0
+        return self._df.shape[0] + len(self._tail)
+
+    def isNewest(self, times: list[str]) -> bool:
+        '''
+        true if these times are in order and all after our latest observation,
+        which means they can simply be appended (the fast path).
+        '''
+        tip = self.tip
+        if (
+            tip is None or
+            self._evicted is not None or
+            (self._compact is None and list(self._df.columns) != ['value', 'hash']) or
+            (len(self._tail) == 0 and self.times is None)
+        ):
+            return False
+        prior = timestampToNanos(tip[0])
+        for time in times:
+            nanos = timestampToNanos(time) if isinstance(time, str) else None
+            if nanos is None or nanos <= prior:
+                return False
+            prior = nanos
+        return True
+
+    @writes
+    def appendNewest(self, rows: list[tuple[str, object, str]]) -> bool:
+        '''
+        fast path: rows are already known to be newer than the tip, so we
+        buffer them, append only them to disk and extend the merkle summary.
+        '''
+        self._tail.extend(rows)
+        self._version += 1
+        self._resized()
+        success = self.csv.append(
+            filePath=self.path(),
+            data=pd.DataFrame(
+                {
+                    'value': [row[1] for row in rows],
+                    'hash': [row[2] for row in rows]},
+                index=[row[0] for row in rows]))
+        if (
+            self._merkle is not None and
+            self._merkle.rows == self.rowCount - len(rows)
+        ):
+            if self._merkle.extend([row[2] for row in rows]) > 0:
+                self._merkle.save(self.sidecarPath('merkle.json'))
+        else:
+            self.updateMerkle()
+        if (
+            self._rollups is None or
+            self._rollups.rows != self.rowCount - len(rows) or
+            self._rollUp(
+                times=[row[0] for row in rows],
+                values=[row[1] for row in rows],
+                tip=(rows[-1][0], rows[-1][2])) is None
+        ):
+            self.updateRollups()
+        return success
+
+    ### time index ###
+
+    @property
+    def times(self) -> Union[np.ndarray, None]:
+        '''
+        sorted int64 epoch nanoseconds parallel to the rows of the cache, built
+        lazily whenever the cache is replaced. None if the index can't be used
+        as one (not timestamps or not in order), then we fall back to masks.
+        '''
+        if self._evicted is not None:
+            self._reload()
+        if not self._timesBuilt:
+            self._times = timesOf(self._df)
+            self._timesBuilt = True
+        return self._times
+
+    def positionsOf(self, time: str) -> Union[tuple[int, int], None]:
+        '''
+        the range of rows [first, last) whose time equals the given time, so
+        first is also the number of rows before it. None if we can't bisect.
+        '''
+        return self.snapshot().positionsOf(time)
+
+    def contains(self, time: str) -> bool:
+        ''' true if this exact timestamp is in the cache '''
+        return self.snapshot().contains(time)
+
+    def between(self, start: str = None, end: str = None) -> pd.DataFrame:
+        ''' rows from start (inclusive) to end (exclusive) as a slice '''
+        return self.snapshot().between(start, end)
+
     ### passthru ###
 
+    @writes
     def clearCache(self):
         self.df = pd.DataFrame()
 
+    @writes
     def updateCacheSimple(self, df: pd.DataFrame) -> pd.DataFrame:
         if df is None:
             return self.df
         self.df = df
         return self.df
 
-    def updateCache(self, df: pd.DataFrame) -> pd.DataFrame:
+    @staticmethod
+    def _normalized(df: Union[pd.DataFrame, None]) -> Union[pd.DataFrame, None]:
+        ''' deduped (the last one wins) and sorted '''
         if df is None:
-            return self.df
+            return None
         name = df.index.name or 'index'
-        self.df = (
+        return (
             df
             .reset_index()
             .drop_duplicates(subset=[name], keep='last')
             .set_index(name)
             .sort_index())
+
+    @writes
+    def updateCache(self, df: pd.DataFrame) -> pd.DataFrame:
+        if df is None:
+            return self.df
+        self.df = self._normalized(df)
         return self.df
 
     def updateCacheShowDifference(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -124,19 +521,11 @@ class Cache(Disk):
         after: bool = False,
         exact: bool = False
     ) -> pd.DataFrame:
-        if (
-            not isinstance(time, str) or
-            not any([before, after, exact]) or
-            self.df is None
-        ):
-            return None
-        if before:
-            return self.df[self.df.index < time]
-        if after:
-            return self.df[self.df.index > time]
-        if exact:
-            return self.df[self.df.index == time]
-        return None
+        return self.snapshot().search(
+            time,
+            before=before,
+            after=after,
+            exact=exact)
 
     ### helpers ###
 
@@ -157,16 +546,42 @@ class Cache(Disk):
         C:\\Users\\user\\AppData\\Local\\Satori\\data\\qZk-NkcGgWq6PiVxeFDCbJzQ2J0=\\aggregate.csv
         C:\\Users\\user\\AppData\\Local\\Satori\\data\\qZk-NkcGgWq6PiVxeFDCbJzQ2J0=\\incrementals\\6c0a15fcfa1c4535ab1da046cc1b5dc8.parquet
         '''
-        return (
-            self.safetify(
-                os.path.join(
-                    self.loc or Cache.config.dataPath(),
-                    generatePathId(streamId=self.id),
-                    filename or f'aggregate.{self.ext}')))
+        return self.safetify(self.pathOf(
+            streamId=self.id,
+            loc=self.loc,
+            filename=filename or f'aggregate.{self.ext}'))
+
+    @staticmethod
+    def pathOf(streamId: StreamId, loc: str = None, filename: str = 'aggregate.csv') -> str:
+        ''' where path puts a stream's file, without creating anything '''
+        return os.path.join(
+            loc or Cache.config.dataPath(),
+            generatePathId(streamId=streamId),
+            filename)
 
     def exists(self, filename: str = None):
         return os.path.exists(self.path(filename=filename))
 
+    def sidecarPath(self, filename: str) -> str:
+        '''
+        our own state about the stream (merkle summary, rollups, checkpoints),
+        kept out of the stream's folder so the folder's hash depends only on
+        the data (see disk.utils.sidecarPath).
+        '''
+        return sidecarPath(self.path(), filename)
+
+    def _moveSidecars(self):
+        ''' older versions kept the sidecars in the stream's folder '''
+        for filename in (
+            'merkle.json', 'rollups.npz', 'checkpoints.json',
+            f'{os.path.basename(self.path())}.idx',
+        ):
+            if self.exists(filename):
+                try:
+                    os.replace(self.path(filename=filename), self.sidecarPath(filename))
+                except Exception as _:
+                    pass
+
     def hashDataFrame(self, df: pd.DataFrame = None, priorRowHash: str = '') -> pd.DataFrame:
         ''' first we have to flattent the columns, then rename them '''
         return historyHashes(
@@ -186,14 +601,36 @@ class Cache(Disk):
         ''' passthrough for hashing verification '''
         return verifyHashesReturnLastGood(df=df if isinstance(df, pd.DataFrame) else self.df, priorRowHash=priorRowHash)
 
+    def verifyHashesParallel(self, df: pd.DataFrame = None, priorRowHash: str = '', workers: int = None) -> tuple[bool, Union[pd.DataFrame, pd.Series, None]]:
+        ''' full audit split at our checkpoints and verified in a process pool '''
+        return verifyHashesParallel(
+            df=df if isinstance(df, pd.DataFrame) else self.df,
+            priorRowHash=priorRowHash,
+            boundaries=(
+                [p[2] for p in self.checkpoints.points]
+                if not isinstance(df, pd.DataFrame) else None),
+            workers=workers)
+
     def cleanByHashes(self, df: pd.DataFrame = None) -> tuple[bool, Union[pd.DataFrame, None]]:
-        ''' passthrough for hash cleaning '''
-        return cleanHashes(df=df if isinstance(df, pd.DataFrame) else self.df)
+        ''' passthrough for hash cleaning, skipped if the chain is intact '''
+        df = df if isinstance(df, pd.DataFrame) else self.df
+        if not df.empty and self.verifyHashesParallel(df=df)[0]:
+            return True, df
+        return cleanHashes(df=df)
 
     def isARoot(self, df: pd.DataFrame) -> bool:
         ''' checks if the dataframe is a root '''
         return cleanHashes(df)[0]
 
+    def divergesFrom(self, other: Union[MerkleSummary, dict]) -> Union[int, None]:
+        '''
+        compares our merkle summary with another copy of this stream, returns
+        the first row from which they may differ or None if they're the same.
+        '''
+        if isinstance(other, dict):
+            other = MerkleSummary.fromJson(other)
+        return self.merkle.firstDivergence(other)
+
     def hasRoot(self, df: pd.DataFrame) -> bool:
         if df is None or (isinstance(df, pd.DataFrame) and df.empty):
             return False
@@ -242,17 +679,24 @@ class Cache(Disk):
         if success == False and isinstance(result, pd.DataFrame):
             return self.overwrite(result)
 
+    @writes
     def overwrite(self, df: pd.DataFrame) -> bool:
         return self.csv.write(
             filePath=self.path(),
             data=self.updateCache(df))
 
+    @writes
     def write(self, df: pd.DataFrame = None) -> bool:
-        return self.csv.write(
+        success = self.csv.write(
             filePath=self.path(),
             data=self.updateCache(self.hashDataFrame(
                 self.updateCache(df) if df is not None else self.df)))
+        if success:
+            # we just hashed everything so the whole chain is valid
+            self.modifyBasedValidation(True)
+        return success
 
+    @writes
     def merge(self, df: pd.DataFrame) -> bool:
         ''' appends to the end of the file while also hashing '''
         if df is None or df.shape[0] == 0 or 'value' not in df.columns:
@@ -266,21 +710,48 @@ class Cache(Disk):
             self.loadCache()
             if self.df.empty:
                 return self.write(df)
-        self.df.update(df)  # update existing entries
-        self.df = self.df.combine_first(df)  # add rows that are not in self.df
+        rewritten = self._rewriteFrom(df, update=True)
+        if rewritten is not None:
+            return rewritten
+        updated = self.df.copy()  # frames we've handed out are never modified
+        updated.update(df)  # update existing entries
+        self.df = updated.combine_first(df)  # add rows that are not in self.df
         return self.write(self.df)
 
+    @writes
     def append(self, df: pd.DataFrame, hashThis: bool = False) -> bool:
         ''' appends to the end of the file while also hashing '''
-        if self.df.empty:
+        # self.df would fold the tail in on every append
+        if self.rowCount == 0:
             self.loadCache()
-            if self.df.empty:
+            if self.rowCount == 0:
                 return self.write(df)
         if df is None or df.shape[0] == 0 or len(df.columns) > 2:
             return False
-        if all([i in self.df.index for i in df.index]):
+        if (
+            'value' in df.columns and
+            df.index.is_unique and
+            self.isNewest(df.index.tolist())
+        ):
+            times = [str(i) for i in df.index]
+            values = df['value'].tolist()
+            if 'hash' in df.columns:
+                hashes = df['hash'].tolist()
+            elif hashThis:
+                hashes = hashChain(
+                    times=times,
+                    values=[str(v) for v in values],
+                    priorRowHash=self.tip[2])
+            else:
+                hashes = [''] * len(times)
+            return self.appendNewest(list(zip(times, values, hashes)))
+        if all([self.contains(i) for i in df.index]):
             return False
         df = df.sort_index()
+        if 'hash' not in df.columns and hashThis:
+            rewritten = self._rewriteFrom(df.assign(hash=''))
+            if rewritten is not None:
+                return rewritten
         if 'hash' not in df.columns:
             if hashThis:
                 df = self.hashDataFrame(
@@ -289,10 +760,82 @@ class Cache(Disk):
             else:
                 df['hash'] = ''
         combined = pd.concat([self.df, df])
-        return self.csv.append(
+        success = self.csv.append(
             filePath=self.path(),
             data=self.updateCacheShowDifference(combined))
+        self.updateMerkle()
+        return success
 
+    def _rewriteFrom(self, df: pd.DataFrame, update: bool = False) -> Union[bool, None]:
+        '''
+        puts rows in place that don't all come after the tip. everything from
+        the earliest of them on is merged and rehashed starting from the hash
+        of the row before it, the rows before it are left alone. on disk the
+        file is cut off at that row and the new suffix appended, if the file
+        lines up with the cache, otherwise it is rewritten.
+        update merges like merge does (new values fill in existing rows),
+        otherwise new rows replace existing rows at the same time. returns
+        None if the cache can't be bisected, the caller does it the long way.
+        '''
+        snapshot = self.snapshot()
+        df = df.sort_index()
+        positions = snapshot.positionsOf(str(df.index[0]))
+        if positions is None or snapshot.rowCount == 0:
+            return None
+        first = positions[0]
+        rows = snapshot.rowCount
+        suffix = snapshot.slice(first)
+        if update:
+            suffix = suffix.copy()
+            suffix.update(df)
+            suffix = suffix.combine_first(df)
+        else:
+            suffix = pd.concat([suffix, df])
+            suffix = suffix[~suffix.index.duplicated(keep='last')].sort_index()
+        suffix = self.hashDataFrame(
+            df=suffix[['value', 'hash']].copy(),
+            priorRowHash=(
+                snapshot.slice(first - 1, first)['hash'].iloc[0]
+                if first > 0 else ''))
+        checked = (
+            snapshot.positionsOf(str(self.checkedIndex))
+            if self.checkedIndex is not None else None)
+        # the rows before were verified, so now all of them are
+        verified = first == 0 or (checked is not None and checked[1] >= first)
+        compact = self.isCompact
+        self.df = pd.concat([snapshot.slice(0, first), suffix])
+        if compact:
+            self.compact()
+        if (
+            hasattr(self.csv, 'truncate') and
+            self.csv.mirrors(filePath=self.path(), rows=rows) and
+            self.csv.truncate(filePath=self.path(), row=first)
+        ):
+            success = self.csv.append(filePath=self.path(), data=suffix)
+        else:
+            success = self.csv.write(filePath=self.path(), data=self.df)
+        path = self.sidecarPath('merkle.json')
+        if self._merkle is None:
+            self._merkle = MerkleSummary.load(path) or MerkleSummary()
+        kept = self._merkle.truncate(first)
+        self._merkle.extend(self.snapshot().slice(kept)['hash'].tolist())
+        self._merkle.save(path)
+        times = self.times
+        if self._rollups is None:
+            self._rollups = Rollups.load(self.sidecarPath('rollups.npz'))
+        if self._rollups is not None and times is not None:
+            # only the buckets from the first changed row's on are redone
+            cut = self._rollups.truncate(times[first])
+            self._rollups.rows = int(np.searchsorted(times, cut, side='left'))
+            self._rollups.tip = (
+                self._tipOf(self.snapshot().slice(self._rollups.rows - 1, self._rollups.rows))
+                if self._rollups.rows > 0 else None)
+        self.updateRollups()
+        if verified:
+            self.modifyBasedValidation(True)
+        return success
+
+    @writes
     def appendByAttributes(
         self,
         value: str,
@@ -305,12 +848,31 @@ class Cache(Disk):
         returns success and timestamp and observationHash
         '''
         timestamp = timestamp or datetimeToTimestamp(now())
-        if timestamp in self.df.index:
+        if self.isNewest([timestamp]):
+            return self.appendNewestByAttributes(
+                value=value,
+                timestamp=timestamp,
+                observationHash=observationHash,
+                hashThis=hashThis)
+        if self.contains(timestamp):
             return CachedResult(
                 success=False,
                 time=timestamp,
                 hash=observationHash,
                 data=value)
+        if hashThis and observationHash is None and self.rowCount > 0:
+            success = self._rewriteFrom(pd.DataFrame(
+                {'value': [value], 'hash': ['']},
+                index=[timestamp]))
+            if success is not None:
+                validated, validatedFrame = self.performValidation()
+                return CachedResult(
+                    time=timestamp,
+                    data=value,
+                    hash=self.search(timestamp, exact=True)['hash'].iloc[-1],
+                    success=success,
+                    validated=validated,
+                    validatedFrame=validatedFrame)
         observationHash = observationHash or (
             hashIt(self.getHashBefore(timestamp) + str(timestamp) + str(value))
             if hashThis else '')
@@ -328,7 +890,8 @@ class Cache(Disk):
                     validated=True)
         success = self.csv.append(
             filePath=self.path(),
-            data=self.updateCacheShowDifference(pd.concat([self.df, df]))),
+            data=self.updateCacheShowDifference(pd.concat([self.df, df])))
+        self.updateMerkle()
         validated, validatedFrame = self.performValidation()
         return CachedResult(
             time=timestamp,
@@ -338,24 +901,172 @@ class Cache(Disk):
             validated=validated,
             validatedFrame=validatedFrame)
 
+    def appendNewestByAttributes(
+        self,
+        value: str,
+        timestamp: str,
+        observationHash: str = None,
+        hashThis: bool = False,
+    ) -> CachedResult:
+        '''
+        fast path of appendByAttributes for an observation newer than the tip.
+        only this row is hashed, written and validated. once the chain is known
+        good through it, it's where the next one is checked from.
+        '''
+        priorTime, _, priorRowHash = self.tip
+        observationHash = observationHash or (
+            hashIt(priorRowHash + str(timestamp) + str(value))
+            if hashThis else '')
+        if self.checkedIndex is not None and self.checkedIndex == priorTime:
+            validated = (
+                hashIt(self.checkedHash + str(timestamp) + str(value)) ==
+                observationHash)
+            validatedFrame = None
+            success = self.appendNewest([(timestamp, value, observationHash)])
+        else:
+            success = self.appendNewest([(timestamp, value, observationHash)])
+            validated, validatedFrame = self.performValidation()
+        if success and validated:
+            self.checkedIndex, self.checkedHash = timestamp, observationHash
+        return CachedResult(
+            time=timestamp,
+            data=value,
+            hash=observationHash,
+            success=success,
+            validated=validated,
+            validatedFrame=validatedFrame)
+
     def performValidation(self, entire: bool = False) -> tuple[bool, Union[pd.DataFrame, None]]:
         ''' validates the hashes (efficiently using cached) returns results'''
-        if self.df.empty:
+        if self.rowCount == 0:
             return True, None
         if entire:
-            success, df = self.validateAllHashes()
+            success, df = self.verifyHashesParallel()
+            if success:
+                df = None
+        elif self.checkedIndex is None:
+            success, df = self.resumeValidation()
         else:
             success, df = self.validateAllHashes(
-                df=(self.df[self.df.index > self.checkedIndex]
-                    if self.checkedIndex is not None else None),
+                df=self.search(str(self.checkedIndex), after=True),
                 priorRowHash=self.checkedHash)
         return success, df
 
+    def resumeValidation(self) -> tuple[bool, Union[pd.DataFrame, None]]:
+        ''' validates from the newest persisted checkpoint that still matches '''
+        count, priorRowHash = self.checkpoints.resume(self.df)
+        success, df = self.validateAllHashes(
+            df=self.df.iloc[count:],
+            priorRowHash=priorRowHash)
+        if not success and df is None and count > 0:
+            df = self.df.iloc[[count-1]]
+        return success, df
+
+    def updateMerkle(self) -> bool:
+        '''
+        catches the merkle summary up with the cache, rebuilding it if the
+        history it summarized has changed. persists when a block completes.
+        '''
+        path = self.sidecarPath('merkle.json')
+        if self._merkle is None:
+            self._merkle = MerkleSummary.load(path) or MerkleSummary()
+        hashes = (
+            self.df['hash'] if 'hash' in self.df.columns
+            else pd.Series(dtype='object'))
+        rows = self._merkle.rows
+        rebuilt = (
+            rows > hashes.shape[0] or
+            (rows > 0 and hashes.iloc[rows-1] != self._merkle.tipHash))
+        if rebuilt:
+            self._merkle = MerkleSummary(blockSize=self._merkle.blockSize)
+            rows = 0
+        completed = self._merkle.extend(hashes.iloc[rows:].tolist())
+        if rebuilt or completed > 0:
+            return self._merkle.save(path)
+        return False
+
+    @staticmethod
+    def _tipOf(df: pd.DataFrame) -> Union[tuple[str, str], None]:
+        ''' the (time, hash) of the last row, how the rollups know where they end '''
+        if df is None or df.empty:
+            return None
+        return (str(df.index[-1]), df['hash'].iloc[-1] if 'hash' in df.columns else '')
+
+    def _rollUp(self, times: list, values: list, tip: tuple[str, str]) -> Union[int, None]:
+        ''' folds rows after the rollups' tip into them, persisted every so many buckets '''
+        completed = self._rollups.extend(
+            times=timestampsToNanos(times),
+            values=valuesToFloats(values),
+            tip=tip)
+        if completed is not None and completed > 0:
+            self._rollups.saveIfDue(self.sidecarPath('rollups.npz'))
+        return completed
+
+    @writes
+    def updateRollups(self) -> bool:
+        '''
+        catches the rollups up with the cache, rebuilding them if the history
+        they summarized has changed.
+        '''
+        path = self.sidecarPath('rollups.npz')
+        if self._rollups is None:
+            self._rollups = Rollups.load(path) or Rollups()
+        snapshot = self.snapshot()
+        rows = self._rollups.rows
+        if rows <= snapshot.rowCount and (
+            rows == 0 or
+            self._rollups.tip == self._tipOf(snapshot.slice(rows - 1, rows))
+        ):
+            if rows == snapshot.rowCount:
+                return False
+            df = snapshot.slice(rows)
+            completed = self._rollups.extend(
+                times=timestampsToNanos(df.index),
+                values=valuesToFloats(df['value']),
+                tip=self._tipOf(df))
+            if completed is not None:
+                # catching up is rare, after a load or a rewrite, saved right away
+                if completed > 0:
+                    self._rollups.save(path)
+                return True
+        df = snapshot.df
+        self._rollups = Rollups.build(
+            times=timestampsToNanos(df.index),
+            values=valuesToFloats(df.get('value', pd.Series(dtype='float64'))),
+            tip=self._tipOf(df),
+            resolutions=self._rollups.resolutions)
+        return self._rollups.save(path)
+
+    def saveCheckpoints(self) -> bool:
+        ''' records the entire cache as verified, persists if worthwhile '''
+        tip = self.tip
+        if tip is not None and self.checkpoints.advance(
+            time=str(tip[0]),
+            hash=tip[2],
+            count=self.rowCount,
+        ):
+            return False
+        if self._compact is not None and self.compact():
+            changed = self.checkpoints.recordRows(
+                len(self._compact),
+                lambda i: self._compact.row(i)[0::2])
+        else:
+            changed = self.checkpoints.record(self.df)
+        if changed:
+            return self.checkpoints.save(self.sidecarPath('checkpoints.json'))
+        return False
+
+    @writes
     def modifyBasedValidation(self, success: bool, df: Union[pd.DataFrame, None] = None):
         ''' modification done separately '''
         if success:
-            self.checkedHash = self.df.iloc[-1].hash
-            self.checkedIndex = self.df.index[-1]
+            tip = self.tip
+            if tip is None:
+                self.checkedHash = ''
+                self.checkedIndex = None
+                return success
+            self.checkedIndex, _, self.checkedHash = tip
+            self.saveCheckpoints()
         else:
             # logging.debug('validation failed', df, color='yellow')
             if df is None or df.empty:
@@ -367,33 +1078,215 @@ class Cache(Disk):
                 self.checkedIndex = df.index[-1]
         return success
 
+    @writes
     def clear(self) -> Union[bool, None]:
         self.updateCacheSimple(self.df[0:0])
         self.csv.write(filePath=self.path(), data=self.df)
 
+    @writes
     def remove(self) -> Union[bool, None]:
         self.csv.remove(filePath=self.path())
         self.clearCache()
 
+    @writes
     def removeItAndAfter(self, timestamp) -> Union[bool, None]:
+        rows = self.rowCount
         self.updateCacheSimple(self.df[self.df.index < timestamp])
+        if (
+            hasattr(self.csv, 'truncate') and
+            self.csv.mirrors(filePath=self.path(), rows=rows) and
+            self.csv.truncate(filePath=self.path(), row=self.rowCount)
+        ):
+            # the kept rows are a prefix of the file, just cut it off
+            return True
         self.csv.write(filePath=self.path(), data=self.df)
 
+    @writes
     def removeItAndBefore(self, timestamp) -> Union[bool, None]:
         self.updateCacheSimple(self.df[self.df.index > timestamp])
         self.csv.write(filePath=self.path(), data=self.df)
 
     ### read ###
 
+    @property
+    def checkpoints(self) -> Checkpoints:
+        if self._checkpoints is None:
+            self._checkpoints = Checkpoints.load(
+                self.sidecarPath('checkpoints.json'))
+        return self._checkpoints
+
+    @property
+    def merkle(self) -> MerkleSummary:
+        ''' merkle summary of our hash column, kept in step with the cache '''
+        self.updateMerkle()
+        return self._merkle
+
+    @property
+    def rollups(self) -> Rollups:
+        ''' per bucket statistics of our values, kept in step with the cache '''
+        self.updateRollups()
+        return self._rollups
+
+    def rollup(self, resolution: int = 60*60, start: str = None, end: str = None) -> pd.DataFrame:
+        ''' count, sum, min, max, last and mean per bucket of resolution seconds '''
+        with self.lock:
+            return self.rollups.query(resolution=resolution, start=start, end=end)
+
     @property
     def cache(self) -> pd.DataFrame:
         if self.df.empty:
             self.loadCache()
         return self.df
 
+    @writes
     def loadCache(self) -> pd.DataFrame:
+        self._stat = self._fileStat()
         return self.updateCache(self.read())
 
+    @writes
+    def importFrom(self, source: str, chunkRows: int = 100000) -> Transfer:
+        '''
+        replaces this stream's history with a csv history (an export from a
+        peer), streamed beside our file a chunk at a time and verified as it
+        goes. only a complete history replaces ours, then nothing is loaded,
+        the cache stays evicted until it's needed (see disk/transfer.py).
+        '''
+        compact = self.isCompact or (self._evicted is not None and self._evicted[2])
+        # from the sidecar, asking self.merkle would load an evicted cache
+        merkle = MerkleSummary(blockSize=(
+            self._merkle or
+            MerkleSummary.load(self.sidecarPath('merkle.json')) or
+            MerkleSummary()).blockSize)
+        rollups = Rollups(resolutions=(self._rollups or Rollups()).resolutions)
+
+        def onChunk(chunk: pd.DataFrame):
+            merkle.extend(chunk['hash'].tolist())
+            rollups.extend(
+                times=timestampsToNanos(chunk.index),
+                values=valuesToFloats(chunk['value']),
+                tip=self._tipOf(chunk))
+
+        transfer = importHistory(
+            source=source,
+            manager=self.csv,
+            filePath=self.path(),
+            chunkRows=chunkRows,
+            onChunk=onChunk)
+        if transfer.rows == 0 or not transfer.complete:
+            return transfer
+        self._merkle = merkle
+        self._merkle.save(self.sidecarPath('merkle.json'))
+        self._rollups = rollups
+        self._rollups.save(self.sidecarPath('rollups.npz'))
+        self._replace(None, evicted=(transfer.tip, transfer.rows, compact))
+        self._snapshot = None
+        self._stat = self._fileStat()
+        self.checkedIndex, _, self.checkedHash = transfer.tip
+        return transfer
+
+    def exportTo(self, destination: str, chunkRows: int = 100000) -> Transfer:
+        ''' writes our history to a csv a chunk at a time, from disk not memory '''
+        return exportHistory(
+            manager=self.csv,
+            filePath=self.path(),
+            destination=destination,
+            chunkRows=chunkRows)
+
+    ### external changes ###
+
+    def _fileStat(self) -> Union[tuple[int, int], None]:
+        try:
+            stat = os.stat(self.path())
+            return stat.st_size, stat.st_mtime_ns
+        except Exception as _:
+            return None
+
+    def _reloadEntirely(self) -> None:
+        compact = self.isCompact
+        self._load()
+        if compact:
+            self.compact()
+        self.checkedHash = ''
+        self.checkedIndex = None
+        return None
+
+    @writes
+    def refresh(self) -> Union[int, None]:
+        '''
+        picks up rows another process (or a sync) appended to our file since
+        we last looked. a size and mtime check tells us if anything changed,
+        then if the row we hold as the tip is still where we left it only the
+        appended rows are read (using the csv line index) and checked against
+        our tip hash. rows that break the chain are left out. returns the
+        number of rows added, or None if the file was rewritten and we had to
+        reload it entirely.
+        '''
+        stat = self._fileStat()
+        if stat is None or stat == getattr(self, '_stat', None):
+            return 0
+        self._stat = stat
+        rows = self.rowCount
+        tip = self.tip
+        index = (
+            self.csv.lineIndex(self.path())
+            if hasattr(self.csv, 'lineIndex') else None)
+        if (
+            index is None or
+            not index.ordered or
+            tip is None or
+            index.rows < rows
+        ):
+            return self._reloadEntirely()
+        last = self.csv.readLines(filePath=self.path(), start=rows - 1)
+        if (
+            last is None or
+            last.shape[0] != 1 or
+            str(last.index[0]) != str(tip[0]) or
+            'hash' not in last.columns or
+            last['hash'].iloc[0] != tip[2]
+        ):
+            return self._reloadEntirely()
+        if index.rows == rows:
+            return 0
+        appended = self.csv.readLines(
+            filePath=self.path(),
+            start=rows,
+            end=index.rows)
+        if appended is None or 'hash' not in appended.columns:
+            return self._reloadEntirely()
+        times, values = chainInputs(appended)
+        bad, _ = walkChain(
+            times=times,
+            values=values,
+            hashes=appended['hash'].tolist(),
+            priorRowHash=tip[2])
+        if bad is not None:
+            logging.warning(
+                f'{appended.shape[0] - bad} appended rows of {self.id} fail the hash check',
+                print=True)
+            appended = appended.iloc[:bad]
+        if appended.empty:
+            return 0
+        wasChecked = self.checkedIndex is not None and self.checkedIndex == tip[0]
+        self._tail.extend(zip(
+            times[:appended.shape[0]],
+            appended['value'].tolist(),
+            appended['hash'].tolist()))
+        self._version += 1
+        self._resized()
+        if self._merkle is not None and self._merkle.rows == rows:
+            if self._merkle.extend(appended['hash'].tolist()) > 0:
+                self._merkle.save(self.sidecarPath('merkle.json'))
+        if self._rollups is not None and self._rollups.rows == rows:
+            self._rollUp(
+                times=appended.index,
+                values=appended['value'],
+                tip=self._tipOf(appended))
+        if wasChecked:
+            # the chain was verified up to the tip and on from it just now
+            self.checkedIndex, _, self.checkedHash = self.tip
+        return appended.shape[0]
+
     def read(self, start: int = None, end: int = None) -> Union[pd.DataFrame, None]:
         if not self.exists():
             return None
@@ -405,12 +1298,12 @@ class Cache(Disk):
         return self.csv.read(filePath=self.path())
 
     def timeExistsInAggregate(self, time: str) -> bool:
-        return isinstance(self.df, pd.DataFrame) and time in self.df.index
+        return isinstance(self.df, pd.DataFrame) and self.contains(time)
 
     def getRowCounts(self) -> int:
         ''' returns number of rows in incremental and aggregate tables '''
         if isinstance(self.df, pd.DataFrame):
-            return self.df.shape[0]
+            return self.rowCount
         try:
             df = self.read()
             if isinstance(df, pd.DataFrame):
@@ -420,30 +1313,45 @@ class Cache(Disk):
 
     def getHashBefore(self, time: str) -> str:
         ''' gets the hash of the observation just before a given time '''
-        rows = self.search(time, before=True)
+        snapshot = self.snapshot()
+        positions = snapshot.positionsOf(time)
+        if positions is not None:
+            first, _ = positions
+            return snapshot.slice(first-1, first)['hash'].iloc[0] if first > 0 else ''
+        rows = snapshot.search(time, before=True)
         if rows is None or rows.empty:
             return ''
         return rows.iloc[-1].hash
 
     def getObservationAfter(self, time: str) -> pd.DataFrame:
         ''' gets the observation just after a given time '''
-        rows = self.search(time, after=True)
+        snapshot = self.snapshot()
+        positions = snapshot.positionsOf(time)
+        if positions is not None:
+            _, last = positions
+            return snapshot.slice(last, last+1)
+        rows = snapshot.search(time, after=True)
         if rows.empty:
             return rows
         return rows.iloc[[0]]
 
     def getObservationBefore(self, time: str) -> pd.DataFrame:
         ''' gets the observation just before a given time '''
-        rows = self.search(time, before=True)
+        snapshot = self.snapshot()
+        positions = snapshot.positionsOf(time)
+        if positions is not None:
+            first, _ = positions
+            return snapshot.slice(max(first-1, 0), first)
+        rows = snapshot.search(time, before=True)
         if rows.empty:
             return rows
         return rows.iloc[[-1]]
 
     def getLatestObservationTime(self) -> str:
         ''' gets most recent time '''
-        if self.df is None or self.df.empty:
-            return datetimeToTimestamp(earliestDate())
-        return self.df.sort_index().index.values[-1]
+        return (
+            self.snapshot().latestTime() or
+            datetimeToTimestamp(earliestDate()))
 
     def gather(
         self,
@@ -460,43 +1368,51 @@ class Cache(Disk):
                 target=(
                     self.df.columns.levels[3]
                     if len(self.df.columns.levels) == 4 else None))]
-        dfs = []
-        for streamId in streamIds:
-            df = (self if streamId == self.id else Cache(id=streamId)).read()
-            if df is None:
-                continue
-            dfs.append(self.memory.expand(df=df, streamId=streamId))
-        if len(dfs) == 0:
-            return None
-        if len(dfs) == 1:
-            return dfs[0]
-        return self.memory.merge(dfs=dfs, targetColumn=targetColumn)
+        return GatherService.instance().gather(
+            targetColumn=targetColumn,
+            streamIds=streamIds,
+            caches={self.id: self})
+
+    def resampled(self, cadence: float, offset: float = 0) -> pd.DataFrame:
+        ''' this stream on a regular grid, see CadenceViews '''
+        return CadenceViews.instance().resampled(
+            streamId=self.id,
+            cadence=cadence,
+            offset=offset,
+            cache=self)
 
 
 class Cached:
-    '''requires self.streamId attribute to be set'''
+    '''
+    requires self.streamId attribute to be set. in a neuron the caches are
+    the neuron's (so there's one Cache, one writer, per stream), elsewhere
+    they come from the process wide CacheRegistry.
+    '''
+
+    @staticmethod
+    def _cacheOf(streamId: StreamId) -> Cache:
+        # circular import if outside this function. but it's ok here because
+        # we take care to never call this function on imports or inits.
+        # holding on to what we get is fine, the registry may evict it but it
+        # reloads itself when it's next read.
+        try:
+            from satorineuron.init.start import getStart
+        except ImportError as _:
+            getStart = None
+        if getStart is not None:
+            return getStart().cacheOf(streamId)
+        from satorilib.disk.registry import CacheRegistry
+        return CacheRegistry.instance().cacheOf(streamId)
 
     def diskOf(self, streamId: StreamId) -> Cache:
         if not hasattr(self, '_diskOf') or self._diskOf is None or streamId != self._diskOf.id:
-            from satorineuron.init.start import getStart
-            self._diskOf = getStart().cacheOf(streamId)
+            self._diskOf = self._cacheOf(streamId)
         return self._diskOf
 
     @property
     def disk(self):
         if not hasattr(self, '_disk') or self._disk is None or self.streamId != self._disk.id:
-            # circular import if outside this function. but it's ok here because
-            # we take care to never call this function on imports or inits. and
-            # this class is only used outside satorilib, such as in satorineuron
-            # and satoriengine (which shouldn't import from neuron either, but
-            # must in order to get the start singleton).
-            from satorineuron.init.start import getStart
-            self._disk = getStart().cacheOf(self.streamId)
-            if not hasattr(self, '_disk') or self._disk is None:
-                # logging.error(
-                #    'self.disk for this stream missing, subscribed',
-                #    self.streamId, self.streamId.generateHash)
-                pass
+            self._disk = self._cacheOf(self.streamId)
         return self._disk
 
     @property
@@ -0,0 +1,217 @@
+'''
+streams resampled onto a regular grid, kept up to date as they grow.
+
+anything that wants a stream at regular intervals used to resample (or outer
+join and ffill, like Memory.mergeAllTime) its entire history each time. a
+CadenceView is a stream on the grid of its cadence: the epoch plus the offset
+plus every multiple of the cadence (both in seconds), from the stream's first
+observation to its latest. each grid point gets the latest value at or before
+it, so the view never looks ahead. the grid is found with one searchsorted over
+the stream's sorted timestamps.
+
+CadenceViews keeps a view per (stream, cadence, offset). when a stream has only
+grown since its view was made, the view is extended with the new rows, nothing
+before them is looked at again. if anything else changed, it's rebuilt.
+
+values are floats, anything non-numeric is NaN.
+'''
+from typing import Union
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from satorilib.concepts import StreamId, Stream
+from satorilib.disk.utils import timestampsToNanos, valuesToFloats
+from satorilib.disk.snapshot import Snapshot
+from satorilib.disk.gather import arraysOf
+
+
+class CadenceView():
+    ''' one stream on one cadence grid '''
+
+    def __init__(self, cadence: float, offset: float = 0):
+        '''
+        cadence - seconds between grid points
+        offset - seconds the grid is shifted from multiples of the cadence
+        '''
+        self.cadence = int(round(cadence * 1e9))
+        self.offset = int(round((offset or 0) * 1e9)) % self.cadence
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.times = np.empty(0, dtype='int64')
+        self.values = np.empty(0, dtype='float64')
+        self.count = 0
+        # what the view was made from: rows, the tip and its time, the first
+        # observation's time and the latest value
+        self.rowCount = 0
+        self.tip: Union[tuple[str, object, str], None] = None
+        self.tipTime = np.iinfo('int64').min
+        self.start = np.iinfo('int64').min
+        self.lastValue = np.nan
+
+    def __len__(self) -> int:
+        return self.count
+
+    def gridBetween(self, start: int, end: int) -> np.ndarray:
+        ''' the grid points from start to end (inclusive), in epoch nanoseconds '''
+        first = -((self.offset - start) // self.cadence)
+        last = (end - self.offset) // self.cadence
+        return self.offset + np.arange(first, last + 1, dtype='int64') * self.cadence
+
+    def _push(self, times: np.ndarray, values: np.ndarray):
+        needed = self.count + len(times)
+        if needed > len(self.times):
+            capacity = max(needed, 2 * len(self.times), 1024)
+            grown = np.empty(capacity, dtype='int64')
+            grown[:self.count] = self.times[:self.count]
+            self.times = grown
+            grown = np.full(capacity, np.nan)
+            grown[:self.count] = self.values[:self.count]
+            self.values = grown
+        self.times[self.count:needed] = times
+        self.values[self.count:needed] = values
+        self.count = needed
+
+    def _extend(self, times: np.ndarray, values: np.ndarray):
+        ''' adds the grid points up to the last of these rows, all newer than the grid '''
+        start = self.times[self.count - 1] + self.cadence if self.count > 0 else self.start
+        grid = self.gridBetween(start, times[-1])
+        if len(grid) > 0:
+            positions = np.searchsorted(times, grid, side='right') - 1
+            self._push(grid, np.where(
+                positions >= 0,
+                values[np.maximum(positions, 0)],
+                self.lastValue))
+        self.lastValue = values[-1]
+        self.tipTime = int(times[-1])
+
+    def _remember(self, snapshot: Snapshot):
+        self.rowCount = snapshot.rowCount
+        self.tip = snapshot.tip
+
+    def rebuild(self, snapshot: Snapshot):
+        self._reset()
+        arrays = arraysOf(snapshot)
+        if arrays is not None and len(arrays[0]) > 0:
+            times, values = arrays
+            self.start = int(times[0])
+            self._extend(times, valuesToFloats(values))
+        self._remember(snapshot)
+
+    def _newRows(self, snapshot: Snapshot) -> Union[list[tuple[str, object, str]], None]:
+        '''
+        (time, value, hash) of the rows added since the view was made, None if
+        the snapshot isn't what we have with rows added after it.
+        '''
+        if self.tip is None or snapshot.rowCount <= self.rowCount:
+            return None
+        if self.rowCount - 1 >= snapshot.baseCount:
+            # all in the append buffer, no frames needed
+            rows = snapshot.tail[self.rowCount - 1 - snapshot.baseCount:snapshot.tailLength]
+        else:
+            df = snapshot.slice(self.rowCount - 1)
+            if 'hash' not in df.columns:
+                return None
+            rows = list(zip(df.index, df['value'], df['hash']))
+        if (rows[0][0], rows[0][2]) != (self.tip[0], self.tip[2]):
+            return None
+        return rows[1:]
+
+    def refresh(self, snapshot: Snapshot) -> bool:
+        ''' brings the view up to the snapshot, True if it only had to extend it '''
+        if snapshot.rowCount == self.rowCount and snapshot.tip == self.tip:
+            return True
+        rows = self._newRows(snapshot)
+        if rows is not None:
+            times = timestampsToNanos([row[0] for row in rows])
+            last = self.times[self.count - 1] if self.count > 0 else self.tipTime
+            if (
+                times[0] >= self.tipTime and times[0] > last and
+                (np.diff(times) >= 0).all()
+            ):
+                self._extend(times, valuesToFloats([row[1] for row in rows]))
+                self._remember(snapshot)
+                return True
+        self.rebuild(snapshot)
+        return False
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        ''' the grid and its values, over the same memory (rows never change once made) '''
+        return pd.DataFrame(
+            {'value': self.values[:self.count]},
+            index=pd.DatetimeIndex(self.times[:self.count].view('datetime64[ns]')),
+            copy=False)
+
+
+class CadenceViews():
+    ''' cadence views of the caches of a CacheRegistry, per (stream, cadence, offset) '''
+
+    _instance: Union['CadenceViews', None] = None
+
+    def __init__(self, registry: 'CacheRegistry' = None, keep: int = 256):
+        '''
+        registry - where the caches come from, defaults to the process wide one
+        keep - how many views to remember
+        '''
+        self._registry = registry
+        self.keep = keep
+        self.views: OrderedDict[tuple, CadenceView] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> 'CadenceViews':
+        if cls._instance is None:
+            cls._instance = CadenceViews()
+        return cls._instance
+
+    @classmethod
+    def setInstance(cls, views: 'CadenceViews'):
+        cls._instance = views
+
+    @property
+    def registry(self) -> 'CacheRegistry':
+        if self._registry is None:
+            from satorilib.disk.registry import CacheRegistry
+            return CacheRegistry.instance()
+        return self._registry
+
+    def _viewOf(self, key: tuple) -> CadenceView:
+        with self.lock:
+            view = self.views.get(key)
+            if view is None:
+                view = CadenceView(cadence=key[1], offset=key[2])
+                self.views[key] = view
+            self.views.move_to_end(key)
+            while len(self.views) > self.keep:
+                self.views.popitem(last=False)
+            return view
+
+    def resampled(
+        self,
+        streamId: StreamId,
+        cadence: float,
+        offset: float = 0,
+        cache: 'Cache' = None,
+    ) -> Union[pd.DataFrame, None]:
+        '''
+        the stream on its cadence grid, a datetime index and a value column.
+        cache - the stream's cache if the caller has it, else the registry's
+        '''
+        if not cadence or cadence <= 0:
+            return None
+        cache = cache or self.registry.cachesOf([streamId])[0]
+        view = self._viewOf((streamId, cadence, offset or 0))
+        with view.lock:
+            view.refresh(cache.snapshot())
+            return view.frame
+
+    def ofStream(self, stream: Stream, cache: 'Cache' = None) -> Union[pd.DataFrame, None]:
+        ''' on the stream's declared cadence and offset '''
+        return self.resampled(
+            streamId=stream.streamId,
+            cadence=stream.cadence or Stream.minimumCadence,
+            offset=stream.offset or 0,
+            cache=cache)
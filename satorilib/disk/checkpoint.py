@@ -0,0 +1,149 @@
+'''
+persisted checkpoints along a stream's hash chain.
+
+a checkpoint is a (timestamp, hash, row count) that has been verified. we keep
+one every so many rows plus the last verified row (the tip) in a small json
+file kept with the stream's other sidecars (see Cache.sidecarPath), so after a restart validation can resume from the
+newest checkpoint that still matches the data rather than from the root.
+rows before a matching checkpoint are trusted, a full audit is still available
+through Cache.performValidation(entire=True).
+'''
+from typing import Union, Callable
+import os
+import json
+import pandas as pd
+
+
+class Checkpoints():
+    ''' verified points along a hash chain '''
+
+    def __init__(
+        self,
+        every: int = 10000,
+        tipEvery: int = 100,
+        points: list[tuple[str, str, int]] = None,
+        tip: Union[tuple[str, str, int], None] = None,
+    ):
+        '''
+        every - rows between permanent checkpoints
+        tipEvery - rows the tip may advance before we bother saving it again
+        '''
+        self.every = every
+        self.tipEvery = tipEvery
+        self.points = [tuple(p) for p in (points or [])]
+        self.tip = tuple(tip) if tip is not None else None
+        self.savedTip = self.tip
+
+    @staticmethod
+    def load(path: str, **kwargs) -> 'Checkpoints':
+        try:
+            with open(path, mode='r') as f:
+                data = json.load(f)
+            return Checkpoints(
+                every=data.get('every', kwargs.get('every', 10000)),
+                tipEvery=kwargs.get('tipEvery', 100),
+                points=data.get('points'),
+                tip=data.get('tip'))
+        except Exception as _:
+            return Checkpoints(**kwargs)
+
+    def save(self, path: str) -> bool:
+        try:
+            temp = f'{path}.tmp'
+            with open(temp, mode='w') as f:
+                json.dump({
+                    'every': self.every,
+                    'points': self.points,
+                    'tip': self.tip}, f)
+            os.replace(temp, path)
+            self.savedTip = self.tip
+            return True
+        except Exception as _:
+            return False
+
+    def clear(self):
+        self.points = []
+        self.tip = None
+
+    @staticmethod
+    def matches(df: pd.DataFrame, point: Union[tuple[str, str, int], None]) -> bool:
+        ''' true if the point describes the same row of this dataframe '''
+        return Checkpoints.matchesRow(*Checkpoints.rowsOf(df), point)
+
+    @staticmethod
+    def rowsOf(df: pd.DataFrame) -> tuple[int, Callable[[int], tuple[str, str]]]:
+        ''' row count and a (time, hash) lookup by position '''
+        return df.shape[0], lambda i: (str(df.index[i]), df['hash'].iloc[i])
+
+    @staticmethod
+    def matchesRow(
+        rows: int,
+        rowAt: Callable[[int], tuple[str, str]],
+        point: Union[tuple[str, str, int], None],
+    ) -> bool:
+        if point is None:
+            return False
+        time, hash, count = point
+        return 0 < count <= rows and rowAt(count-1) == (time, hash)
+
+    def resume(self, df: pd.DataFrame) -> tuple[int, str]:
+        '''
+        returns the row count and hash of the newest checkpoint that still
+        matches the data, rows before that count don't need to be verified.
+        '''
+        if df is None or df.empty or 'hash' not in df.columns:
+            return 0, ''
+        if Checkpoints.matches(df, self.tip):
+            return self.tip[2], self.tip[1]
+        for point in reversed(self.points):
+            if Checkpoints.matches(df, point):
+                return point[2], point[1]
+        return 0, ''
+
+    def advance(self, time: str, hash: str, count: int) -> bool:
+        '''
+        moves the tip forward without looking at the data. returns False (and
+        does nothing) if a permanent checkpoint or a save is due, in which case
+        record should be called with the data instead.
+        '''
+        last = self.points[-1][2] if len(self.points) > 0 else 0
+        if (
+            self.tip is None or
+            self.savedTip is None or
+            count <= self.tip[2] or
+            count >= last + self.every or
+            count - self.savedTip[2] >= self.tipEvery
+        ):
+            return False
+        self.tip = (time, hash, count)
+        return True
+
+    def record(self, df: pd.DataFrame) -> bool:
+        '''
+        records that the entire dataframe has been verified. returns True if
+        something changed enough to be worth saving.
+        '''
+        if df is None or df.empty:
+            changed = len(self.points) > 0 or self.tip is not None
+            self.clear()
+            return changed
+        return self.recordRows(*Checkpoints.rowsOf(df))
+
+    def recordRows(self, count: int, rowAt: Callable[[int], tuple[str, str]]) -> bool:
+        ''' record for data that isn't a dataframe, rowAt(i) gives (time, hash) '''
+        if count == 0:
+            changed = len(self.points) > 0 or self.tip is not None
+            self.clear()
+            return changed
+        kept = [p for p in self.points if Checkpoints.matchesRow(count, rowAt, p)]
+        changed = len(kept) != len(self.points)
+        self.points = kept
+        last = self.points[-1][2] if len(self.points) > 0 else 0
+        for k in range(last + self.every, count + 1, self.every):
+            self.points.append((*rowAt(k-1), k))
+            changed = True
+        self.tip = (*rowAt(count-1), count)
+        return (
+            changed or
+            not Checkpoints.matchesRow(count, rowAt, self.savedTip) or
+            count - self.savedTip[2] >= self.tipEvery)
@@ -2,6 +2,7 @@
 
 from typing import Union
 import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from satorilib import logging
 from satorilib.concepts import StreamId
@@ -11,7 +12,9 @@ from satorilib.interfaces.model import ModelDataDiskApi
 from satorilib.disk.utils import safetify, safetifyWithResult
 from satorilib.disk.model import ModelApi
 from satorilib.disk.wallet import WalletApi
-from satorilib.disk.filetypes.csv import CSVManager
+from satorilib.disk.filetypes import fileManagerFor
+from satorilib.disk.snapshot import Snapshot
+from satorilib.disk.gather import GatherService, snapshotOfFrame
 
 
 class Disk(ModelDataDiskApi):
@@ -34,7 +37,10 @@ class Disk(ModelDataDiskApi):
         **kwargs,
     ):
         self.memory = memory.Memory
-        self.csv = CSVManager()
+        self.csv = fileManagerFor(ext, indexEvery=kwargs.get('indexEvery'))
+        if kwargs.get('wal') is not None:
+            # appends go through the shared write-ahead log (see disk/wal.py)
+            self.csv = kwargs['wal'].wrap(self.csv)
         self.setAttributes(df=df, id=id, loc=loc, ext=ext, **kwargs)
 
     def setAttributes(
@@ -367,14 +373,15 @@ class Disk(ModelDataDiskApi):
                 target=(
                     self.df.columns.levels[3]
                     if len(self.df.columns.levels) == 4 else None))]
-        dfs = []
-        for streamId in streamIds:
+
+        def snapshotOf(streamId: StreamId) -> Union[Snapshot, None]:
             df = (self if streamId == self.id else Disk(id=streamId)).read()
-            if df is None:
-                continue
-            dfs.append(self.memory.expand(df=df, streamId=streamId))
-        if len(dfs) == 0:
-            return None
-        if len(dfs) == 1:
-            return dfs[0]
-        return self.memory.merge(dfs=dfs, targetColumn=targetColumn)
+            return snapshotOfFrame(df) if isinstance(df, pd.DataFrame) else None
+
+        # reads in parallel, then one as-of join (see disk/gather.py)
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(8, os.cpu_count() or 1, len(streamIds))),
+            thread_name_prefix='gather',
+        ) as executor:
+            snapshots = list(executor.map(snapshotOf, streamIds))
+        return GatherService.join(targetColumn, streamIds, snapshots)
@@ -0,0 +1,172 @@
+'''
+an aligned multi-stream feature matrix that is kept up to date row by row.
+
+an engine that predicts on every new datapoint used to rebuild the merged frame
+of its streams from scratch (Memory.merge) each time. a FeatureMatrix is that
+merged view, the target stream's rows with every other stream's latest value at
+or before each of them, held as preallocated numpy columns (int64 times and one
+float64 column per stream). the capacity doubles when it runs out.
+
+an observation on the target stream adds a row (or replaces the last one if it
+has the same time), filled from each other stream's value as of that time. an
+observation on another stream newer than the last row is held until a target
+row catches up with it, one that's older than the last row but still the newest
+for its stream rewrites that column from its time on, usually a handful of rows.
+anything older than what a stream already has can't be placed without its
+history, update says so and the matrix should be built again.
+
+values are floats, anything non-numeric is NaN.
+'''
+from collections import deque
+import numpy as np
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.disk.utils import timestampToNanos, valuesToFloats
+from satorilib.disk.snapshot import Snapshot
+from satorilib.disk.gather import GatherService, asOfArrays, columnOf
+
+
+class FeatureMatrix():
+    ''' the as-of aligned view of several streams, one row per target observation '''
+
+    def __init__(
+        self,
+        columns: list[tuple],
+        arrays: list[tuple[np.ndarray, np.ndarray]],
+        headroom: int = 1024,
+    ):
+        '''
+        columns - one per stream, the target stream first
+        arrays - sorted int64 times and values of each stream
+        headroom - rows to allocate beyond what's there already
+        '''
+        self.columns = columns
+        self.positions = {column: i for i, column in enumerate(columns)}
+        times = arrays[0][0]
+        self.rows = len(times)
+        self.times = np.empty(self.rows + headroom, dtype='int64')
+        self.times[:self.rows] = times
+        self.values = np.full((self.rows + headroom, len(columns)), np.nan)
+        for i, values in enumerate(asOfArrays(arrays)):
+            self.values[:self.rows, i] = valuesToFloats(values)
+        last = times[-1] if self.rows > 0 else np.iinfo('int64').min
+        # per stream: the time of its newest observation, its value as of the
+        # last row, and its observations newer than the last row
+        self.latest = [
+            int(streamTimes[-1]) if len(streamTimes) > 0 else int(np.iinfo('int64').min)
+            for streamTimes, _ in arrays]
+        self.current = [
+            self.values[self.rows - 1, i] if self.rows > 0 else np.nan
+            for i in range(len(columns))]
+        self.pending: list[deque] = []
+        for streamTimes, streamValues in arrays:
+            newer = int(np.searchsorted(streamTimes, last, side='right'))
+            self.pending.append(deque(zip(
+                streamTimes[newer:].tolist(),
+                valuesToFloats(streamValues[newer:]).tolist())))
+
+    @staticmethod
+    def fromSnapshots(
+        targetColumn: 'str|tuple[str]',
+        streamIds: list[StreamId],
+        snapshots: list[Snapshot],
+        headroom: int = 1024,
+    ) -> 'FeatureMatrix':
+        present = [
+            (streamId, snapshot) for streamId, snapshot in zip(streamIds, snapshots)
+            if snapshot is not None]
+        columns, arrays = GatherService.arrange(targetColumn, present)
+        empty = (np.empty(0, dtype='int64'), np.empty(0, dtype='float64'))
+        return FeatureMatrix(
+            columns=columns,
+            arrays=[a if a is not None else empty for a in arrays],
+            headroom=headroom)
+
+    @staticmethod
+    def gather(
+        targetColumn: 'str|tuple[str]',
+        streamIds: list[StreamId],
+        service: GatherService = None,
+        headroom: int = 1024,
+    ) -> 'FeatureMatrix':
+        ''' built from the streams' caches, see GatherService.snapshots '''
+        service = service or GatherService.instance()
+        return FeatureMatrix.fromSnapshots(
+            targetColumn=targetColumn,
+            streamIds=streamIds,
+            snapshots=service.snapshots(streamIds),
+            headroom=headroom)
+
+    ### updates ###
+
+    def _grow(self):
+        capacity = max(1024, 2 * len(self.times))
+        times = np.empty(capacity, dtype='int64')
+        times[:self.rows] = self.times[:self.rows]
+        values = np.full((capacity, len(self.columns)), np.nan)
+        values[:self.rows] = self.values[:self.rows]
+        self.times = times
+        self.values = values
+
+    def _addRow(self, nanos: int, value: float):
+        if self.rows == len(self.times):
+            self._grow()
+        for i in range(1, len(self.columns)):
+            pending = self.pending[i]
+            while pending and pending[0][0] <= nanos:
+                self.current[i] = pending.popleft()[1]
+        self.current[0] = value
+        self.times[self.rows] = nanos
+        self.values[self.rows] = self.current
+        self.rows += 1
+
+    def update(self, streamId: StreamId, time: str, value) -> bool:
+        '''
+        takes in one observation of a member stream. False if it couldn't be
+        placed (unknown stream, bad time or older than what that stream
+        already has), the matrix is unchanged and should be built again.
+        '''
+        i = self.positions.get(columnOf(streamId))
+        nanos = timestampToNanos(time)
+        if i is None or nanos == np.iinfo('int64').min or nanos < self.latest[i]:
+            return False
+        try:
+            value = float(value)
+        except (ValueError, TypeError):
+            value = np.nan
+        last = int(self.times[self.rows - 1]) if self.rows > 0 else np.iinfo('int64').min
+        self.latest[i] = nanos
+        if i == 0:
+            if nanos == last:
+                self.values[self.rows - 1, 0] = value
+                self.current[0] = value
+            else:
+                self._addRow(nanos, value)
+        elif nanos > last:
+            self.pending[i].append((nanos, value))
+        else:
+            # late for the rows we have, but newer than anything else of its
+            # own, so it's what those rows should have seen from here on
+            first = int(np.searchsorted(self.times[:self.rows], nanos, side='left'))
+            self.values[first:self.rows, i] = value
+            self.current[i] = value
+        return True
+
+    ### reads ###
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def latestRow(self) -> np.ndarray:
+        ''' the features of the newest row, a view '''
+        return self.values[self.rows - 1] if self.rows > 0 else self.values[:0].reshape(-1)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        ''' the matrix as Memory.merge lays it out, over the same memory '''
+        return pd.DataFrame(
+            self.values[:self.rows],
+            index=pd.DatetimeIndex(self.times[:self.rows].view('datetime64[ns]')),
+            columns=pd.MultiIndex.from_tuples(self.columns),
+            copy=False)
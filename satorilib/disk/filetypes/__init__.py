@@ -0,0 +1,22 @@
+from satorilib.interfaces.data import FileManager
+from satorilib.disk.filetypes.csv import CSVManager
+from satorilib.disk.filetypes.segment import SegmentManager
+from satorilib.disk.filetypes.arrow import ArrowManager
+from satorilib.disk.filetypes.parquet import ParquetManager
+from satorilib.disk.filetypes.block import BlockManager
+
+
+def fileManagerFor(ext: str = 'csv', indexEvery: int = None) -> FileManager:
+    '''
+    the storage backend for a stream is chosen by its file extension,
+    indexEvery turns on the line index sidecar for csv files.
+    '''
+    if ext == 'seg':
+        return SegmentManager()
+    if ext == 'arrow':
+        return ArrowManager()
+    if ext == 'parquet':
+        return ParquetManager()
+    if ext == 'blk':
+        return BlockManager()
+    return CSVManager(indexEvery=indexEvery)
@@ -0,0 +1,312 @@
+'''
+memory-mapped arrow ipc files.
+
+each stream is a folder of arrow ipc (feather v2, uncompressed) files with the
+same three columns as the segment files: an int64 epoch-nanosecond timestamp,
+a float64 value and the 8 byte hash as a uint64. a write produces one file, an
+append adds another file holding a single record batch, and once there are
+enough small files they are folded into one.
+
+files are never replaced in place, windows won't replace or remove a file
+something still has mapped. appended files are numbered, a write or a fold
+adds a new file named for the range of numbers it replaces (00000003-00000009)
+and readers skip the files it covers. replaced files are removed once nothing
+has them mapped.
+
+readers memory-map the files, so readTable and readArrays hand back read-only
+views straight onto the page cache rather than parsed copies. any number of
+processes on the same host reading the same stream share those pages, and
+opening a large stream costs about as much as reading its footers.
+
+notes:
+    read and readLines still build the usual string indexed dataframe, which
+    is a copy. use readTable or readArrays where the zero-copy view matters.
+'''
+from typing import Union
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from satorilib.interfaces.data import FileManager
+from satorilib.disk.utils import (
+    timestampsToNanos,
+    nanosToTimestamps,
+    hashesToInts,
+    intsToHashes,
+    valuesToFloats)
+from satorilib import logging
+
+
+class ArrowManager(FileManager):
+    ''' manages reading and writing to memory-mapped arrow ipc files '''
+
+    schema = pa.schema([
+        ('time', pa.int64()),
+        ('value', pa.float64()),
+        ('hash', pa.uint64())])
+
+    def __init__(self, compactAfter: int = 64):
+        '''
+        compactAfter - number of appended files we allow before folding them
+        into one.
+        '''
+        self.compactAfter = compactAfter
+
+    def _conformBasic(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._conformIndexName(self.conformFlatColumns(df))
+
+    def _conformIndexName(self, df: pd.DataFrame) -> pd.DataFrame:
+        df.index.name = None
+        return df
+
+    def conformFlatColumns(self, df: pd.DataFrame) -> pd.DataFrame:
+        if len(df.columns) == 1:
+            df.columns = ['value']
+        if len(df.columns) == 2:
+            df.columns = ['value', 'hash']
+        return df
+
+    def _clean(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._sort(self._dedupe(df))
+
+    def _sort(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.sort_index()
+
+    def _dedupe(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df[~df.index.duplicated(keep='last')]
+
+    ### files ###
+
+    @staticmethod
+    def fileName(first: int, last: int = None) -> str:
+        ''' an appended file has one number, a written or folded one a range '''
+        if last is None or last == first:
+            return f'{first:08d}.arrow'
+        return f'{first:08d}-{last:08d}.arrow'
+
+    @staticmethod
+    def numbers(path: str) -> tuple[int, int]:
+        ''' the (first, last) numbers a file holds '''
+        first, _, last = os.path.basename(path).split('.')[0].partition('-')
+        return int(first), int(last or first)
+
+    def _allFiles(self, filePath: str) -> list[str]:
+        if not os.path.isdir(filePath):
+            return []
+        return [
+            os.path.join(filePath, name)
+            for name in os.listdir(filePath)
+            if name.endswith('.arrow')]
+
+    def _split(self, paths: list[str]) -> tuple[list[str], list[str]]:
+        ''' (files holding the stream in order, files another one replaced) '''
+        ranges = {path: self.numbers(path) for path in paths}
+        live = []
+        replaced = []
+        for path, (first, last) in ranges.items():
+            if any(
+                other != path and otherFirst <= first and last <= otherLast
+                for other, (otherFirst, otherLast) in ranges.items()
+            ):
+                replaced.append(path)
+            else:
+                live.append(path)
+        return sorted(live, key=ranges.get), replaced
+
+    def files(self, filePath: str) -> list[str]:
+        ''' paths of the ipc files holding the stream, in order '''
+        return self._split(self._allFiles(filePath))[0]
+
+    def _prune(self, filePath: str):
+        ''' removes replaced files, those still mapped are left for next time '''
+        for path in self._split(self._allFiles(filePath))[1]:
+            try:
+                os.remove(path)
+            except OSError as _:
+                pass
+
+    def toTable(self, data: pd.DataFrame) -> pa.Table:
+        data = self.conformFlatColumns(data)
+        return pa.Table.from_arrays([
+            pa.array(timestampsToNanos(data.index), type=pa.int64()),
+            pa.array(valuesToFloats(data['value'].values), type=pa.float64()),
+            pa.array(
+                hashesToInts(data['hash'].values)
+                if 'hash' in data.columns
+                else np.zeros(data.shape[0], dtype='uint64'),
+                type=pa.uint64())],
+            schema=self.schema)
+
+    def fromTable(self, table: pa.Table) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                'value': table.column('value').to_numpy(),
+                'hash': intsToHashes(table.column('hash').to_numpy())},
+            index=nanosToTimestamps(table.column('time').to_numpy()))
+
+    def _writeFile(self, path: str, table: pa.Table):
+        ''' writes to a temp file then swaps it in so readers never see half of it '''
+        temp = f'{path}.tmp'
+        with pa.OSFile(temp, 'wb') as sink:
+            with pa.ipc.new_file(sink, self.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp, path)
+
+    def _openFile(self, path: str) -> pa.Table:
+        ''' zero-copy, the table's buffers point into the memory map '''
+        with pa.memory_map(path, 'r') as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def _next(self, filePath: str) -> int:
+        files = self._allFiles(filePath)
+        if len(files) == 0:
+            return 0
+        return max(self.numbers(path)[1] for path in files) + 1
+
+    def compact(self, filePath: str) -> bool:
+        '''
+        folds every file after the first into one. the first file is usually
+        the big one from the last write so it is left alone.
+        '''
+        try:
+            files = self.files(filePath)
+            if len(files) > 2:
+                # a reader lists either the folded file or the ones it
+                # replaces, never both, so never sees a row twice
+                self._writeFile(
+                    os.path.join(filePath, self.fileName(
+                        self.numbers(files[1])[0],
+                        self.numbers(files[-1])[1])),
+                    pa.concat_tables([self._openFile(f) for f in files[1:]]).combine_chunks())
+            self._prune(filePath)
+            return True
+        except Exception as e:
+            logging.error('unable to compact arrow files', e, print=True)
+            return False
+
+    def readTable(self, filePath: str) -> Union[pa.Table, None]:
+        '''
+        every row in file order as a memory-mapped, read-only table. files
+        replaced by a fold are skipped so a row is never read twice.
+        '''
+        for _ in range(3):
+            try:
+                files = self.files(filePath)
+                if len(files) == 0:
+                    return None
+                return pa.concat_tables([self._openFile(f) for f in files])
+            except FileNotFoundError as _:
+                # a compaction swapped files out from under us, look again
+                continue
+        return None
+
+    def readArrays(self, filePath: str) -> Union[dict[str, np.ndarray], None]:
+        '''
+        columns as numpy arrays. these are views onto the memory map (so
+        read-only) as long as the stream is a single file, which is the case
+        right after a write or a full compaction.
+        '''
+        table = self.readTable(filePath)
+        if table is None:
+            return None
+        if table.column('time').num_chunks > 1:
+            table = table.combine_chunks()
+        return {
+            name: table.column(name).to_numpy()
+            for name in self.schema.names}
+
+    def lastTime(self, filePath: str) -> Union[str, None]:
+        '''
+        the latest time held. a late row is appended after newer ones so the
+        last row isn't always the latest, the column is scanned in place.
+        '''
+        table = self.readTable(filePath)
+        if table is None or table.num_rows == 0:
+            return None
+        return nanosToTimestamps([pc.max(table.column('time')).as_py()])[0]
+
+    ### FileManager ###
+
+    def replace(self, source: str, filePath: str) -> bool:
+        ''' source's rows become one new file, the folder itself is never swapped '''
+        try:
+            table = self.readTable(source)
+            os.makedirs(filePath, exist_ok=True)
+            self._writeFile(
+                os.path.join(filePath, self.fileName(0, self._next(filePath))),
+                table.combine_chunks() if table is not None else self.schema.empty_table())
+            del table
+            self._prune(filePath)
+            shutil.rmtree(source, ignore_errors=True)
+            return True
+        except Exception as e:
+            logging.error('unable to replace arrow files', e, print=True)
+            return False
+
+    def remove(self, filePath: str) -> Union[bool, None]:
+        try:
+            shutil.rmtree(filePath)
+            return True
+        except FileNotFoundError as _:
+            return None
+        except Exception as _:
+            return False
+
+    def read(self, filePath: str, **kwargs) -> pd.DataFrame:
+        try:
+            table = self.readTable(filePath)
+            if table is None or table.num_rows == 0:
+                return None
+            return self._clean(self._conformBasic(self.fromTable(table)))
+        except Exception as _:
+            return None
+
+    def write(self, filePath: str, data: pd.DataFrame) -> bool:
+        ''' one new file replacing every file before it '''
+        try:
+            os.makedirs(filePath, exist_ok=True)
+            self._writeFile(
+                os.path.join(filePath, self.fileName(0, self._next(filePath))),
+                self.toTable(data))
+            self._prune(filePath)
+            return True
+        except Exception as e:
+            logging.error('unable to write arrow files', e, print=True)
+            return False
+
+    def append(self, filePath: str, data: pd.DataFrame) -> bool:
+        try:
+            if data.shape[0] == 0:
+                return True
+            os.makedirs(filePath, exist_ok=True)
+            self._writeFile(
+                os.path.join(filePath, self.fileName(self._next(filePath))),
+                self.toTable(data))
+            files, replaced = self._split(self._allFiles(filePath))
+            if len(files) > self.compactAfter:
+                self.compact(filePath)
+            elif len(replaced) > 0:
+                self._prune(filePath)
+            return True
+        except Exception as e:
+            logging.error('unable to append to arrow files', e, print=True)
+            return False
+
+    def readLines(
+        self,
+        filePath: str,
+        start: int,
+        end: int = None,
+    ) -> Union[pd.DataFrame, None]:
+        ''' 0-indexed, end exclusive, only the requested rows are materialized '''
+        end = (end if end is not None and end > start else None) or start+1
+        try:
+            table = self.readTable(filePath)
+            if table is None or start >= table.num_rows:
+                return None
+            return self._conformBasic(self.fromTable(table.slice(start, end - start)))
+        except Exception as e:
+            logging.error('unable to get data', e, print=True)
+            return None
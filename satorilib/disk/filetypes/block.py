@@ -0,0 +1,485 @@
+'''
+compressed blocks of observations.
+
+a stream is one file of blocks of up to blockRows rows. every block has a
+fixed-size header: row count, first and last time, first and last hash, the
+payload's length and its crc. the payload is zlib over three columns:
+    times - delta-of-delta encoded (near-regular cadence makes these mostly
+        zero), zigzagged to unsigned
+    values - if every value in the block is exactly some integer over 10**d
+        (prices, readings with a fixed number of decimals) those integers,
+        delta encoded and zigzagged. otherwise each float64's bits xor the
+        previous one's (slowly changing values share their sign, exponent and
+        high mantissa bits)
+    hashes - the 8 byte hashes as they are, they're random
+the times and values are split into byte planes (all first bytes, then all
+second bytes...) before compressing, so the long runs of zero high bytes the
+encodings leave end up next to each other.
+
+reading a time range or a span of rows walks the headers and only decodes the
+blocks it needs. appending re-encodes the last block if it isn't full and
+adds new blocks after it, earlier blocks are never touched. since that
+overwrites rows already in the file, the new tail and where it goes are first
+put in a journal next to the file (swapped in whole), then written into the
+file, then the journal is removed. a journal that's still there (a crash part
+way) is replayed before the file is next read or written. a block with a bad
+crc or cut short ends the file, the next write or append drops it (append
+checks the last block's crc, which is where a torn or damaged write lands).
+
+notes:
+    like segment files, timestamps are stored as integers and values must be
+    numeric, anything else is stored as nan. hashes take 8 of the ~10 bytes a
+    row needs, the rest compresses to very little.
+'''
+from typing import Union, Iterator
+import os
+import zlib
+import struct
+import numpy as np
+import pandas as pd
+from satorilib.interfaces.data import FileManager
+from satorilib.disk.utils import (
+    timestampsToNanos,
+    timestampToNanos,
+    nanosToTimestamps,
+    hashesToInts,
+    intsToHashes,
+    valuesToFloats)
+from satorilib import logging
+
+
+class BlockHeader():
+    ''' what a block holds, readable without decoding it '''
+
+    layout = struct.Struct('<4sIqqQQIIb3x')
+    magic = b'SBK1'
+
+    def __init__(
+        self,
+        rows: int,
+        firstTime: int,
+        lastTime: int,
+        firstHash: int,
+        lastHash: int,
+        size: int,
+        crc: int,
+        decimals: int = -1,
+        offset: int = 0,
+        row: int = 0,
+    ):
+        '''
+        offset - where the block starts in the file
+        row - how many rows come before it
+        '''
+        self.rows = rows
+        self.firstTime = firstTime
+        self.lastTime = lastTime
+        self.firstHash = firstHash
+        self.lastHash = lastHash
+        self.size = size
+        self.crc = crc
+        self.decimals = decimals
+        self.offset = offset
+        self.row = row
+
+    def __repr__(self):
+        return f'BlockHeader(rows={self.rows}, row={self.row}, offset={self.offset})'
+
+    @property
+    def end(self) -> int:
+        ''' where the next block starts '''
+        return self.offset + self.layout.size + self.size
+
+    def pack(self) -> bytes:
+        return self.layout.pack(
+            self.magic, self.rows, self.firstTime, self.lastTime,
+            self.firstHash, self.lastHash, self.size, self.crc, self.decimals)
+
+    @staticmethod
+    def unpack(raw: bytes, offset: int = 0, row: int = 0) -> Union['BlockHeader', None]:
+        if len(raw) < BlockHeader.layout.size:
+            return None
+        magic, *fields = BlockHeader.layout.unpack(raw[:BlockHeader.layout.size])
+        if magic != BlockHeader.magic:
+            return None
+        return BlockHeader(*fields, offset=offset, row=row)
+
+
+### codec ###
+
+def _planes(words: np.ndarray) -> bytes:
+    ''' uint64s as byte planes: every first byte, then every second byte... '''
+    return words.astype('<u8').view('uint8').reshape(-1, 8).T.tobytes()
+
+
+def _words(raw: bytes, rows: int) -> np.ndarray:
+    return np.frombuffer(raw, dtype='uint8').reshape(8, rows).T.copy().view('<u8').reshape(rows)
+
+
+def _zigzag(signed: np.ndarray) -> np.ndarray:
+    return ((signed << 1) ^ (signed >> 63)).view('uint64')
+
+
+def _unzigzag(unsigned: np.ndarray) -> np.ndarray:
+    return ((unsigned >> 1).view('int64') ^ -(unsigned & 1).view('int64'))
+
+
+def decimalsOf(values: np.ndarray, most: int = 9) -> int:
+    '''
+    the fewest decimals d such that every value is exactly an integer over
+    10**d, -1 if there's no such d (or nan, inf or -0.0 in the way).
+    '''
+    if not np.isfinite(values).all() or (np.signbit(values) & (values == 0)).any():
+        return -1
+    for decimals in range(most + 1):
+        scaled = np.round(values * 10**decimals)
+        if np.abs(scaled).max() >= 2**53:
+            return -1
+        if (scaled / 10**decimals == values).all():
+            return decimals
+    return -1
+
+
+def encodeBlock(times: np.ndarray, values: np.ndarray, hashes: np.ndarray, level: int = 6) -> bytes:
+    ''' one block (header and payload) of int64 times, float64 values and uint64 hashes '''
+    rows = len(times)
+    deltas = np.diff(times)
+    dod = np.diff(deltas, prepend=np.int64(0)) if rows > 1 else np.empty(0, dtype='int64')
+    values = values.astype('float64')
+    decimals = decimalsOf(values)
+    if decimals >= 0:
+        scaled = np.round(values * 10**decimals).astype('int64')
+        encoded = _zigzag(np.diff(scaled, prepend=np.int64(0)))
+    else:
+        bits = values.view('uint64')
+        encoded = bits ^ np.concatenate([np.zeros(1, dtype='uint64'), bits[:-1]])
+    payload = zlib.compress(
+        _planes(_zigzag(dod.astype('int64'))) +
+        _planes(encoded) +
+        hashes.astype('<u8').tobytes(),
+        level)
+    return BlockHeader(
+        rows=rows,
+        firstTime=int(times[0]),
+        lastTime=int(times[-1]),
+        firstHash=int(hashes[0]),
+        lastHash=int(hashes[-1]),
+        size=len(payload),
+        crc=zlib.crc32(payload),
+        decimals=decimals,
+    ).pack() + payload
+
+
+def decodeBlock(header: BlockHeader, payload: bytes) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    ''' the times, values and hashes of a block '''
+    rows = header.rows
+    raw = zlib.decompress(payload)
+    timeBytes = 8 * (rows - 1)
+    dod = _unzigzag(_words(raw[:timeBytes], rows - 1)) if rows > 1 else np.empty(0, dtype='int64')
+    times = np.empty(rows, dtype='int64')
+    times[0] = header.firstTime
+    # wrapping int64 arithmetic undoes the diffs exactly
+    with np.errstate(over='ignore'):
+        times[1:] = header.firstTime + np.cumsum(np.cumsum(dod))
+    encoded = _words(raw[timeBytes:timeBytes + 8 * rows], rows)
+    if header.decimals >= 0:
+        values = np.cumsum(_unzigzag(encoded)).astype('float64') / 10**header.decimals
+    else:
+        values = np.bitwise_xor.accumulate(encoded).view('float64')
+    hashes = np.frombuffer(raw[timeBytes + 8 * rows:], dtype='<u8').astype('uint64')
+    return times, values, hashes
+
+
+class BlockManager(FileManager):
+    ''' manages reading and writing streams as compressed blocks '''
+
+    def __init__(self, blockRows: int = 4096, level: int = 6):
+        '''
+        blockRows - rows per block, the unit that's decoded and re-encoded
+        level - zlib compression level
+        '''
+        self.blockRows = blockRows
+        self.level = level
+
+    def _conformBasic(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._conformIndexName(self.conformFlatColumns(df))
+
+    def _conformIndexName(self, df: pd.DataFrame) -> pd.DataFrame:
+        df.index.name = None
+        return df
+
+    def conformFlatColumns(self, df: pd.DataFrame) -> pd.DataFrame:
+        if len(df.columns) == 1:
+            df.columns = ['value']
+        if len(df.columns) == 2:
+            df.columns = ['value', 'hash']
+        return df
+
+    def _clean(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._sort(self._dedupe(df))
+
+    def _sort(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.sort_index()
+
+    def _dedupe(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df[~df.index.duplicated(keep='last')]
+
+    ### columns ###
+
+    def toColumns(self, data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        data = self.conformFlatColumns(data)
+        return (
+            timestampsToNanos(data.index),
+            valuesToFloats(data['value'].values),
+            hashesToInts(data['hash'].values)
+            if 'hash' in data.columns else np.zeros(data.shape[0], dtype='uint64'))
+
+    def fromColumns(self, times: np.ndarray, values: np.ndarray, hashes: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                'value': values,
+                'hash': intsToHashes(hashes)},
+            index=nanosToTimestamps(times))
+
+    def encode(self, times: np.ndarray, values: np.ndarray, hashes: np.ndarray) -> bytes:
+        return b''.join(
+            encodeBlock(
+                times[start:start + self.blockRows],
+                values[start:start + self.blockRows],
+                hashes[start:start + self.blockRows],
+                level=self.level)
+            for start in range(0, len(times), self.blockRows))
+
+    ### journal ###
+
+    @staticmethod
+    def journalPath(filePath: str) -> str:
+        return f'{filePath}.journal'
+
+    def _journal(self, filePath: str, offset: int, encoded: bytes):
+        ''' the file should end with these bytes from offset on '''
+        temp = f'{self.journalPath(filePath)}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(struct.pack('<Q', offset))
+            f.write(encoded)
+        os.replace(temp, self.journalPath(filePath))
+
+    def _replay(self, filePath: str):
+        ''' finishes an append that was cut short, if there is one '''
+        journal = self.journalPath(filePath)
+        if not os.path.exists(journal):
+            return
+        with open(journal, 'rb') as f:
+            raw = f.read()
+        offset, = struct.unpack('<Q', raw[:8])
+        with open(filePath, 'r+b') as f:
+            # anything after the last good block is a torn write
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(raw[8:])
+        os.remove(journal)
+
+    ### blocks ###
+
+    def blocks(self, filePath: str) -> list[BlockHeader]:
+        ''' the headers of every intact block, reading nothing else '''
+        headers = []
+        self._replay(filePath)
+        if not os.path.isfile(filePath):
+            return headers
+        size = os.path.getsize(filePath)
+        offset = 0
+        row = 0
+        with open(filePath, 'rb') as f:
+            while offset < size:
+                f.seek(offset)
+                header = BlockHeader.unpack(
+                    f.read(BlockHeader.layout.size),
+                    offset=offset,
+                    row=row)
+                if header is None or header.end > size:
+                    break
+                headers.append(header)
+                offset = header.end
+                row += header.rows
+        return headers
+
+    def lastTime(self, filePath: str) -> Union[str, None]:
+        ''' from the last block's header '''
+        headers = self.blocks(filePath)
+        if len(headers) == 0:
+            return None
+        return nanosToTimestamps([headers[-1].lastTime])[0]
+
+    @staticmethod
+    def _intact(f, header: BlockHeader) -> bool:
+        ''' the payload matches its crc, without decoding it '''
+        f.seek(header.offset + BlockHeader.layout.size)
+        return zlib.crc32(f.read(header.size)) == header.crc
+
+    def _decode(self, f, header: BlockHeader) -> Union[tuple[np.ndarray, np.ndarray, np.ndarray], None]:
+        f.seek(header.offset + BlockHeader.layout.size)
+        payload = f.read(header.size)
+        if zlib.crc32(payload) != header.crc:
+            return None
+        return decodeBlock(header, payload)
+
+    def readColumns(
+        self,
+        filePath: str,
+        headers: list[BlockHeader] = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ''' times, values and hashes of the given blocks (all of them by default) '''
+        headers = self.blocks(filePath) if headers is None else headers
+        columns = ([], [], [])
+        if len(headers) > 0:
+            with open(filePath, 'rb') as f:
+                for header in headers:
+                    decoded = self._decode(f, header)
+                    if decoded is None:
+                        logging.warning(f'block at {header.offset} of {filePath} is corrupt', print=True)
+                        break
+                    for column, part in zip(columns, decoded):
+                        column.append(part)
+        return (
+            np.concatenate(columns[0]) if columns[0] else np.empty(0, dtype='int64'),
+            np.concatenate(columns[1]) if columns[1] else np.empty(0, dtype='float64'),
+            np.concatenate(columns[2]) if columns[2] else np.empty(0, dtype='uint64'))
+
+    def between(self, filePath: str, start: str = None, end: str = None) -> Union[pd.DataFrame, None]:
+        ''' rows from start (inclusive) to end (exclusive), only decoding the blocks that overlap '''
+        first = timestampToNanos(start) if start is not None else np.iinfo('int64').min
+        last = timestampToNanos(end) if end is not None else np.iinfo('int64').max
+        try:
+            times, values, hashes = self.readColumns(filePath, [
+                header for header in self.blocks(filePath)
+                if header.lastTime >= first and header.firstTime < last])
+            keep = (times >= first) & (times < last)
+            if not keep.any():
+                return None
+            return self._conformBasic(self.fromColumns(times[keep], values[keep], hashes[keep]))
+        except Exception as e:
+            logging.error('unable to get data', e, print=True)
+            return None
+
+    def iterate(self, filePath: str, batchSize: int = 100000) -> Iterator[pd.DataFrame]:
+        ''' the stream in file order, as dataframes of whole blocks up to about batchSize rows '''
+        batch = []
+        rows = 0
+        for header in self.blocks(filePath):
+            batch.append(header)
+            rows += header.rows
+            if rows >= batchSize:
+                yield self._conformBasic(self.fromColumns(*self.readColumns(filePath, batch)))
+                batch = []
+                rows = 0
+        if batch:
+            yield self._conformBasic(self.fromColumns(*self.readColumns(filePath, batch)))
+
+    ### FileManager ###
+
+    def replace(self, source: str, filePath: str) -> bool:
+        ''' a journal left for the old file mustn't be replayed onto the new one '''
+        self._replay(source)
+        try:
+            os.remove(self.journalPath(filePath))
+        except Exception as _:
+            pass
+        return super().replace(source, filePath)
+
+    def remove(self, filePath: str) -> Union[bool, None]:
+        try:
+            os.remove(self.journalPath(filePath))
+        except Exception as _:
+            pass
+        try:
+            os.remove(filePath)
+            return True
+        except FileNotFoundError as _:
+            return None
+        except Exception as _:
+            return False
+
+    def read(self, filePath: str, **kwargs) -> pd.DataFrame:
+        try:
+            times, values, hashes = self.readColumns(filePath)
+            if len(times) == 0:
+                return None
+            return self._clean(self._conformBasic(self.fromColumns(times, values, hashes)))
+        except Exception as _:
+            return None
+
+    def write(self, filePath: str, data: pd.DataFrame) -> bool:
+        ''' writes to a sibling file first then swaps it in '''
+        try:
+            encoded = self.encode(*self.toColumns(data))
+            os.makedirs(os.path.dirname(os.path.abspath(filePath)), exist_ok=True)
+            temp = f'{filePath}.tmp'
+            with open(temp, 'wb') as f:
+                f.write(encoded)
+            if os.path.exists(self.journalPath(filePath)):
+                # an unfinished append to the file we're replacing
+                os.remove(self.journalPath(filePath))
+            os.replace(temp, filePath)
+            return True
+        except Exception as e:
+            logging.error('unable to write blocks', e, print=True)
+            return False
+
+    def append(self, filePath: str, data: pd.DataFrame) -> bool:
+        try:
+            times, values, hashes = self.toColumns(data)
+            if len(times) == 0:
+                return True
+            headers = self.blocks(filePath)
+            if len(headers) > 0:
+                with open(filePath, 'rb') as f:
+                    if not self._intact(f, headers[-1]):
+                        # a corrupt block ends the file, we append in its place
+                        bad = next(i for i, header in enumerate(headers) if not self._intact(f, header))
+                        logging.warning(f'dropping corrupt blocks from {headers[bad].offset} of {filePath}', print=True)
+                        headers = headers[:bad]
+            if len(headers) == 0:
+                return self.write(filePath, data)
+            offset = headers[-1].end
+            last = headers[-1]
+            if last.rows < self.blockRows:
+                # the last block isn't full, it's re-encoded with the new rows
+                with open(filePath, 'rb') as f:
+                    decoded = self._decode(f, last)
+                if decoded is not None:
+                    offset = last.offset
+                    times, values, hashes = (
+                        np.concatenate([old, new])
+                        for old, new in zip(decoded, (times, values, hashes)))
+            self._journal(filePath, offset, self.encode(times, values, hashes))
+            self._replay(filePath)
+            return True
+        except Exception as e:
+            logging.error('unable to append blocks', e, print=True)
+            return False
+
+    def readLines(
+        self,
+        filePath: str,
+        start: int,
+        end: int = None,
+    ) -> Union[pd.DataFrame, None]:
+        ''' 0-indexed, end exclusive, decodes only the blocks holding those rows '''
+        end = (end if end is not None and end > start else None) or start+1
+        try:
+            headers = [
+                header for header in self.blocks(filePath)
+                if header.row + header.rows > start and header.row < end]
+            if len(headers) == 0:
+                return None
+            first = start - headers[0].row
+            times, values, hashes = self.readColumns(filePath, headers)
+            last = end - headers[0].row
+            if first >= len(times):
+                return None
+            return self._conformBasic(self.fromColumns(
+                times[first:last], values[first:last], hashes[first:last]))
+        except Exception as e:
+            logging.error('unable to get data', e, print=True)
+            return None
@@ -1,14 +1,153 @@
 from typing import Union
+import io
 import os
+import json
 import pandas as pd
 from satorilib.interfaces.data import FileManager
+from satorilib.disk.utils import sidecarPath
 from satorilib import logging
 # pd.options.display.float_format = '{:.10f}'.format
 
 
+class LineIndex():
+    '''
+    byte offsets of every `every`th row of a csv file, kept in a sidecar file
+    (see disk.utils.sidecarPath). lets us seek to any row instead of parsing from the top, and
+    truncate the file at a row instead of rewriting it. `ordered` is True as
+    long as every row's time is greater than the one before it, which means
+    the rows in the file line up with the (sorted, deduped) rows in memory.
+    '''
+
+    def __init__(
+        self,
+        every: int = 1000,
+        rows: int = 0,
+        size: int = 0,
+        ordered: bool = True,
+        last: str = '',
+        offsets: list[int] = None,
+    ):
+        self.every = every
+        self.rows = rows
+        self.size = size
+        self.ordered = ordered
+        self.last = last
+        self.offsets = offsets or []
+
+    @staticmethod
+    def sidecar(filePath: str) -> str:
+        return sidecarPath(filePath, f'{os.path.basename(filePath)}.idx')
+
+    @staticmethod
+    def load(filePath: str, every: int) -> 'LineIndex':
+        try:
+            with open(LineIndex.sidecar(filePath), mode='r') as f:
+                data = json.load(f)
+            if data.get('every') == every:
+                return LineIndex(**data)
+        except Exception as _:
+            pass
+        return LineIndex(every=every)
+
+    def save(self, filePath: str) -> bool:
+        try:
+            temp = f'{LineIndex.sidecar(filePath)}.tmp'
+            with open(temp, mode='w') as f:
+                json.dump({
+                    'every': self.every,
+                    'rows': self.rows,
+                    'size': self.size,
+                    'ordered': self.ordered,
+                    'last': self.last,
+                    'offsets': self.offsets}, f)
+            os.replace(temp, LineIndex.sidecar(filePath))
+            return True
+        except Exception as _:
+            return False
+
+    def reset(self):
+        self.rows = 0
+        self.size = 0
+        self.ordered = True
+        self.last = ''
+        self.offsets = []
+
+    def observe(self, lines: list[bytes], start: int) -> bool:
+        '''
+        accounts for complete lines written at byte offset start, returns True
+        if a new offset was recorded.
+        '''
+        added = False
+        position = start
+        for line in lines:
+            if self.rows % self.every == 0:
+                self.offsets.append(position)
+                added = True
+            time = line.split(b',', 1)[0].decode()
+            if self.rows > 0 and time <= self.last:
+                self.ordered = False
+            self.last = time
+            self.rows += 1
+            position += len(line)
+        self.size = position
+        return added
+
+    def isStale(self, filePath: str, size: int) -> bool:
+        ''' true if the part of the file we've indexed was changed by someone else '''
+        if size < self.size:
+            return True
+        if self.size == 0:
+            return False
+        with open(filePath, 'rb') as f:
+            f.seek(max(self.size - 4096, 0))
+            window = f.read(self.size - max(self.size - 4096, 0))
+        lines = window.splitlines(keepends=True)
+        return (
+            not window.endswith(b'\n') or
+            not lines[-1].startswith(f'{self.last},'.encode()))
+
+    def catchUp(self, filePath: str) -> bool:
+        ''' indexes anything appended since we last looked, returns True if changed '''
+        size = os.path.getsize(filePath)
+        stale = self.isStale(filePath, size)
+        if size == self.size and not stale:
+            return False
+        if stale:
+            self.reset()
+        with open(filePath, 'rb') as f:
+            f.seek(self.size)
+            lines = f.read().splitlines(keepends=True)
+        if len(lines) > 0 and not lines[-1].endswith(b'\n'):
+            # partially written row
+            lines = lines[:-1]
+        self.observe(lines, start=self.size)
+        return True
+
+    def offsetOf(self, filePath: str, row: int) -> Union[int, None]:
+        ''' byte offset at which the given row starts '''
+        if row > self.rows or row < 0:
+            return None
+        if row == self.rows:
+            return self.size
+        offset = self.offsets[row // self.every]
+        with open(filePath, 'rb') as f:
+            f.seek(offset)
+            for _ in range(row % self.every):
+                offset += len(f.readline())
+        return offset
+
+
 class CSVManager(FileManager):
     ''' manages reading and writing to CSV files usind pandas '''
 
+    def __init__(self, indexEvery: int = None):
+        '''
+        indexEvery - if given we maintain a LineIndex sidecar with the byte
+        offset of every indexEvery rows.
+        '''
+        self.indexEvery = indexEvery
+        self.indexes: dict[str, LineIndex] = {}
+
     def _conformBasic(self, df: pd.DataFrame) -> pd.DataFrame:
         return self._conformIndexName(self.conformFlatColumns(df))
 
@@ -35,7 +174,101 @@ class CSVManager(FileManager):
     def _merge(self, dfs: list[pd.DataFrame]) -> pd.DataFrame:
         return self._clean(pd.concat(dfs, axis=0))
 
+    ### line index ###
+
+    def lineIndex(self, filePath: str) -> Union[LineIndex, None]:
+        ''' the up to date line index of this file, None if not indexing '''
+        if self.indexEvery is None or not os.path.exists(filePath):
+            return None
+        index = self.indexes.get(filePath)
+        if index is None:
+            index = LineIndex.load(filePath, every=self.indexEvery)
+            self.indexes[filePath] = index
+        if index.catchUp(filePath):
+            index.save(filePath)
+        return index
+
+    def lastTime(self, filePath: str) -> Union[str, None]:
+        ''' straight from the line index if the file is in order '''
+        index = self.lineIndex(filePath)
+        if index is not None and index.ordered:
+            return index.last if index.rows > 0 else None
+        return super().lastTime(filePath)
+
+    def mirrors(self, filePath: str, rows: int) -> bool:
+        '''
+        true if the rows of the file are in order and there are as many as we
+        expect, so row numbers in memory are line numbers in the file.
+        '''
+        index = self.lineIndex(filePath)
+        return index is not None and index.ordered and index.rows == rows
+
+    def _writeText(self, filePath: str, data: pd.DataFrame, mode: str):
+        ''' writes rows ourselves so we know where each one lands '''
+        text = data.to_csv(float_format='%.10f', header=False).encode()
+        if mode == 'wb':
+            index = LineIndex(every=self.indexEvery)
+        else:
+            index = self.lineIndex(filePath) or LineIndex(every=self.indexEvery)
+        self.indexes[filePath] = index
+        with open(filePath, mode) as f:
+            start = f.tell()
+            f.write(text)
+        if start != index.size:
+            # a partial row was already at the end of the file
+            index.catchUp(filePath)
+            index.save(filePath)
+        elif index.observe(text.splitlines(keepends=True), start=start) or mode == 'wb':
+            index.save(filePath)
+
+    def truncate(self, filePath: str, row: int) -> bool:
+        ''' cuts the file off just before the given row '''
+        try:
+            index = self.lineIndex(filePath)
+            if index is None:
+                return False
+            offset = index.offsetOf(filePath, row)
+            if offset is None:
+                return False
+            last = ''
+            if row > 0:
+                with open(filePath, 'rb') as f:
+                    f.seek(index.offsetOf(filePath, row - 1))
+                    last = f.readline().split(b',', 1)[0].decode()
+            os.truncate(filePath, offset)
+            index.offsets = index.offsets[:(row + index.every - 1) // index.every]
+            index.rows = row
+            index.size = offset
+            index.last = last
+            index.save(filePath)
+            return True
+        except Exception as e:
+            logging.error('unable to truncate', e, print=True)
+            return False
+
+    ### FileManager ###
+
+    def replace(self, source: str, filePath: str) -> bool:
+        ''' the line index goes with the rows it describes '''
+        self.indexes.pop(source, None)
+        self.indexes.pop(filePath, None)
+        if not super().replace(source, filePath):
+            return False
+        try:
+            if os.path.exists(LineIndex.sidecar(source)):
+                os.replace(LineIndex.sidecar(source), LineIndex.sidecar(filePath))
+            else:
+                os.remove(LineIndex.sidecar(filePath))
+        except Exception as _:
+            pass
+        return True
+
     def remove(self, filePath: str) -> Union[bool, None]:
+        self.indexes.pop(filePath, None)
+        try:
+            os.remove(LineIndex.sidecar(filePath))
+        except Exception as _:
+            pass
         try:
             os.remove(filePath)
             return True
@@ -61,6 +294,9 @@ class CSVManager(FileManager):
 
     def write(self, filePath: str, data: pd.DataFrame) -> bool:
         try:
+            if self.indexEvery is not None:
+                self._writeText(filePath, data, mode='wb')
+                return True
             data.to_csv(filePath, float_format='%.10f', header=False)
             return True
         except Exception as _:
@@ -68,6 +304,9 @@ class CSVManager(FileManager):
 
     def append(self, filePath: str, data: pd.DataFrame) -> bool:
         try:
+            if self.indexEvery is not None:
+                self._writeText(filePath, data, mode='ab')
+                return True
             data.to_csv(filePath, float_format='%.10f', mode='a', header=False)
             return True
         except Exception as _:
@@ -82,6 +321,9 @@ class CSVManager(FileManager):
         ''' 0-indexed '''
         end = (end if end is not None and end > start else None) or start+1
         capture = end - start - 1
+        index = self.lineIndex(filePath)
+        if index is not None:
+            return self._readLinesIndexed(filePath, index, start, end)
         try:
             df = self._conformBasic(pd.read_table(
                 filePath,
@@ -96,3 +338,24 @@ class CSVManager(FileManager):
         except Exception as e:
             logging.error('unable to get data', e, print=True)
             return None
+
+    def _readLinesIndexed(
+        self,
+        filePath: str,
+        index: LineIndex,
+        start: int,
+        end: int,
+    ) -> Union[pd.DataFrame, None]:
+        ''' seeks to the start row and parses only the rows asked for '''
+        try:
+            offset = index.offsetOf(filePath, min(start, index.rows))
+            with open(filePath, 'rb') as f:
+                f.seek(offset)
+                lines = [f.readline() for _ in range(min(end, index.rows) - start)]
+            return self._conformBasic(pd.read_csv(
+                io.BytesIO(b''.join(lines)),
+                index_col=0,
+                header=None))
+        except Exception as e:
+            logging.error('unable to get data', e, print=True)
+            return None
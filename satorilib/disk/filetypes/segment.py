@@ -0,0 +1,216 @@
+'''
+append-only binary segment files.
+
+each stream is a folder of fixed-width segment files. every row is 24 bytes:
+an int64 epoch-nanosecond timestamp, a float64 value and the 8 byte hash as a
+uint64. new rows are appended to the last (active) segment until it is full,
+then a new segment is started. this means appending never touches prior data
+and reading is a straight copy from disk instead of parsing text.
+
+notes:
+    timestamps are stored as integers so they come back out in the canonical
+    format (see satorilib.utils.time.datetimeToTimestamp). values must be
+    numeric, anything else is stored as nan.
+'''
+from typing import Union
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from satorilib.interfaces.data import FileManager
+from satorilib.disk.utils import (
+    timestampsToNanos,
+    nanosToTimestamps,
+    hashesToInts,
+    intsToHashes,
+    valuesToFloats)
+from satorilib import logging
+
+
+class SegmentManager(FileManager):
+    ''' manages reading and writing to fixed-width binary segment files '''
+
+    rowType = np.dtype([('time', '<i8'), ('value', '<f8'), ('hash', '<u8')])
+
+    def __init__(self, segmentRows: int = 2**20):
+        self.segmentRows = segmentRows
+
+    def _conformBasic(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._conformIndexName(self.conformFlatColumns(df))
+
+    def _conformIndexName(self, df: pd.DataFrame) -> pd.DataFrame:
+        df.index.name = None
+        return df
+
+    def conformFlatColumns(self, df: pd.DataFrame) -> pd.DataFrame:
+        if len(df.columns) == 1:
+            df.columns = ['value']
+        if len(df.columns) == 2:
+            df.columns = ['value', 'hash']
+        return df
+
+    def _clean(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._sort(self._dedupe(df))
+
+    def _sort(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.sort_index()
+
+    def _dedupe(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df[~df.index.duplicated(keep='last')]
+
+    ### segments ###
+
+    @staticmethod
+    def segmentName(number: int) -> str:
+        return f'{number:08d}.seg'
+
+    def segments(self, filePath: str) -> list[str]:
+        ''' paths of all segments in order, the last one is the active one '''
+        if not os.path.isdir(filePath):
+            return []
+        return [
+            os.path.join(filePath, name)
+            for name in sorted(os.listdir(filePath))
+            if name.endswith('.seg')]
+
+    def segmentLength(self, segmentPath: str) -> int:
+        ''' number of complete rows, a partially written row is ignored '''
+        return os.path.getsize(segmentPath) // self.rowType.itemsize
+
+    def toRows(self, data: pd.DataFrame) -> np.ndarray:
+        data = self.conformFlatColumns(data)
+        rows = np.empty(data.shape[0], dtype=self.rowType)
+        rows['time'] = timestampsToNanos(data.index)
+        rows['value'] = valuesToFloats(data['value'].values)
+        rows['hash'] = (
+            hashesToInts(data['hash'].values)
+            if 'hash' in data.columns else 0)
+        return rows
+
+    def fromRows(self, rows: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                'value': rows['value'],
+                'hash': intsToHashes(rows['hash'])},
+            index=nanosToTimestamps(rows['time']))
+
+    def _readSegment(self, segmentPath: str, start: int = 0, count: int = -1) -> np.ndarray:
+        with open(segmentPath, 'rb') as f:
+            f.seek(start * self.rowType.itemsize)
+            raw = f.read(
+                -1 if count < 0 else count * self.rowType.itemsize)
+        usable = len(raw) - len(raw) % self.rowType.itemsize
+        return np.frombuffer(raw[:usable], dtype=self.rowType)
+
+    def _writeSegments(self, folder: str, rows: np.ndarray, first: int = 0):
+        os.makedirs(folder, exist_ok=True)
+        for number, start in enumerate(range(0, len(rows), self.segmentRows), start=first):
+            with open(os.path.join(folder, self.segmentName(number)), 'wb') as f:
+                f.write(rows[start:start+self.segmentRows].tobytes())
+
+    def lastTime(self, filePath: str) -> Union[str, None]:
+        ''' the last row of the active segment, rows are appended in time order '''
+        for segment in reversed(self.segments(filePath)):
+            length = self.segmentLength(segment)
+            if length > 0:
+                return nanosToTimestamps(self._readSegment(segment, start=length - 1)['time'])[0]
+        return None
+
+    def readRows(self, filePath: str) -> np.ndarray:
+        ''' the raw rows of every segment in file order '''
+        segments = self.segments(filePath)
+        if len(segments) == 0:
+            return np.empty(0, dtype=self.rowType)
+        return np.concatenate([self._readSegment(s) for s in segments])
+
+    ### FileManager ###
+
+    def remove(self, filePath: str) -> Union[bool, None]:
+        try:
+            shutil.rmtree(filePath)
+            return True
+        except FileNotFoundError as _:
+            return None
+        except Exception as _:
+            return False
+
+    def read(self, filePath: str, **kwargs) -> pd.DataFrame:
+        try:
+            rows = self.readRows(filePath)
+            if len(rows) == 0:
+                return None
+            return self._clean(self._conformBasic(self.fromRows(rows)))
+        except Exception as _:
+            return None
+
+    def write(self, filePath: str, data: pd.DataFrame) -> bool:
+        ''' writes to a sibling folder first then swaps it in '''
+        try:
+            rows = self.toRows(data)
+            temp = f'{filePath}.tmp'
+            shutil.rmtree(temp, ignore_errors=True)
+            self._writeSegments(temp, rows)
+            os.makedirs(temp, exist_ok=True)
+            shutil.rmtree(filePath, ignore_errors=True)
+            os.replace(temp, filePath)
+            return True
+        except Exception as e:
+            logging.error('unable to write segments', e, print=True)
+            return False
+
+    def append(self, filePath: str, data: pd.DataFrame) -> bool:
+        try:
+            rows = self.toRows(data)
+            if len(rows) == 0:
+                return True
+            segments = self.segments(filePath)
+            if len(segments) == 0:
+                self._writeSegments(filePath, rows)
+                return True
+            active = segments[-1]
+            activeLength = self.segmentLength(active)
+            room = max(self.segmentRows - activeLength, 0)
+            if room > 0:
+                with open(active, 'r+b') as f:
+                    # drop any partially written row before appending
+                    f.truncate(activeLength * self.rowType.itemsize)
+                    f.seek(0, os.SEEK_END)
+                    f.write(rows[:room].tobytes())
+            if len(rows) > room:
+                self._writeSegments(
+                    filePath,
+                    rows[room:],
+                    first=int(os.path.basename(active).split('.')[0]) + 1)
+            return True
+        except Exception as e:
+            logging.error('unable to append to segments', e, print=True)
+            return False
+
+    def readLines(
+        self,
+        filePath: str,
+        start: int,
+        end: int = None,
+    ) -> Union[pd.DataFrame, None]:
+        ''' 0-indexed, end exclusive, seeks directly to the rows '''
+        end = (end if end is not None and end > start else None) or start+1
+        try:
+            chunks = []
+            offset = 0
+            for segment in self.segments(filePath):
+                length = self.segmentLength(segment)
+                if offset + length > start and offset < end:
+                    first = max(start - offset, 0)
+                    chunks.append(self._readSegment(
+                        segment,
+                        start=first,
+                        count=min(end - offset, length) - first))
+                offset += length
+                if offset >= end:
+                    break
+            if len(chunks) == 0:
+                return None
+            return self._conformBasic(self.fromRows(np.concatenate(chunks)))
+        except Exception as e:
+            logging.error('unable to get data', e, print=True)
+            return None
@@ -1,93 +1,274 @@
-from typing import Union, List
+'''
+many streams in one sqlite database, one table per stream.
+
+each table is (ts INTEGER PRIMARY KEY, value REAL, hash INTEGER) where ts is
+the epoch-nanosecond timestamp and hash is the 8 byte hash stored as a signed
+integer (sqlite integers are signed, we reinterpret the bits both ways). since
+ts is the primary key it is also the rowid so point and range lookups are
+b-tree seeks and rows always come back in time order. a second write of the
+same timestamp replaces the first, the same as our dataframes keep='last'.
+
+the database runs in WAL mode so readers don't block the writer. statements
+are kept to a few fixed strings per table so sqlite3's statement cache reuses
+them, and appends are one executemany in one transaction.
+
+the filePath argument of the FileManager methods is the stream's table name.
+'''
+from typing import Union, Iterator
+import threading
+import sqlite3
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, Table, MetaData, select, insert, delete
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
 from satorilib.interfaces.data import FileManager
+from satorilib.disk.utils import (
+    timestampsToNanos,
+    timestampToNanos,
+    nanosToTimestamps,
+    hashesToInts,
+    intsToHashes,
+    valuesToFloats)
 from satorilib import logging
 
+
 class SqliteManager(FileManager):
-    ''' manages reading and writing to sqlite database using pandas '''
+    ''' manages reading and writing streams to a sqlite database '''
+
+    def __init__(self, connection_string: str, cachedStatements: int = 256):
+        '''
+        connection_string - a path to the database file, a sqlalchemy style
+        'sqlite:///path' is also accepted
+        '''
+        self.path = connection_string.split('sqlite:///', 1)[-1]
+        self.lock = threading.RLock()
+        self.tables: set[str] = set()
+        self.connection = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=cachedStatements)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
 
-    def __init__(self, connection_string: str):
-        self.engine = create_engine(connection_string)
-        self.Session = sessionmaker(bind=self.engine)
-        self.metadata = MetaData()
+    def close(self):
+        with self.lock:
+            self.connection.close()
 
-    def _conform_basic(self, df: pd.DataFrame) -> pd.DataFrame:
-        return self._conform_index_name(self.conform_flat_columns(df))
+    def _conformBasic(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._conformIndexName(self.conformFlatColumns(df))
 
-    def _conform_index_name(self, df: pd.DataFrame) -> pd.DataFrame:
-        df.index.name = 'id'
+    def _conformIndexName(self, df: pd.DataFrame) -> pd.DataFrame:
+        df.index.name = None
         return df
 
-    def conform_flat_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+    def conformFlatColumns(self, df: pd.DataFrame) -> pd.DataFrame:
         if len(df.columns) == 1:
             df.columns = ['value']
         if len(df.columns) == 2:
             df.columns = ['value', 'hash']
         return df
 
-    def _clean(self, df: pd.DataFrame) -> pd.DataFrame:
-        return self._sort(self._dedupe(df))
+    ### tables ###
+
+    @staticmethod
+    def quote(table: str) -> str:
+        return '"' + table.replace('"', '""') + '"'
+
+    def _exists(self, table: str) -> bool:
+        if table in self.tables:
+            return True
+        found = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+            (table,)).fetchone() is not None
+        if found:
+            self.tables.add(table)
+        return found
+
+    def _create(self, table: str):
+        if table in self.tables:
+            return
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.quote(table)} '
+            '(ts INTEGER PRIMARY KEY, value REAL, hash INTEGER)')
+        self.tables.add(table)
+
+    def toRows(self, data: pd.DataFrame) -> list[tuple]:
+        data = self.conformFlatColumns(data)
+        times = timestampsToNanos(data.index)
+        values = valuesToFloats(data['value'].values)
+        hashes = (
+            hashesToInts(data['hash'].values).view('int64')
+            if 'hash' in data.columns
+            else np.zeros(data.shape[0], dtype='int64'))
+        keep = times != np.iinfo('int64').min
+        return list(zip(
+            times[keep].tolist(),
+            [None if np.isnan(v) else v for v in values[keep].tolist()],
+            hashes[keep].tolist()))
+
+    def fromRows(self, rows: list[tuple]) -> pd.DataFrame:
+        if len(rows) == 0:
+            return None
+        times, values, hashes = zip(*rows)
+        return self._conformBasic(pd.DataFrame(
+            {
+                'value': np.array(values, dtype='float64'),
+                'hash': intsToHashes(np.array(hashes, dtype='int64').view('uint64'))},
+            index=nanosToTimestamps(times)))
 
-    def _sort(self, df: pd.DataFrame) -> pd.DataFrame:
-        return df.sort_index()
+    def _insert(self, table: str, data: pd.DataFrame):
+        self.connection.executemany(
+            f'INSERT OR REPLACE INTO {self.quote(table)} (ts, value, hash) VALUES (?, ?, ?)',
+            self.toRows(data))
 
-    def _dedupe(self, df: pd.DataFrame) -> pd.DataFrame:
-        return df[~df.index.duplicated(keep='last')]
+    def _select(self, table: str, where: str = '', params: tuple = (), suffix: str = '') -> list[tuple]:
+        with self.lock:
+            if not self._exists(table):
+                return []
+            return self.connection.execute(
+                f'SELECT ts, value, hash FROM {self.quote(table)} {where} ORDER BY ts {suffix}',
+                params).fetchall()
 
-    def _merge(self, dfs: List[pd.DataFrame]) -> pd.DataFrame:
-        return self._clean(pd.concat(dfs, axis=0))
+    def streams(self) -> list[str]:
+        with self.lock:
+            return [row[0] for row in self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+
+    def count(self, table: str) -> int:
+        with self.lock:
+            if not self._exists(table):
+                return 0
+            return self.connection.execute(
+                f'SELECT COUNT(*) FROM {self.quote(table)}').fetchone()[0]
+
+    def lastTime(self, filePath: str) -> Union[str, None]:
+        ''' the end of the primary key's b-tree '''
+        with self.lock:
+            if not self._exists(filePath):
+                return None
+            latest = self.connection.execute(
+                f'SELECT MAX(ts) FROM {self.quote(filePath)}').fetchone()[0]
+        return nanosToTimestamps([latest])[0] if latest is not None else None
+
+    def lookup(self, table: str, time: str) -> Union[pd.DataFrame, None]:
+        ''' the row at exactly this time '''
+        return self.fromRows(self._select(
+            table, 'WHERE ts = ?', (timestampToNanos(time),)))
+
+    def readBetween(
+        self,
+        table: str,
+        start: str = None,
+        end: str = None,
+    ) -> Union[pd.DataFrame, None]:
+        ''' rows with start <= time < end, an index range scan '''
+        return self.fromRows(self._select(
+            table,
+            'WHERE ts >= ? AND ts < ?',
+            (
+                timestampToNanos(start) if start is not None else np.iinfo('int64').min,
+                timestampToNanos(end) if end is not None else np.iinfo('int64').max)))
+
+    def page(
+        self,
+        table: str,
+        after: str = None,
+        limit: int = 10000,
+    ) -> Union[pd.DataFrame, None]:
+        '''
+        keyset pagination: up to limit rows strictly after the given time.
+        pass the last time of one page as after to get the next, each page is
+        a seek no matter how deep into the stream it is.
+        '''
+        return self.fromRows(self._select(
+            table,
+            'WHERE ts > ?',
+            (
+                timestampToNanos(after) if after is not None else np.iinfo('int64').min,
+                limit),
+            'LIMIT ?'))
+
+    def iterate(self, table: str, batchSize: int = 10000) -> Iterator[pd.DataFrame]:
+        ''' the whole stream as dataframes of up to batchSize rows, in time order '''
+        after = None
+        while True:
+            df = self.page(table, after=after, limit=batchSize)
+            if df is None:
+                return
+            yield df
+            if df.shape[0] < batchSize:
+                return
+            after = df.index[-1]
+
+    ### FileManager ###
+
+    def replace(self, source: str, filePath: str) -> bool:
+        ''' renames source's table over ours in one transaction '''
+        try:
+            with self.lock, self.connection:
+                self.connection.execute(f'DROP TABLE IF EXISTS {self.quote(filePath)}')
+                self.connection.execute(
+                    f'ALTER TABLE {self.quote(source)} RENAME TO {self.quote(filePath)}')
+                self.tables.discard(source)
+                self.tables.add(filePath)
+            return True
+        except sqlite3.Error as e:
+            logging.error(f'Error replacing table {filePath}', e, print=True)
+            return False
 
-    def remove(self, table_name: str) -> Union[bool, None]:
+    def remove(self, filePath: str) -> Union[bool, None]:
         try:
-            table = Table(table_name, self.metadata, autoload_with=self.engine)
-            table.drop(self.engine)
+            with self.lock, self.connection:
+                if not self._exists(filePath):
+                    return None
+                self.connection.execute(f'DROP TABLE {self.quote(filePath)}')
+                self.tables.discard(filePath)
             return True
-        except SQLAlchemyError as e:
-            logging.error(f"Error removing table {table_name}", e, print=True)
+        except sqlite3.Error as e:
+            logging.error(f'Error removing table {filePath}', e, print=True)
             return False
 
-    def read(self, table_name: str, **kwargs) -> pd.DataFrame:
+    def read(self, filePath: str, **kwargs) -> pd.DataFrame:
         try:
-            table = Table(table_name, self.metadata, autoload_with=self.engine)
-            with self.Session() as session:
-                result = session.execute(select(table))
-                df = pd.DataFrame(result.fetchall(), columns=result.keys())
-                return self._clean(self._conform_basic(df.set_index('id')))
-        except SQLAlchemyError as e:
-            logging.error(f"Error reading from table {table_name}", e, print=True)
+            return self.fromRows(self._select(filePath))
+        except sqlite3.Error as e:
+            logging.error(f'Error reading from table {filePath}', e, print=True)
             return None
 
-    def write(self, table_name: str, data: pd.DataFrame) -> bool:
+    def write(self, filePath: str, data: pd.DataFrame) -> bool:
+        ''' replaces the stream in one transaction '''
         try:
-            data = self._conform_basic(data)
-            data.to_sql(table_name, self.engine, if_exists='replace', index=True)
+            with self.lock, self.connection:
+                self._create(filePath)
+                self.connection.execute(f'DELETE FROM {self.quote(filePath)}')
+                self._insert(filePath, data)
             return True
-        except SQLAlchemyError as e:
-            logging.error(f"Error writing to table {table_name}", e, print=True)
+        except sqlite3.Error as e:
+            logging.error(f'Error writing to table {filePath}', e, print=True)
             return False
 
-    def append(self, table_name: str, data: pd.DataFrame) -> bool:
+    def append(self, filePath: str, data: pd.DataFrame) -> bool:
         try:
-            data = self._conform_basic(data)
-            data.to_sql(table_name, self.engine, if_exists='append', index=True)
+            with self.lock, self.connection:
+                self._create(filePath)
+                self._insert(filePath, data)
             return True
-        except SQLAlchemyError as e:
-            logging.error(f"Error appending to table {table_name}", e, print=True)
+        except sqlite3.Error as e:
+            logging.error(f'Error appending to table {filePath}', e, print=True)
             return False
 
-    def read_lines(self, table_name: str, start: int, end: int = None) -> Union[pd.DataFrame, None]:
-        ''' 0-indexed '''
-        end = (end if end is not None and end > start else None) or start + 1
+    def readLines(
+        self,
+        filePath: str,
+        start: int,
+        end: int = None,
+    ) -> Union[pd.DataFrame, None]:
+        '''
+        0-indexed, end exclusive. row numbers mean an OFFSET which sqlite has
+        to walk, use page to go through a stream.
+        '''
+        end = (end if end is not None and end > start else None) or start+1
         try:
-            table = Table(table_name, self.metadata, autoload_with=self.engine)
-            with self.Session() as session:
-                query = select(table).order_by(table.c.id).offset(start).limit(end - start)
-                result = session.execute(query)
-                df = pd.DataFrame(result.fetchall(), columns=result.keys())
-                return self._conform_basic(df.set_index('id'))
-        except SQLAlchemyError as e:
-            logging.error(f"Error reading lines from table {table_name}", e, print=True)
+            return self.fromRows(self._select(
+                filePath, suffix='LIMIT ? OFFSET ?', params=(end - start, start)))
+        except sqlite3.Error as e:
+            logging.error(f'Error reading lines from table {filePath}', e, print=True)
             return None
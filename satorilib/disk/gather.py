@@ -0,0 +1,203 @@
+'''
+gathers several streams into one frame for an engine, quickly and repeatedly.
+
+Memory.merge lines streams up with a chain of pairwise merge_asof calls, each
+after converting the frames' string indexes to datetimes. here the streams'
+snapshots are fetched in parallel and joined in one pass: every stream keeps
+its sorted int64 timestamps, so for each row of the target stream the latest
+row of every other stream at or before it is a single searchsorted. the result
+is the same as Memory.merge (the target stream's rows, a datetime index, one
+column per stream) and with one stream it's that stream, expanded, like gather.
+
+a joined frame is kept per set of streams, keyed by every input's row count and
+tip hash. if none of the inputs changed the next gather hands that frame back
+without joining anything. callers get their own copy, they're free to modify
+it in place (models do, see Memory.appendInsert).
+'''
+from typing import Union
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.disk.utils import timestampsToNanos
+from satorilib.disk.snapshot import Snapshot, timesOf
+
+
+def columnOf(streamId: StreamId) -> tuple:
+    ''' the column a stream's values get, the same as Memory.expand gives them '''
+    return (streamId.source, streamId.author, streamId.stream, streamId.target)
+
+
+def arraysOf(snapshot: Snapshot) -> Union[tuple[np.ndarray, np.ndarray], None]:
+    ''' sorted int64 times and the values that go with them, None if empty '''
+    if snapshot.rowCount == 0:
+        return None
+    times = snapshot.times
+    if times is not None:
+        return times, snapshot.values
+    # not in order or not all timestamps, sort out what we can
+    df = snapshot.df
+    times = timestampsToNanos(df.index)
+    keep = np.flatnonzero(times != np.iinfo('int64').min)
+    order = keep[np.argsort(times[keep], kind='stable')]
+    return times[order], df['value'].to_numpy()[order]
+
+
+def asOfArrays(arrays: list[tuple[np.ndarray, np.ndarray]]) -> list[np.ndarray]:
+    '''
+    the values of every stream lined up on the first stream's times: the
+    latest value at or before each of them (NaN where there is none yet).
+    '''
+    times = arrays[0][0]
+    aligned = [arrays[0][1]]
+    for otherTimes, otherValues in arrays[1:]:
+        positions = np.searchsorted(otherTimes, times, side='right') - 1
+        values = otherValues[np.maximum(positions, 0)]
+        missing = positions < 0
+        if missing.any():
+            values = values.astype('float64' if values.dtype.kind in 'iuf' else 'object')
+            values[missing] = np.nan
+        aligned.append(values)
+    return aligned
+
+
+def asOfJoin(
+    columns: list[tuple],
+    arrays: list[tuple[np.ndarray, np.ndarray]],
+) -> pd.DataFrame:
+    ''' asOfArrays as a frame with a datetime index and a column per stream '''
+    return pd.DataFrame(
+        dict(zip(columns, asOfArrays(arrays))),
+        index=pd.DatetimeIndex(arrays[0][0].view('datetime64[ns]')),
+        columns=pd.MultiIndex.from_tuples(columns))
+
+
+def targetFirst(columns: list[tuple], targetColumn: 'str|tuple[str]') -> int:
+    ''' which stream to join the others onto, the first one if none match '''
+    for i, column in enumerate(columns):
+        if targetColumn in pd.MultiIndex.from_tuples([column]):
+            return i
+    return 0
+
+
+class GatherService():
+    ''' parallel, memoized gathers over the caches of a CacheRegistry '''
+
+    _instance: Union['GatherService', None] = None
+
+    def __init__(self, registry: 'CacheRegistry' = None, workers: int = None, keep: int = 64):
+        '''
+        registry - where the caches come from, defaults to the process wide one
+        workers - threads fetching snapshots (loading evicted caches)
+        keep - how many joined frames to remember
+        '''
+        self._registry = registry
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.keep = keep
+        self.joined: OrderedDict[tuple, tuple[tuple, pd.DataFrame]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> 'GatherService':
+        if cls._instance is None:
+            cls._instance = GatherService()
+        return cls._instance
+
+    @classmethod
+    def setInstance(cls, service: 'GatherService'):
+        cls._instance = service
+
+    @property
+    def registry(self) -> 'CacheRegistry':
+        if self._registry is None:
+            from satorilib.disk.registry import CacheRegistry
+            return CacheRegistry.instance()
+        return self._registry
+
+    def snapshots(self, streamIds: list[StreamId], caches: dict = None) -> list[Snapshot]:
+        ''' the current snapshot of each stream, loading caches in parallel '''
+        caches = caches or {}
+        others = [s for s in streamIds if s not in caches]
+        missing = [s for s in others if s not in self.registry]
+        if len(missing) > 1:
+            for future in self.registry.warm(missing, workers=self.workers, validate=False).values():
+                future.exception()
+        found = dict(zip(others, self.registry.cachesOf(others)))
+        found.update(caches)
+        ordered = [found[streamId] for streamId in streamIds]
+        # taking a snapshot is a reference read unless the cache was evicted
+        evicted = [cache for cache in ordered if cache.isEvicted]
+        if len(evicted) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(self.workers, len(evicted)),
+                thread_name_prefix='gather',
+            ) as executor:
+                list(executor.map(lambda cache: cache.snapshot(), evicted))
+        return [cache.snapshot() for cache in ordered]
+
+    def gather(
+        self,
+        targetColumn: 'str|tuple[str]',
+        streamIds: list[StreamId],
+        caches: dict = None,
+    ) -> Union[pd.DataFrame, None]:
+        '''
+        the streams lined up on the target stream's times. caches - caches
+        to use for some of the streams instead of the registry's.
+        '''
+        snapshots = self.snapshots(streamIds, caches)
+        tips = tuple(
+            (snapshot.rowCount, snapshot.tip[0], snapshot.tip[2])
+            if snapshot.tip is not None else (snapshot.rowCount,)
+            for snapshot in snapshots)
+        key = (tuple(streamIds), targetColumn)
+        with self.lock:
+            known = self.joined.get(key)
+            if known is not None and known[0] == tips:
+                self.joined.move_to_end(key)
+                return known[1].copy(deep=True) if known[1] is not None else None
+        joined = self.join(targetColumn, streamIds, snapshots)
+        with self.lock:
+            self.joined[key] = (tips, joined)
+            self.joined.move_to_end(key)
+            while len(self.joined) > self.keep:
+                self.joined.popitem(last=False)
+        return joined.copy(deep=True) if joined is not None else None
+
+    @staticmethod
+    def join(
+        targetColumn: 'str|tuple[str]',
+        streamIds: list[StreamId],
+        snapshots: list[Snapshot],
+    ) -> Union[pd.DataFrame, None]:
+        present = [
+            (streamId, snapshot) for streamId, snapshot in zip(streamIds, snapshots)
+            if snapshot is not None and snapshot.rowCount > 0]
+        if len(present) == 0:
+            return None
+        if len(present) == 1:
+            streamId, snapshot = present[0]
+            df = snapshot.df[['value']].copy(deep=False)
+            df.columns = pd.MultiIndex.from_tuples([columnOf(streamId)])
+            return df.sort_index()
+        return asOfJoin(*GatherService.arrange(targetColumn, present))
+
+    @staticmethod
+    def arrange(
+        targetColumn: 'str|tuple[str]',
+        present: list[tuple[StreamId, Snapshot]],
+    ) -> tuple[list[tuple], list[tuple[np.ndarray, np.ndarray]]]:
+        ''' columns and arrays of the streams, the target stream first '''
+        columns = [columnOf(streamId) for streamId, _ in present]
+        arrays = [arraysOf(snapshot) for _, snapshot in present]
+        first = targetFirst(columns, targetColumn)
+        order = [first] + [i for i in range(len(columns)) if i != first]
+        return [columns[i] for i in order], [arrays[i] for i in order]
+
+
+def snapshotOfFrame(df: pd.DataFrame) -> Snapshot:
+    ''' a one-off snapshot of a frame read from disk '''
+    return Snapshot(version=0, frame=df, times=timesOf(df))
@@ -0,0 +1,200 @@
+'''
+a merkle tree over fixed size blocks of a stream's hash column.
+
+each leaf is the hash of one block of row hashes, the last leaf may cover a
+partial block. nodes at level k index j always cover leaves [j*2^k, (j+1)*2^k)
+so a node built entirely out of full blocks is identical in two copies of a
+stream exactly when those blocks are. comparing two summaries from the top
+finds the first differing block in O(log n) node comparisons, after which only
+the tail from that block onward needs to be transferred and re-verified.
+
+the hash of the partial block is kept running, so adding a row hashes that
+row and the path from its leaf to the root, not the whole block again.
+'''
+from typing import Union
+import os
+import json
+import hashlib
+
+
+def _hashNode(string: str) -> str:
+    return hashlib.blake2s(string.encode(), digest_size=8).hexdigest()
+
+
+def _hasher(hashes: list[str] = None) -> 'hashlib.blake2s':
+    ''' _hashNode of the joined hashes, so far '''
+    hasher = hashlib.blake2s(digest_size=8)
+    for rowHash in hashes or []:
+        hasher.update(rowHash.encode())
+    return hasher
+
+
+class MerkleSummary():
+    ''' incrementally maintained merkle tree over blocks of row hashes '''
+
+    def __init__(self, blockSize: int = 1024):
+        self.blockSize = blockSize
+        self.rows = 0
+        self.tipHash = ''
+        self.levels: list[list[str]] = [[]]
+        self.tail: list[str] = []
+        self._tailHasher = _hasher()
+
+    @property
+    def leaves(self) -> list[str]:
+        return self.levels[0]
+
+    @property
+    def fullBlocks(self) -> int:
+        return self.rows // self.blockSize
+
+    @property
+    def root(self) -> str:
+        return self.levels[-1][0] if len(self.levels[-1]) > 0 else ''
+
+    def node(self, level: int, index: int) -> Union[str, None]:
+        if level < len(self.levels) and index < len(self.levels[level]):
+            return self.levels[level][index]
+        return None
+
+    def _refresh(self, leaf: int):
+        ''' recomputes the path from a changed leaf to the root '''
+        index = leaf
+        level = 0
+        while len(self.levels[level]) > 1:
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            parent = index // 2
+            children = self.levels[level][parent*2:parent*2+2]
+            value = _hashNode(''.join(children))
+            if parent < len(self.levels[level+1]):
+                self.levels[level+1][parent] = value
+            else:
+                self.levels[level+1].append(value)
+            index = parent
+            level += 1
+        del self.levels[level+1:]
+
+    def _setLeaf(self, leaf: int, value: str):
+        if leaf < len(self.leaves):
+            self.leaves[leaf] = value
+        else:
+            self.leaves.append(value)
+        self._refresh(leaf)
+
+    def extend(self, hashes: list[str]) -> int:
+        ''' adds row hashes to the end, returns the number of blocks completed '''
+        completed = 0
+        for rowHash in hashes:
+            self.tail.append(rowHash)
+            self._tailHasher.update(rowHash.encode())
+            self.rows += 1
+            if len(self.tail) == self.blockSize:
+                self._setLeaf(self.fullBlocks - 1, self._tailHasher.hexdigest())
+                self.tail = []
+                self._tailHasher = _hasher()
+                completed += 1
+        if len(self.tail) > 0 and len(hashes) > 0:
+            self._setLeaf(self.fullBlocks, self._tailHasher.hexdigest())
+        if len(hashes) > 0:
+            self.tipHash = hashes[-1]
+        return completed
+
+    def _buildLevels(self, leaves: list[str]):
+        self.levels = [leaves]
+        while len(self.levels[-1]) > 1:
+            below = self.levels[-1]
+            self.levels.append([
+                _hashNode(''.join(below[i:i+2]))
+                for i in range(0, len(below), 2)])
+
+    def truncate(self, rows: int) -> int:
+        '''
+        forgets the summary from the block holding this row on, for when the
+        history changed there. returns the number of rows still summarized (a
+        whole number of blocks), extend with the hashes from that row on.
+        '''
+        kept = min(rows, self.rows) // self.blockSize
+        self._buildLevels(self.leaves[:kept])
+        self.rows = kept * self.blockSize
+        self.tail = []
+        self._tailHasher = _hasher()
+        self.tipHash = ''
+        return self.rows
+
+    @staticmethod
+    def build(hashes: list[str], blockSize: int = 1024) -> 'MerkleSummary':
+        summary = MerkleSummary(blockSize=blockSize)
+        summary.extend(hashes)
+        return summary
+
+    def firstDivergence(self, other: 'MerkleSummary') -> Union[int, None]:
+        '''
+        returns the first row from which the two copies may differ, or None if
+        they are identical. only nodes made entirely of full blocks present in
+        both copies are compared.
+        '''
+        if self.blockSize != other.blockSize:
+            return 0
+        common = min(self.fullBlocks, other.fullBlocks)
+
+        def descend(level: int, index: int) -> Union[int, None]:
+            ''' first differing leaf under this node or None '''
+            first = index * 2**level
+            if first >= common:
+                return None
+            if (index + 1) * 2**level <= common:
+                if self.node(level, index) == other.node(level, index):
+                    return None
+                if level == 0:
+                    return index
+            if level == 0:
+                return None
+            left = descend(level - 1, index * 2)
+            return left if left is not None else descend(level - 1, index * 2 + 1)
+
+        top = max(len(self.levels), len(other.levels)) - 1
+        block = descend(top, 0)
+        if block is not None:
+            return block * self.blockSize
+        if self.rows == other.rows and self.tipHash == other.tipHash:
+            return None
+        return common * self.blockSize
+
+    ### persistence ###
+
+    def toJson(self) -> dict:
+        return {
+            'blockSize': self.blockSize,
+            'rows': self.rows,
+            'tipHash': self.tipHash,
+            'leaves': self.leaves,
+            'tail': self.tail}
+
+    @staticmethod
+    def fromJson(data: dict) -> 'MerkleSummary':
+        summary = MerkleSummary(blockSize=data.get('blockSize', 1024))
+        summary.rows = data.get('rows', 0)
+        summary.tipHash = data.get('tipHash', '')
+        summary.tail = data.get('tail', [])
+        summary._tailHasher = _hasher(summary.tail)
+        summary._buildLevels(list(data.get('leaves', [])))
+        return summary
+
+    @staticmethod
+    def load(path: str) -> Union['MerkleSummary', None]:
+        try:
+            with open(path, mode='r') as f:
+                return MerkleSummary.fromJson(json.load(f))
+        except Exception as _:
+            return None
+
+    def save(self, path: str) -> bool:
+        try:
+            temp = f'{path}.tmp'
+            with open(temp, mode='w') as f:
+                json.dump(self.toJson(), f)
+            os.replace(temp, path)
+            return True
+        except Exception as _:
+            return False
@@ -0,0 +1,172 @@
+'''
+a compact, columnar copy of a stream's observations.
+
+a cache dataframe costs a python string for every timestamp and every hash
+plus a python object per value if the column isn't numeric, well over 100
+bytes a row. here a row is an int64 time, a float64 value and a uint64 hash
+(hashIt digests are 8 bytes) in numpy arrays, 24 bytes, with a small side
+table for the few values that aren't numbers.
+
+conversion is lossless or it doesn't happen: fromFrame returns None unless the
+timestamps are in the canonical format, the hashes are 16 hex characters (or
+empty) and every value can be given back exactly as it was, because the hash
+chain is computed over str(value).
+'''
+from typing import Union
+import numpy as np
+import pandas as pd
+from satorilib.disk.utils import (
+    timestampsToNanos,
+    nanosToTimestamps,
+    hashesToInts,
+    intsToHashes)
+
+
+class Observations():
+    ''' int64 times, float64 values and uint64 hashes in parallel arrays '''
+
+    # how a value in an object column is given back
+    FLOAT = 0
+    STRING = 1  # str(float) is the original string
+    OTHER = 2  # the original object is kept in others
+
+    def __init__(
+        self,
+        times: np.ndarray,
+        values: np.ndarray,
+        hashes: np.ndarray,
+        kinds: np.ndarray = None,
+        others: dict[int, object] = None,
+        name: str = None,
+    ):
+        '''
+        kinds - None if the value column was numeric, otherwise one of FLOAT,
+        STRING or OTHER per row
+        '''
+        self.times = times
+        self.values = values
+        self.hashes = hashes
+        self.kinds = kinds
+        self.others = others or {}
+        self.name = name
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.times.nbytes + self.values.nbytes + self.hashes.nbytes +
+            (self.kinds.nbytes if self.kinds is not None else 0))
+
+    @staticmethod
+    def _kindOf(value) -> tuple[int, float]:
+        if isinstance(value, (float, np.floating)):
+            return Observations.FLOAT, float(value)
+        if isinstance(value, str):
+            try:
+                number = float(value)
+                if str(number) == value:
+                    return Observations.STRING, number
+            except ValueError:
+                pass
+        return Observations.OTHER, np.nan
+
+    @staticmethod
+    def fromFrame(df: pd.DataFrame) -> Union['Observations', None]:
+        ''' None if the frame can't be held compactly without losing anything '''
+        if (
+            not isinstance(df, pd.DataFrame) or
+            list(df.columns) != ['value', 'hash'] or
+            (df.shape[0] > 0 and df.index.inferred_type != 'string')
+        ):
+            return None
+        index = df.index.tolist()
+        hashes = df['hash'].tolist()
+        if not all(isinstance(h, str) for h in hashes):
+            return None
+        times = timestampsToNanos(index)
+        hashInts = hashesToInts(hashes)
+        if (
+            nanosToTimestamps(times) != index or
+            intsToHashes(hashInts) != hashes
+        ):
+            return None
+        kinds = None
+        others = {}
+        if pd.api.types.is_float_dtype(df['value'].dtype):
+            values = df['value'].to_numpy(dtype='float64', copy=True)
+        else:
+            kinds = np.empty(df.shape[0], dtype='uint8')
+            values = np.empty(df.shape[0], dtype='float64')
+            for i, value in enumerate(df['value'].tolist()):
+                kinds[i], values[i] = Observations._kindOf(value)
+                if kinds[i] == Observations.OTHER:
+                    others[i] = value
+        return Observations(
+            times=times,
+            values=values,
+            hashes=hashInts,
+            kinds=kinds,
+            others=others,
+            name=df.index.name)
+
+    def _valuesOf(self, first: int, last: int) -> Union[np.ndarray, list]:
+        if self.kinds is None:
+            return self.values[first:last].copy()
+        values = []
+        for i, (kind, value) in enumerate(zip(
+            self.kinds[first:last].tolist(),
+            self.values[first:last].tolist(),
+        ), start=first):
+            if kind == Observations.FLOAT:
+                values.append(value)
+            elif kind == Observations.STRING:
+                values.append(str(value))
+            else:
+                values.append(self.others[i])
+        return values
+
+    def toFrame(self, first: int = 0, last: int = None) -> pd.DataFrame:
+        ''' rows [first, last) in the usual cache dataframe shape '''
+        last = len(self) if last is None else last
+        return pd.DataFrame(
+            {
+                'value': np.asarray(
+                    self._valuesOf(first, last),
+                    dtype='float64' if self.kinds is None else 'object'),
+                'hash': np.asarray(intsToHashes(self.hashes[first:last]), dtype='object')},
+            index=pd.Index(
+                nanosToTimestamps(self.times[first:last]),
+                dtype='object',
+                name=self.name))
+
+    def row(self, position: int) -> tuple[str, object, str]:
+        ''' (time, value, hash) '''
+        position = position + len(self) if position < 0 else position
+        return (
+            nanosToTimestamps(self.times[position:position+1])[0],
+            self._valuesOf(position, position+1)[0],
+            intsToHashes(self.hashes[position:position+1])[0])
+
+    def extend(self, rows: list[tuple[str, object, str]]) -> bool:
+        ''' appends (time, value, hash) rows, False if they can't be held exactly '''
+        other = Observations.fromFrame(pd.DataFrame(
+            {
+                'value': np.array([row[1] for row in rows], dtype='object'),
+                'hash': [row[2] for row in rows]},
+            index=pd.Index([row[0] for row in rows], dtype='object')))
+        if other is None:
+            return False
+        if self.kinds is None:
+            if (other.kinds != Observations.FLOAT).any():
+                return False
+            other.kinds = None
+        offset = len(self)
+        self.times = np.concatenate([self.times, other.times])
+        self.values = np.concatenate([self.values, other.values])
+        self.hashes = np.concatenate([self.hashes, other.hashes])
+        if self.kinds is not None:
+            self.kinds = np.concatenate([self.kinds, other.kinds])
+            self.others.update({offset + i: v for i, v in other.others.items()})
+        return True
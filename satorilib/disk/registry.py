@@ -0,0 +1,265 @@
+'''
+a process wide home for every stream's Cache.
+
+each Cache holds its stream's history in memory, so a node subscribed to
+thousands of streams grows without bound. the registry hands out one Cache per
+stream and keeps the total within a memory budget: when it's exceeded the
+least recently used caches are first compacted (see Cache.compact) and then,
+if that isn't enough, evicted down to their tip (see Cache.evict). evicted
+caches reload from disk the next time something needs their data, so holders
+of a Cache never need to know.
+
+the total is kept as we go: caches tell us when their footprint may have
+changed and only those are measured again, so staying within budget costs
+nothing with thousands of streams that are mostly idle.
+
+at startup warm loads many streams at once, most recently written first, so
+the streams a node is actively using are ready long before the rest.
+'''
+from typing import Union
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from satorilib.concepts import StreamId
+from satorilib.disk.cache import Cache
+
+
+class CacheRegistry():
+    ''' least recently used caches, kept within a memory budget '''
+
+    _instance: Union['CacheRegistry', None] = None
+
+    def __init__(
+        self,
+        budget: int = 256 * 1024**2,
+        loc: str = None,
+        compact: bool = True,
+        **kwargs,
+    ):
+        '''
+        budget - bytes of observations we'd like to keep in memory
+        loc - data folder, defaults to the configured one
+        compact - compact caches before evicting them
+        kwargs - passed through to each Cache
+        '''
+        self.budget = budget
+        self.loc = loc
+        self.compact = compact
+        self.kwargs = kwargs
+        self.caches: OrderedDict[StreamId, Cache] = OrderedDict()
+        self.pending: dict[StreamId, Future] = {}
+        self.lock = threading.RLock()
+        self.footprints: dict[StreamId, int] = {}
+        self.total = 0
+        # caches whose footprint changed since we last looked
+        self.stale: set[StreamId] = set()
+
+    @classmethod
+    def instance(cls) -> 'CacheRegistry':
+        if cls._instance is None:
+            cls._instance = CacheRegistry()
+        return cls._instance
+
+    @classmethod
+    def setInstance(cls, registry: 'CacheRegistry'):
+        cls._instance = registry
+
+    def __len__(self) -> int:
+        return len(self.caches)
+
+    def __contains__(self, streamId: StreamId) -> bool:
+        return streamId in self.caches
+
+    @property
+    def footprint(self) -> int:
+        with self.lock:
+            return self._tally()
+
+    def _resized(self, cache: Cache):
+        ''' called by a cache, under its lock, so it only takes a note '''
+        self.stale.add(cache.id)
+
+    def _own(self, cache: Cache) -> Cache:
+        prior = self.caches.get(cache.id)
+        if prior is not None and prior is not cache:
+            prior.onResize = None
+        self.caches[cache.id] = cache
+        cache.onResize = self._resized
+        self.stale.add(cache.id)
+        return cache
+
+    def _tally(self) -> int:
+        ''' folds the footprints of caches that changed into the total '''
+        while len(self.stale) > 0:
+            try:
+                streamId = self.stale.pop()
+            except KeyError as _:
+                break
+            cache = self.caches.get(streamId)
+            footprint = 0 if cache is None else cache.footprint
+            self.total += footprint - self.footprints.pop(streamId, 0)
+            if cache is not None:
+                self.footprints[streamId] = footprint
+        return self.total
+
+    def _build(self, streamId: StreamId) -> Cache:
+        '''
+        loads a stream's cache without holding the lock, so a cold load
+        doesn't hold up lookups of other streams. a stream being loaded (or
+        warmed) by someone else is waited for rather than loaded twice.
+        '''
+        with self.lock:
+            if streamId in self.caches:
+                return self.caches[streamId]
+            future = self.pending.get(streamId)
+            mine = future is None
+            if mine:
+                future = Future()
+                self.pending[streamId] = future
+        if not mine:
+            if future.exception() is None:
+                return future.result()
+            # their load failed, try ours
+            future = Future()
+        try:
+            cache = Cache(id=streamId, loc=self.loc, **self.kwargs)
+            with self.lock:
+                if streamId in self.caches:
+                    cache = self.caches[streamId]
+                else:
+                    self._own(cache)
+            future.set_result(cache)
+            return cache
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                if self.pending.get(streamId) is future:
+                    self.pending.pop(streamId)
+
+    def cacheOf(self, streamId: StreamId) -> Cache:
+        ''' the cache for this stream, created on first use '''
+        return self.cachesOf([streamId])[0]
+
+    def cachesOf(self, streamIds: list[StreamId]) -> list[Cache]:
+        ''' cacheOf for several streams, the budget is enforced once at the end '''
+        with self.lock:
+            caches = [self.caches.get(streamId) for streamId in streamIds]
+        caches = [
+            cache if cache is not None else self._build(streamId)
+            for streamId, cache in zip(streamIds, caches)]
+        with self.lock:
+            for streamId in streamIds:
+                if streamId in self.caches:
+                    self.caches.move_to_end(streamId)
+            self.enforce()
+            return caches
+
+    def add(self, cache: Cache) -> Cache:
+        ''' takes ownership of a cache made elsewhere '''
+        with self.lock:
+            self._own(cache)
+            self.caches.move_to_end(cache.id)
+            self.enforce()
+            return cache
+
+    def remove(self, streamId: StreamId) -> Union[Cache, None]:
+        with self.lock:
+            cache = self.caches.pop(streamId, None)
+            if cache is not None:
+                cache.onResize = None
+            self.stale.discard(streamId)
+            self.total -= self.footprints.pop(streamId, 0)
+            return cache
+
+    def enforce(self) -> int:
+        '''
+        compacts then evicts least recently used caches until we're within
+        budget. the most recently used cache is left alone. returns the
+        footprint afterwards.
+        '''
+        with self.lock:
+            if self._tally() <= self.budget:
+                return self.total
+            candidates = list(self.caches.keys())[:-1]
+            if self.compact:
+                for streamId in candidates:
+                    if self._tally() <= self.budget:
+                        return self.total
+                    cache = self.caches[streamId]
+                    if cache.isEvicted or cache.isCompact or self.footprints.get(streamId, 0) == 0:
+                        continue
+                    cache.compact()
+            for streamId in candidates:
+                if self._tally() <= self.budget:
+                    return self.total
+                if self.footprints.get(streamId, 0) > 0:
+                    self.caches[streamId].evict()
+            return self._tally()
+
+    ### warm start ###
+
+    def lastActive(self, streamId: StreamId) -> float:
+        ''' modification time of the stream's data, 0 if it has none '''
+        try:
+            return os.path.getmtime(Cache.pathOf(
+                streamId=streamId,
+                loc=self.loc,
+                filename=f"aggregate.{self.kwargs.get('ext', 'csv')}"))
+        except OSError as _:
+            return 0
+
+    def _warm(self, streamId: StreamId, validate: bool) -> Cache:
+        try:
+            with self.lock:
+                cache = self.caches.get(streamId)
+            if cache is None:
+                cache = Cache(id=streamId, loc=self.loc, **self.kwargs)
+            if validate:
+                cache.modifyBasedValidation(*cache.performValidation())
+            with self.lock:
+                # if someone beat us to it theirs wins
+                if streamId in self.caches:
+                    cache = self.caches[streamId]
+                else:
+                    self._own(cache)
+                self.enforce()
+            return cache
+        finally:
+            self.pending.pop(streamId, None)
+
+    def warm(
+        self,
+        streamIds: list[StreamId],
+        workers: int = None,
+        validate: bool = True,
+    ) -> dict[StreamId, Future]:
+        '''
+        loads (and validates) the caches of these streams in a thread pool,
+        most recently active first. returns a future per stream, in the order
+        they'll be loaded, each resolving to that stream's Cache. cacheOf a
+        stream that's still warming waits for it. threads rather than
+        processes because the caches have to end up in this process, the csv
+        parser and file reads release the gil for most of the work anyway.
+        '''
+        ordered = sorted(
+            [s for s in dict.fromkeys(streamIds) if s not in self.caches],
+            key=self.lastActive,
+            reverse=True)
+        futures = {}
+        if len(ordered) == 0:
+            return futures
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(workers or os.cpu_count() or 1, len(ordered))),
+            thread_name_prefix='cache-warm')
+        for streamId in ordered:
+            future = executor.submit(self._warm, streamId, validate)
+            self.pending[streamId] = future
+            if future.done():
+                # finished before we got to note it down
+                self.pending.pop(streamId, None)
+            futures[streamId] = future
+        executor.shutdown(wait=False)
+        return futures
@@ -0,0 +1,255 @@
+'''
+pre-aggregated statistics of a stream over time.
+
+for each of a few resolutions (an hour and a day by default) we keep one
+bucket per period the stream has values in: count, sum, min, max and last of
+its numeric values (anything else is skipped). buckets start at multiples of
+the resolution from the epoch. appended rows fold into the newest bucket or
+open new ones, so charts and health checks read O(buckets) instead of
+scanning the history. a resolution we don't keep is combined from the
+largest one we do that divides it.
+
+the buckets are numpy columns with room to grow, so an appended row costs the
+same however many buckets there are. the rollups record how many rows they
+cover and the tip they ended at, like the merkle summary, and are saved with
+the stream's sidecars (rollups.npz) every saveEvery completed buckets of the finest
+resolution rather than on each one, a save writes them all. whatever came
+after the last save is caught up from the rows when they're next loaded.
+'''
+from typing import Union
+import os
+import json
+import numpy as np
+import pandas as pd
+
+FIELDS = ('start', 'count', 'sum', 'min', 'max', 'last')
+
+
+class Rollups():
+    ''' count, sum, min, max and last per time bucket at several resolutions '''
+
+    def __init__(
+        self,
+        resolutions: tuple[int] = (60*60, 60*60*24),
+        saveEvery: int = 256,
+    ):
+        '''
+        resolutions - bucket widths in seconds, each dividing the next
+        saveEvery - completed buckets of the finest resolution between saves
+        '''
+        self.resolutions = tuple(sorted(int(r) for r in resolutions))
+        self.saveEvery = saveEvery
+        self.unsaved = 0
+        self.rows = 0
+        self.tip: Union[tuple[str, str], None] = None
+        self.tipTime = int(np.iinfo('int64').min)
+        self.buckets: dict[int, dict[str, np.ndarray]] = {
+            resolution: self._empty(0) for resolution in self.resolutions}
+        self.sizes: dict[int, int] = {resolution: 0 for resolution in self.resolutions}
+
+    @staticmethod
+    def _empty(capacity: int) -> dict[str, np.ndarray]:
+        return {
+            field: np.empty(capacity, dtype='int64' if field in ('start', 'count') else 'float64')
+            for field in FIELDS}
+
+    def bucketsOf(self, resolution: int) -> int:
+        return self.sizes[resolution]
+
+    def columnsOf(self, resolution: int) -> dict[str, np.ndarray]:
+        ''' the buckets of a resolution we keep, views '''
+        size = self.sizes[resolution]
+        return {field: column[:size] for field, column in self.buckets[resolution].items()}
+
+    ### updates ###
+
+    def extend(
+        self,
+        times: np.ndarray,
+        values: np.ndarray,
+        tip: tuple[str, str] = None,
+    ) -> Union[int, None]:
+        '''
+        folds in the rows after the ones we cover: int64 epoch nanoseconds in
+        order, float values (NaN for non-numeric) and the (time, hash) of the
+        last of them. returns how many buckets of the finest resolution were
+        completed, None if the rows are older than what we have.
+        '''
+        if len(times) == 0:
+            return 0
+        if times[0] < self.tipTime or not (np.diff(times) >= 0).all():
+            return None
+        self.rows += len(times)
+        self.tip = tip
+        self.tipTime = int(times[-1])
+        numeric = ~np.isnan(values)
+        times = times[numeric]
+        values = values[numeric]
+        if len(times) == 0:
+            return 0
+        completed = 0
+        for resolution in self.resolutions:
+            before = self.sizes[resolution]
+            self._fold(resolution, times, values)
+            if resolution == self.resolutions[0]:
+                completed = self.sizes[resolution] - max(before, 1)
+        self.unsaved += completed
+        return completed
+
+    def _fold(self, resolution: int, times: np.ndarray, values: np.ndarray):
+        width = resolution * 10**9
+        keys = (times // width) * width
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        starts = np.concatenate([[0], boundaries])
+        ends = np.concatenate([boundaries, [len(keys)]])
+        buckets = self.buckets[resolution]
+        size = self.sizes[resolution]
+        if size > 0 and buckets['start'][size - 1] == keys[0]:
+            # the first rows carry on the newest bucket
+            end = ends[0]
+            last = size - 1
+            buckets['count'][last] += end
+            buckets['sum'][last] += values[:end].sum()
+            buckets['min'][last] = min(buckets['min'][last], values[:end].min())
+            buckets['max'][last] = max(buckets['max'][last], values[:end].max())
+            buckets['last'][last] = values[end - 1]
+            starts = starts[1:]
+            ends = ends[1:]
+        if len(starts) == 0:
+            return
+        needed = size + len(starts)
+        if needed > len(buckets['start']):
+            grown = self._empty(max(needed, 2 * len(buckets['start']), 256))
+            for field in FIELDS:
+                grown[field][:size] = buckets[field][:size]
+            self.buckets[resolution] = buckets = grown
+        buckets['start'][size:needed] = keys[starts]
+        buckets['count'][size:needed] = ends - starts
+        buckets['sum'][size:needed] = np.add.reduceat(values, starts)
+        buckets['min'][size:needed] = np.minimum.reduceat(values, starts)
+        buckets['max'][size:needed] = np.maximum.reduceat(values, starts)
+        buckets['last'][size:needed] = values[ends - 1]
+        self.sizes[resolution] = needed
+
+    def truncate(self, nanos: int) -> int:
+        '''
+        forgets every bucket from the one holding this time on (at the
+        coarsest resolution, so all of them line up). returns that bucket's
+        start, set rows to the number of rows before it and extend from there.
+        '''
+        width = self.resolutions[-1] * 10**9
+        cut = (nanos // width) * width
+        for resolution in self.resolutions:
+            self.sizes[resolution] = int(np.searchsorted(
+                self.columnsOf(resolution)['start'], cut, side='left'))
+        self.tip = None
+        self.tipTime = int(np.iinfo('int64').min)
+        return int(cut)
+
+    @staticmethod
+    def build(
+        times: np.ndarray,
+        values: np.ndarray,
+        tip: tuple[str, str] = None,
+        resolutions: tuple[int] = (60*60, 60*60*24),
+    ) -> 'Rollups':
+        rollups = Rollups(resolutions=resolutions)
+        keep = np.flatnonzero(times != np.iinfo('int64').min)
+        order = keep[np.argsort(times[keep], kind='stable')]
+        rollups.extend(times[order], values[order], tip)
+        return rollups
+
+    ### reads ###
+
+    def query(self, resolution: int = 60*60, start: str = None, end: str = None) -> pd.DataFrame:
+        '''
+        buckets of the given width (seconds) from start (inclusive) to end
+        (exclusive), with a mean. combined from a finer resolution we keep if
+        we don't keep this one, empty if we can't.
+        '''
+        resolution = int(resolution)
+        if resolution in self.buckets:
+            columns = self.columnsOf(resolution)
+        else:
+            finer = [r for r in self.resolutions if resolution % r == 0]
+            if len(finer) == 0:
+                return pd.DataFrame(columns=list(FIELDS[1:]) + ['mean'])
+            columns = self._combine(self.columnsOf(finer[-1]), resolution * 10**9)
+        starts = columns.pop('start')
+        first = 0 if start is None else int(np.searchsorted(
+            starts, pd.Timestamp(start).value, side='left'))
+        last = len(starts) if end is None else int(np.searchsorted(
+            starts, pd.Timestamp(end).value, side='left'))
+        df = pd.DataFrame(
+            {field: column[first:last] for field, column in columns.items()},
+            index=pd.DatetimeIndex(starts[first:last].view('datetime64[ns]')))
+        df['mean'] = df['sum'] / df['count']
+        return df
+
+    @staticmethod
+    def _combine(buckets: dict[str, np.ndarray], width: int) -> dict[str, np.ndarray]:
+        starts = buckets['start']
+        if len(starts) == 0:
+            return dict(buckets)
+        keys = (starts // width) * width
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        first = np.concatenate([[0], boundaries])
+        last = np.concatenate([boundaries, [len(keys)]]) - 1
+        return {
+            'start': keys[first],
+            'count': np.add.reduceat(buckets['count'], first),
+            'sum': np.add.reduceat(buckets['sum'], first),
+            'min': np.minimum.reduceat(buckets['min'], first),
+            'max': np.maximum.reduceat(buckets['max'], first),
+            'last': buckets['last'][last]}
+
+    ### persistence ###
+
+    def toArrays(self) -> dict[str, np.ndarray]:
+        arrays = {'meta': np.array(json.dumps({
+            'resolutions': list(self.resolutions),
+            'rows': self.rows,
+            'tip': self.tip,
+            'tipTime': self.tipTime}))}
+        for resolution in self.resolutions:
+            for field, column in self.columnsOf(resolution).items():
+                arrays[f'{resolution}.{field}'] = column
+        return arrays
+
+    @staticmethod
+    def fromArrays(arrays: dict[str, np.ndarray]) -> 'Rollups':
+        meta = json.loads(str(arrays['meta']))
+        rollups = Rollups(resolutions=meta.get('resolutions', (60*60, 60*60*24)))
+        rollups.rows = meta.get('rows', 0)
+        rollups.tip = tuple(meta['tip']) if meta.get('tip') is not None else None
+        rollups.tipTime = meta.get('tipTime', rollups.tipTime)
+        for resolution in rollups.resolutions:
+            rollups.buckets[resolution] = {
+                field: np.array(arrays[f'{resolution}.{field}']) for field in FIELDS}
+            rollups.sizes[resolution] = len(rollups.buckets[resolution]['start'])
+        return rollups
+
+    @staticmethod
+    def load(path: str) -> Union['Rollups', None]:
+        try:
+            with np.load(path) as arrays:
+                return Rollups.fromArrays(arrays)
+        except Exception as _:
+            return None
+
+    def save(self, path: str) -> bool:
+        try:
+            temp = f'{path}.tmp'
+            with open(temp, mode='wb') as f:
+                np.savez(f, **self.toArrays())
+            os.replace(temp, path)
+            self.unsaved = 0
+            return True
+        except Exception as _:
+            return False
+
+    def saveIfDue(self, path: str) -> bool:
+        ''' saves once saveEvery buckets have been completed since the last save '''
+        if self.unsaved < self.saveEvery:
+            return False
+        return self.save(path)
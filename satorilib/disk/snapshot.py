@@ -0,0 +1,270 @@
+'''
+a published, read-only version of a cache's observations.
+
+the cache never changes a frame (or a compact container's arrays) once it has
+handed it out, it builds the next one and swaps the reference. a snapshot just
+holds the references of one version: the frame or the compact observations,
+their timestamps, and how many rows of the append buffer it includes (the
+buffer is only ever extended or replaced, so a prefix of it never changes).
+taking one is a reference read, and a thread can scan it for as long as it
+likes while the cache keeps ingesting.
+'''
+from typing import Union
+import numpy as np
+import pandas as pd
+from satorilib.disk.utils import timestampsToNanos, timestampToNanos
+from satorilib.disk.observations import Observations
+
+
+def timesOf(df: pd.DataFrame) -> Union[np.ndarray, None]:
+    '''
+    sorted int64 epoch nanoseconds parallel to the rows of a cache frame. None
+    if the index can't be used as one (not timestamps or not in order).
+    '''
+    if not isinstance(df, pd.DataFrame):
+        return None
+    if df.empty:
+        return np.empty(0, dtype='int64')
+    if df.index.inferred_type != 'string':
+        return None
+    times = timestampsToNanos(df.index)
+    if (times == np.iinfo('int64').min).any() or not (np.diff(times) >= 0).all():
+        return None
+    return times
+
+
+class Snapshot():
+    ''' one version of a cache, safe to read from any thread '''
+
+    def __init__(
+        self,
+        version: int,
+        frame: pd.DataFrame = None,
+        observations: Observations = None,
+        times: np.ndarray = None,
+        tail: list[tuple[str, object, str]] = None,
+        tailLength: int = 0,
+        tailTimes: np.ndarray = None,
+    ):
+        '''
+        frame or observations - the rows before the append buffer
+        times - their timestamps, None if they can't be bisected
+        tail, tailLength - the append buffer and how much of it is ours
+        tailTimes - timestamps of the start of the buffer if a previous
+        version already had them, only the rest are converted
+        '''
+        self.version = version
+        self.frame = frame
+        self.observations = observations
+        self.baseTimes = times
+        self.tail = tail if tail is not None else []
+        self.tailLength = tailLength
+        self._df = None
+        self._tailTimes = None
+        self._knownTailTimes = tailTimes
+
+    @property
+    def baseCount(self) -> int:
+        if self.observations is not None:
+            return len(self.observations)
+        if isinstance(self.frame, pd.DataFrame):
+            return self.frame.shape[0]
+        return 0
+
+    @property
+    def rowCount(self) -> int:
+        return self.baseCount + self.tailLength
+
+    def __len__(self) -> int:
+        return self.rowCount
+
+    @property
+    def tip(self) -> Union[tuple[str, object, str], None]:
+        ''' the latest (time, value, hash) '''
+        if self.tailLength > 0:
+            return self.tail[self.tailLength - 1]
+        if self.observations is not None:
+            return self.observations.row(-1) if len(self.observations) > 0 else None
+        if (
+            not isinstance(self.frame, pd.DataFrame) or
+            self.frame.empty or
+            'hash' not in self.frame.columns
+        ):
+            return None
+        return (
+            self.frame.index[-1],
+            self.frame['value'].iloc[-1],
+            self.frame['hash'].iloc[-1])
+
+    @property
+    def df(self) -> pd.DataFrame:
+        ''' the whole version as a cache dataframe, built once per snapshot '''
+        if self._df is not None:
+            return self._df
+        base = (
+            self.observations.toFrame()
+            if self.observations is not None
+            else self.frame if isinstance(self.frame, pd.DataFrame)
+            else pd.DataFrame())
+        if self.tailLength > 0:
+            tail = self.tail[:self.tailLength]
+            base = pd.concat([base, pd.DataFrame(
+                {
+                    'value': [row[1] for row in tail],
+                    'hash': [row[2] for row in tail]},
+                index=pd.Index([row[0] for row in tail], name=base.index.name))])
+        self._df = base
+        return self._df
+
+    @property
+    def tailTimes(self) -> Union[np.ndarray, None]:
+        if self._tailTimes is None:
+            known = self._knownTailTimes
+            self._knownTailTimes = None
+            if known is None or len(known) > self.tailLength:
+                known = np.empty(0, dtype='int64')
+            times = np.concatenate([known, timestampsToNanos(
+                [row[0] for row in self.tail[len(known):self.tailLength]])])
+            self._tailTimes = (
+                times if not (times == np.iinfo('int64').min).any()
+                else False)
+        return self._tailTimes if self._tailTimes is not False else None
+
+    @property
+    def times(self) -> Union[np.ndarray, None]:
+        ''' timestamps of every row, None if they can't be bisected '''
+        tailTimes = self.tailTimes
+        if self.baseTimes is None or tailTimes is None:
+            return None
+        if self.tailLength == 0:
+            return self.baseTimes
+        return np.concatenate([self.baseTimes, tailTimes])
+
+    @property
+    def values(self) -> np.ndarray:
+        ''' the value of every row '''
+        if (
+            self.observations is not None and
+            self.observations.kinds is None and
+            self.tailLength == 0
+        ):
+            return self.observations.values
+        return self.df['value'].to_numpy()
+
+    ### reads ###
+
+    def positionsOf(self, time: str) -> Union[tuple[int, int], None]:
+        '''
+        the range of rows [first, last) whose time equals the given time, so
+        first is also the number of rows before it. None if we can't bisect.
+        '''
+        if self.baseTimes is None or not isinstance(time, str):
+            return None
+        try:
+            nanos = timestampToNanos(time)
+        except Exception as _:
+            return None
+        tailTimes = self.tailTimes
+        if nanos == np.iinfo('int64').min or tailTimes is None:
+            return None
+        # the buffer only ever holds rows newer than everything before it
+        if len(tailTimes) > 0 and nanos >= tailTimes[0]:
+            return (
+                self.baseCount + int(np.searchsorted(tailTimes, nanos, side='left')),
+                self.baseCount + int(np.searchsorted(tailTimes, nanos, side='right')))
+        return (
+            int(np.searchsorted(self.baseTimes, nanos, side='left')),
+            int(np.searchsorted(self.baseTimes, nanos, side='right')))
+
+    def slice(self, first: int, last: int = None) -> pd.DataFrame:
+        ''' rows [first, last) without building the whole frame if we can help it '''
+        last = self.rowCount if last is None else min(last, self.rowCount)
+        if self._df is not None or first < 0 or last < 0:
+            return self.df.iloc[first:last]
+        if last <= first:
+            # nothing, but with the columns (and dtypes) of the rows we hold
+            first = last = min(first, self.baseCount)
+        if last <= self.baseCount:
+            if self.observations is not None:
+                return self.observations.toFrame(first, last)
+            if isinstance(self.frame, pd.DataFrame):
+                return self.frame.iloc[first:last]
+            return self.df.iloc[first:last]
+        # reaches into the buffer, build just the rows asked for
+        tail = self.tail[max(first, self.baseCount) - self.baseCount:last - self.baseCount]
+        rows = pd.DataFrame(
+            {
+                'value': [row[1] for row in tail],
+                'hash': [row[2] for row in tail]},
+            index=pd.Index(
+                [row[0] for row in tail],
+                name=self.frame.index.name if isinstance(self.frame, pd.DataFrame) else None))
+        if first >= self.baseCount:
+            return rows
+        return pd.concat([self.slice(first, self.baseCount), rows])
+
+    def contains(self, time: str) -> bool:
+        ''' true if this exact timestamp is in the snapshot '''
+        positions = self.positionsOf(time)
+        if positions is None:
+            return time in self.df.index
+        first, last = positions
+        return first < last and time in self.slice(first, last).index
+
+    def between(self, start: str = None, end: str = None) -> pd.DataFrame:
+        ''' rows from start (inclusive) to end (exclusive) '''
+        first = 0
+        last = self.rowCount
+        if start is not None:
+            positions = self.positionsOf(start)
+            if positions is None:
+                return self.df[
+                    (self.df.index >= start) &
+                    (self.df.index < end if end is not None else True)]
+            first = positions[0]
+        if end is not None:
+            positions = self.positionsOf(end)
+            if positions is None:
+                return self.df[
+                    (self.df.index >= start if start is not None else True) &
+                    (self.df.index < end)]
+            last = positions[0]
+        return self.slice(first, max(first, last))
+
+    def search(
+        self,
+        time: str,
+        before: bool = False,
+        after: bool = False,
+        exact: bool = False
+    ) -> pd.DataFrame:
+        if not isinstance(time, str) or not any([before, after, exact]):
+            return None
+        positions = self.positionsOf(time)
+        if positions is not None:
+            first, last = positions
+            if before:
+                return self.slice(0, first)
+            if after:
+                return self.slice(last)
+            if exact:
+                rows = self.slice(first, last)
+                return rows[rows.index == time]
+            return None
+        if before:
+            return self.df[self.df.index < time]
+        if after:
+            return self.df[self.df.index > time]
+        if exact:
+            return self.df[self.df.index == time]
+        return None
+
+    def latestTime(self) -> Union[str, None]:
+        ''' the most recent time, None if there are no rows '''
+        if self.rowCount == 0:
+            return None
+        if self.tailLength > 0 or self.observations is not None:
+            return self.tip[0]
+        if self.baseTimes is not None:
+            return self.frame.index[-1]
+        return self.df.sort_index().index.values[-1]
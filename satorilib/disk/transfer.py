@@ -0,0 +1,226 @@
+'''
+streaming import and export of whole stream histories.
+
+reading a history the usual way (CSVManager.read, Cache.loadCache) parses the
+entire file into one frame, then sorts and dedupes it, which takes several
+times the file size in memory. here a history moves in chunks of at most
+chunkRows rows: parsed (with pyarrow's streaming csv reader if we have it),
+checked, and written into the destination before the next chunk is read, so
+memory stays flat however long the history is.
+
+a history has to be in time order to be streamed, and its hash chain is
+verified as it goes, the last good hash carried from one chunk to the next.
+everything from the first row that is out of order or off the chain on is left
+out, the Transfer says how far we got. an import is built beside the stream
+and only swapped in once all of it checked out, a bad history never costs us
+the one we had.
+
+notes:
+    values are parsed the way pandas.read_csv would, but a chunk at a time, so
+    a column that mixes integers and decimals could come out as '1' in one
+    chunk and '1.0' in another. our own files write every value as a float.
+'''
+from typing import Union, Iterator, Callable
+import os
+import numpy as np
+import pandas as pd
+from satorilib.interfaces.data import FileManager
+from satorilib.utils.hash import chainInputs, walkChain
+from satorilib.disk.utils import timestampsToNanos
+from satorilib import logging
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pacsv = None
+
+
+class Transfer():
+    ''' how far an import or export got '''
+
+    def __init__(self, priorRowHash: str = '', validate: bool = True):
+        self.validate = validate
+        self.rows = 0
+        self.tip: Union[tuple[str, object, str], None] = None
+        self.hash = priorRowHash
+        self.complete = True
+
+    def __repr__(self):
+        return f'Transfer(rows={self.rows}, tip={self.tip}, complete={self.complete})'
+
+    def _prior(self) -> int:
+        if self.tip is None:
+            return np.iinfo('int64').min
+        return int(timestampsToNanos([self.tip[0]])[0])
+
+    def validated(self, chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        ''' passes the chunks through, cut off at the first bad row '''
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            nanos = timestampsToNanos(chunk.index)
+            ordered = nanos > np.concatenate([[self._prior()], nanos[:-1]])
+            cut = None if ordered.all() else int(np.argmin(ordered))
+            if self.validate:
+                times, values = chainInputs(chunk)
+                bad, _ = walkChain(
+                    times=times,
+                    values=values,
+                    hashes=chunk['hash'].tolist(),
+                    priorRowHash=self.hash)
+                if bad is not None:
+                    cut = bad if cut is None else min(cut, bad)
+            if cut is not None:
+                chunk = chunk.iloc[:cut]
+                self.complete = False
+            if not chunk.empty:
+                self.rows += chunk.shape[0]
+                self.tip = (
+                    str(chunk.index[-1]),
+                    chunk['value'].iloc[-1],
+                    chunk['hash'].iloc[-1])
+                self.hash = self.tip[2]
+                yield chunk
+            if not self.complete:
+                logging.warning(f'history cut off after {self.rows} rows', print=True)
+                return
+
+
+### reading ###
+
+def parseValues(strings: pd.Series) -> pd.Series:
+    ''' numbers if they all are, like read_csv, the strings otherwise '''
+    try:
+        return pd.to_numeric(strings)
+    except (ValueError, TypeError):
+        return strings
+
+
+def _frameOf(times: list, values: pd.Series, hashes: Union[list, None]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            'value': parseValues(values).to_numpy(),
+            'hash': (
+                [h if isinstance(h, str) else '' for h in hashes]
+                if hashes is not None else [''] * len(times))},
+        index=pd.Index(times, dtype='object'))
+
+
+def _columnsOf(source: str) -> int:
+    with open(source, 'rb') as f:
+        return f.readline().count(b',') + 1
+
+
+def _readChunksArrow(source: str, chunkRows: int) -> Iterator[pd.DataFrame]:
+    names = ['time', 'value', 'hash'][:_columnsOf(source)]
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(
+            column_names=names,
+            block_size=max(1 << 16, chunkRows * 64)),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in names},
+            strings_can_be_null=True))
+    for batch in reader:
+        for start in range(0, batch.num_rows, chunkRows):
+            part = batch.slice(start, chunkRows)
+            yield _frameOf(
+                times=part.column(0).to_pylist(),
+                values=part.column(1).to_pandas(),
+                hashes=part.column(2).to_pylist() if len(names) == 3 else None)
+
+
+def _readChunksPandas(source: str, chunkRows: int) -> Iterator[pd.DataFrame]:
+    for part in pd.read_csv(source, header=None, dtype=str, chunksize=chunkRows):
+        yield _frameOf(
+            times=part[0].tolist(),
+            values=part[1],
+            hashes=part[2].tolist() if part.shape[1] > 2 else None)
+
+
+def readChunks(source: str, chunkRows: int = 100000) -> Iterator[pd.DataFrame]:
+    ''' a csv history (time, value, hash) as frames of at most chunkRows rows '''
+    if not os.path.exists(source) or os.path.getsize(source) == 0:
+        return iter(())
+    if pacsv is not None:
+        return _readChunksArrow(source, chunkRows)
+    return _readChunksPandas(source, chunkRows)
+
+
+def chunksOf(manager: FileManager, filePath: str, chunkRows: int = 100000) -> Iterator[pd.DataFrame]:
+    ''' a stream's rows from any storage in file order, at most chunkRows at a time '''
+    if hasattr(manager, 'iterate'):
+        yield from manager.iterate(filePath, batchSize=chunkRows)
+        return
+    if hasattr(manager, 'lineIndex'):
+        # csv, parsed in one pass. asking for the index first also brings a
+        # file behind a write-ahead log up to date
+        manager.lineIndex(filePath)
+        yield from readChunks(filePath, chunkRows)
+        return
+    start = 0
+    while True:
+        chunk = manager.readLines(filePath, start=start, end=start + chunkRows)
+        if chunk is None or chunk.empty:
+            return
+        yield manager.conformFlatColumns(chunk)
+        if chunk.shape[0] < chunkRows:
+            return
+        start += chunkRows
+
+
+### moving ###
+
+def importHistory(
+    source: str,
+    manager: FileManager,
+    filePath: str,
+    chunkRows: int = 100000,
+    validate: bool = True,
+    onChunk: Callable[[pd.DataFrame], None] = None,
+) -> Transfer:
+    '''
+    replaces the stream at filePath with the csv history at source, one chunk
+    at a time. onChunk sees every chunk that was written. the stream is only
+    replaced if the whole history was good (transfer.complete), otherwise
+    it's left as it was.
+    '''
+    transfer = Transfer(validate=validate)
+    # straight to the files, a log would replay rows meant for the temp copy
+    manager = getattr(manager, 'unlogged', manager)
+    temp = f'{filePath}.import'
+    manager.remove(temp)
+    first = True
+    for chunk in transfer.validated(readChunks(source, chunkRows)):
+        write = manager.write if first else manager.append
+        if not write(filePath=temp, data=chunk):
+            logging.error(f'unable to write history to {temp}', print=True)
+            transfer.complete = False
+            break
+        first = False
+        if onChunk is not None:
+            onChunk(chunk)
+    if transfer.rows > 0 and transfer.complete:
+        if manager.replace(temp, filePath):
+            return transfer
+        logging.error(f'unable to swap history into {filePath}', print=True)
+        transfer.complete = False
+    manager.remove(temp)
+    return transfer
+
+
+def exportHistory(
+    manager: FileManager,
+    filePath: str,
+    destination: str,
+    chunkRows: int = 100000,
+    validate: bool = True,
+) -> Transfer:
+    ''' writes the stream at filePath to a csv at destination, one chunk at a time '''
+    transfer = Transfer(validate=validate)
+    temp = f'{destination}.tmp'
+    with open(temp, 'wb') as f:
+        for chunk in transfer.validated(chunksOf(manager, filePath, chunkRows)):
+            f.write(chunk.to_csv(float_format='%.10f', header=False).encode())
+    os.replace(temp, destination)
+    return transfer
@@ -1,4 +1,6 @@
 import os
+import numpy as np
+import pandas as pd
 
 
 def safetify(path: str):
@@ -12,3 +14,99 @@ def safetifyWithResult(path: str):
         os.makedirs(os.path.dirname(path), exist_ok=True)
         return path, True
     return path, False
+
+
+def sidecarPath(filePath: str, filename: str = None) -> str:
+    '''
+    where we keep state of our own about a stream's file (indexes, summaries,
+    checkpoints). not in the stream's folder, that's pinned as it is and its
+    hash identifies the datastream, but in a .cache folder beside it:
+    <root>/<stream>/aggregate.csv -> <root>/.cache/<stream>/<filename>
+    '''
+    folder, name = os.path.split(os.path.abspath(filePath))
+    root, stream = os.path.split(folder)
+    return safetify(os.path.join(root, '.cache', stream, filename or name))
+
+
+### columnar conversions ###
+
+timestampFormat = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def timestampsToNanos(times) -> np.ndarray:
+    '''
+    converts timestamp strings (naive times are assumed to be utc) into int64
+    epoch nanoseconds. unparsable times become the minimum int64 (NaT).
+    '''
+    if len(times) == 0:
+        return np.empty(0, dtype='int64')
+    if len(times) < 16:
+        # a handful (a new observation), cheaper one at a time
+        return np.array([timestampToNanos(time) for time in times], dtype='int64')
+    return np.asarray(
+        pd.to_datetime(pd.Index(times), errors='coerce', utc=True).asi8,
+        dtype='int64')
+
+
+def timestampToNanos(time: str) -> int:
+    ''' scalar version, used for lookups so it avoids the array machinery '''
+    try:
+        stamp = pd.Timestamp(time)
+    except (ValueError, TypeError):
+        return int(np.iinfo('int64').min)
+    if stamp is pd.NaT:
+        return int(np.iinfo('int64').min)
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_convert('UTC')
+    return int(stamp.value)
+
+
+def nanosToTimestamps(nanos) -> list[str]:
+    '''
+    converts int64 epoch nanoseconds back into timestamp strings. always uses
+    the canonical format (see satorilib.utils.time.datetimeToTimestamp).
+    '''
+    nanos = np.asarray(nanos, dtype='int64')
+    if len(nanos) == 0:
+        return []
+    # much faster than strftime: numpy renders 'YYYY-MM-DDTHH:MM:SS.ffffff',
+    # we just swap the T for a space in place
+    strings = np.datetime_as_string(
+        nanos.view('datetime64[ns]'), unit='us').astype('U26')
+    chars = strings.view('uint32').reshape(len(strings), 26)
+    chars[chars[:, 10] == ord('T'), 10] = ord(' ')
+    return strings.tolist()
+
+
+def hashToInt(hash: str) -> int:
+    ''' our hashes are 8 byte blake2s hex digests so they fit in a uint64 '''
+    try:
+        return int(hash, 16) if isinstance(hash, str) and hash != '' else 0
+    except ValueError:
+        return 0
+
+
+def hashesToInts(hashes) -> np.ndarray:
+    ''' empty or malformed hashes are stored as 0 '''
+    return np.fromiter(
+        (hashToInt(h) for h in hashes),
+        dtype='uint64',
+        count=len(hashes))
+
+
+def intsToHashes(ints) -> list[str]:
+    return ['' if h == 0 else f'{h:016x}' for h in np.asarray(ints, dtype='uint64').tolist()]
+
+
+def _valueToFloat(value) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def valuesToFloats(values) -> np.ndarray:
+    ''' non-numeric values become nan '''
+    if len(values) < 16:
+        return np.array([_valueToFloat(value) for value in values], dtype='float64')
+    return np.asarray(pd.to_numeric(pd.Series(values, dtype='object'), errors='coerce'), dtype='float64')
@@ -0,0 +1,311 @@
+'''
+a write-ahead log shared by every stream in the process.
+
+appending an observation normally opens, appends to and closes that stream's
+file. with many streams and bursty traffic that's a lot of tiny writes. with
+the log, appends from every stream go to the end of one open file, which is
+flushed and fsynced in groups (every syncBytes or syncInterval, whichever
+comes first). a background thread folds the logged rows into the stream files
+every foldInterval, one append per stream no matter how many rows it got.
+
+the byte offset up to which the log has been folded is saved next to it, on
+startup anything after that is replayed. rows the stream's file already holds
+(same time and hash) are skipped, so replaying something that was folded right
+before a crash doesn't duplicate it. rows newer than the file's last row
+(FileManager.lastTime) can't be in it, only late rows are looked up.
+
+durability is tracked in bytes logged since the log was opened, which only go
+up, so a fold starting the log file over doesn't lose anyone's place.
+
+streams opt in by wrapping their FileManager (see Disk, the wal argument), any
+operation other than append folds the log first so the file is current.
+'''
+from typing import Union
+import os
+import json
+import threading
+import pandas as pd
+from satorilib.interfaces.data import FileManager
+from satorilib.disk.filetypes import fileManagerFor
+from satorilib.disk.utils import timestampToNanos, timestampsToNanos
+from satorilib import logging
+
+
+class WriteAheadLog():
+    ''' one append-only log for many streams, group committed '''
+
+    def __init__(
+        self,
+        path: str,
+        syncBytes: int = 1024**2,
+        syncInterval: float = 0.05,
+        foldInterval: float = 1.0,
+        indexEvery: int = 1000,
+    ):
+        '''
+        path - the log file
+        syncBytes - unsynced bytes that trigger an immediate flush and fsync
+        syncInterval - seconds between flushes otherwise
+        foldInterval - seconds between folds into the stream files
+        '''
+        self.path = path
+        self.syncBytes = syncBytes
+        self.syncInterval = syncInterval
+        self.foldInterval = foldInterval
+        self.indexEvery = indexEvery
+        self.managers: dict[str, FileManager] = {}
+        self.streams: dict[str, FileManager] = {}
+        self.lock = threading.Lock()
+        self.foldLock = threading.Lock()
+        self.synced = threading.Condition(self.lock)
+        # bytes logged and bytes fsynced since we opened the log, never reset
+        self.written = 0
+        self.durable = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'ab')
+        self.size = self.file.tell()
+        self.folded = self._loadFolded()
+        self.fold()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._background,
+            name='write-ahead-log',
+            daemon=True)
+        self.thread.start()
+
+    ### bookkeeping ###
+
+    @property
+    def foldedPath(self) -> str:
+        return f'{self.path}.folded'
+
+    def _loadFolded(self) -> int:
+        try:
+            with open(self.foldedPath, mode='r') as f:
+                folded = json.load(f).get('offset', 0)
+            return folded if 0 <= folded <= self.size else 0
+        except Exception as _:
+            return 0
+
+    def _saveFolded(self):
+        temp = f'{self.foldedPath}.tmp'
+        with open(temp, mode='w') as f:
+            json.dump({'offset': self.folded}, f)
+        os.replace(temp, self.foldedPath)
+
+    def managerFor(self, filePath: str) -> FileManager:
+        ''' the stream's own manager once it has logged something, else one for its extension '''
+        if filePath in self.streams:
+            return self.streams[filePath]
+        ext = os.path.splitext(filePath)[1].lstrip('.') or 'csv'
+        if ext not in self.managers:
+            self.managers[ext] = fileManagerFor(ext, indexEvery=self.indexEvery)
+        return self.managers[ext]
+
+    def wrap(self, manager: FileManager) -> 'LoggedManager':
+        return LoggedManager(manager=manager, wal=self)
+
+    ### writing ###
+
+    @staticmethod
+    def _native(value):
+        return value.item() if hasattr(value, 'item') else value
+
+    def append(
+        self,
+        filePath: str,
+        data: pd.DataFrame,
+        durable: bool = False,
+        manager: FileManager = None,
+    ) -> bool:
+        '''
+        logs the rows for filePath. durable waits until they're fsynced,
+        otherwise they're flushed within syncInterval. manager is what folds
+        them into the file, one for the extension by default.
+        '''
+        hashes = data['hash'].tolist() if 'hash' in data.columns else [None] * data.shape[0]
+        lines = b''.join(
+            (json.dumps([filePath, str(time), self._native(value), rowHash]) + '\n').encode()
+            for time, value, rowHash in zip(data.index.tolist(), data.iloc[:, 0].tolist(), hashes))
+        try:
+            with self.lock:
+                if manager is not None:
+                    self.streams[filePath] = manager
+                self.file.write(lines)
+                self.size += len(lines)
+                self.written += len(lines)
+                mine = self.written
+                if self.written - self.durable >= self.syncBytes:
+                    self._sync()
+                while durable and self.durable < mine:
+                    self.synced.wait()
+            return True
+        except Exception as e:
+            logging.error('unable to write to the write-ahead log', e, print=True)
+            return False
+
+    def _sync(self):
+        ''' flushes and fsyncs, call with the lock held '''
+        if self.durable == self.written:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.durable = self.written
+        self.synced.notify_all()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    ### folding ###
+
+    @property
+    def pending(self) -> int:
+        ''' bytes logged but not yet folded into stream files '''
+        return self.size - self.folded
+
+    def _lastTime(self, filePath: str) -> Union[int, None]:
+        ''' epoch nanoseconds of the newest row already in the stream's file '''
+        try:
+            last = self.managerFor(filePath).lastTime(filePath)
+        except Exception as _:
+            return None
+        return timestampToNanos(last) if last is not None else None
+
+    def _held(self, filePath: str, first: str) -> set[tuple[int, object]]:
+        ''' (nanos, hash) of the rows in the stream's file from first on '''
+        manager = self.managerFor(filePath)
+        try:
+            if hasattr(manager, 'readBetween'):
+                df = manager.readBetween(filePath, first)
+            else:
+                df = manager.read(filePath)
+        except Exception as _:
+            return set()
+        if df is None or df.empty:
+            return set()
+        hashes = df['hash'].tolist() if 'hash' in df.columns else [None] * df.shape[0]
+        return set(zip(timestampsToNanos(df.index).tolist(), hashes))
+
+    def fold(self) -> int:
+        ''' appends everything logged to the stream files, returns rows folded '''
+        with self.foldLock:
+            with self.lock:
+                end = self.size
+                start = self.folded
+                if end == start:
+                    return 0
+                self._sync()
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                raw = f.read(end - start)
+            # a torn last line (crash mid write) is dropped
+            usable = raw[:raw.rfind(b'\n') + 1]
+            streams: dict[str, list] = {}
+            for line in usable.splitlines():
+                try:
+                    filePath, time, value, rowHash = json.loads(line)
+                except Exception as _:
+                    continue
+                streams.setdefault(filePath, []).append((time, value, rowHash))
+            folded = 0
+            for filePath, rows in streams.items():
+                last = self._lastTime(filePath)
+                if last is not None:
+                    nanos = [timestampToNanos(row[0]) for row in rows]
+                    late = [i for i, n in enumerate(nanos) if n <= last]
+                    if len(late) > 0:
+                        # late rows may have been folded already, or not
+                        held = self._held(filePath, rows[min(late, key=nanos.__getitem__)][0])
+                        heldTimes = {n for n, _ in held}
+                        rows = [
+                            row for row, n in zip(rows, nanos)
+                            if n > last or not (
+                                (n, row[2]) in held or
+                                (row[2] is None and n in heldTimes))]
+                if len(rows) == 0:
+                    continue
+                data = pd.DataFrame(
+                    {
+                        'value': [row[1] for row in rows],
+                        'hash': [row[2] for row in rows]},
+                    index=[row[0] for row in rows])
+                if all(row[2] is None for row in rows):
+                    data = data[['value']]
+                if not self.managerFor(filePath).append(filePath=filePath, data=data):
+                    logging.error(f'unable to fold into {filePath}', print=True)
+                folded += len(rows)
+            with self.lock:
+                self.folded = start + len(usable)
+                if self.folded == self.size:
+                    # all caught up, start the log over
+                    self.file.truncate(0)
+                    self.file.seek(0)
+                    self.size = self.folded = 0
+                self._saveFolded()
+            return folded
+
+    def _background(self):
+        sinceFold = 0.0
+        while not self.stopped.wait(self.syncInterval):
+            try:
+                self.sync()
+                sinceFold += self.syncInterval
+                if sinceFold >= self.foldInterval:
+                    sinceFold = 0.0
+                    self.fold()
+            except Exception as e:
+                logging.error('write-ahead log background error', e, print=True)
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.fold()
+        with self.lock:
+            self.file.close()
+
+
+class LoggedManager(FileManager):
+    '''
+    a FileManager whose appends go to the write-ahead log. everything else is
+    passed through to the wrapped manager after folding the log.
+    '''
+
+    def __init__(self, manager: FileManager, wal: WriteAheadLog):
+        self.manager = manager
+        self.wal = wal
+
+    def _current(self):
+        if self.wal.pending > 0:
+            self.wal.fold()
+
+    @property
+    def unlogged(self) -> FileManager:
+        ''' the wrapped manager, once everything logged has reached it '''
+        self._current()
+        return self.manager
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.manager, name)
+        if not callable(attribute):
+            return attribute
+
+        def passthrough(*args, **kwargs):
+            self._current()
+            return attribute(*args, **kwargs)
+        return passthrough
+
+    def read(self, filePath: str, **kwargs):
+        self._current()
+        return self.manager.read(filePath, **kwargs)
+
+    def write(self, filePath: str, data: pd.DataFrame) -> bool:
+        self._current()
+        return self.manager.write(filePath, data)
+
+    def append(self, filePath: str, data: pd.DataFrame) -> bool:
+        return self.wal.append(filePath, data, manager=self.manager)
+
+    def readLines(self, filePath: str, start: int, end: int = None):
+        self._current()
+        return self.manager.readLines(filePath, start, end)
@@ -1,3 +1,6 @@
+from typing import Union
+import os
+import shutil
 from abc import ABC, abstractmethod
 
 
@@ -17,3 +20,33 @@ class FileManager(ABC):
     @abstractmethod
     def readLines(self, filePath: str, start: int, end: int):
         pass
+
+    def lastTime(self, filePath: str) -> Union[str, None]:
+        '''
+        the time of the newest row, None if there are none. this reads
+        everything, managers that can find it cheaply override it.
+        '''
+        df = self.read(filePath)
+        if df is None or df.empty:
+            return None
+        return str(df.index.max())
+
+    def replace(self, source: str, filePath: str) -> bool:
+        '''
+        swaps the stream written at source in for the one at filePath in one
+        step, source is gone afterwards. streams kept as folders are moved
+        aside first, a folder can't be renamed over one that isn't empty.
+        '''
+        try:
+            if os.path.isdir(source):
+                aside = f'{filePath}.old'
+                shutil.rmtree(aside, ignore_errors=True)
+                if os.path.exists(filePath):
+                    os.replace(filePath, aside)
+                os.replace(source, filePath)
+                shutil.rmtree(aside, ignore_errors=True)
+            else:
+                os.replace(source, filePath)
+            return True
+        except Exception as _:
+            return False
@@ -1,7 +1,12 @@
+import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
 import pandas as pd
+from pandas.io.sql import get_schema
 from .coerce import coerce
-import threading
 
 
 class MockLock:
@@ -17,6 +22,261 @@ class MockLock:
         pass
 
 
+class Fetched:
+    """
+    what a cursor had to say, read on the thread that ran the statement.
+    cursors belong to their connection so one from the writer can't be handed
+    to another thread to fetch from while the writer moves on.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self.description = cursor.description
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+        self.rows = cursor.fetchall() if cursor.description is not None else []
+        self.at = 0
+
+    def fetchone(self):
+        if self.at >= len(self.rows):
+            return None
+        self.at += 1
+        return self.rows[self.at - 1]
+
+    def fetchmany(self, size: int = 1) -> list:
+        rows = self.rows[self.at:self.at + size]
+        self.at += len(rows)
+        return rows
+
+    def fetchall(self) -> list:
+        rows = self.rows[self.at:]
+        self.at = len(self.rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class Pool:
+    """
+    reusable connections to one database file. reads borrow one of a few
+    reader connections, all writes are handed to a single writer thread which
+    owns its own connection. the writer drains whatever has queued up and
+    commits it as one transaction (each write in its own savepoint so one
+    failure doesn't take the others with it), so many small writes from many
+    threads cost one commit instead of one connect and one commit each.
+    """
+
+    def __init__(self, database: str, readers: int = 4, backlog: int = 1024, batch: int = 256):
+        """
+        readers - most reader connections kept open
+        backlog - most writes waiting, submitting more blocks until there's room
+        batch - most writes committed together
+        """
+        self.database = database
+        self.readers = readers
+        self.batch = batch
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        # bumped by close, readers lent out before it aren't taken back
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue(maxsize=backlog)
+        self.writer = None
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.database,
+            check_same_thread=False,
+            isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """ borrows a reader connection, opening one if we're under the limit """
+        conn = None
+        while conn is None:
+            with self.lock:
+                generation = self.generation
+                if self.idle.empty() and self.opened < self.readers:
+                    self.opened += 1
+                    conn = self.connect()
+            if conn is None:
+                try:
+                    # a reader closed while lent out frees room to open one
+                    conn = self.idle.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        try:
+            yield conn
+        finally:
+            with self.lock:
+                if generation != self.generation:
+                    # closed while it was lent out
+                    conn.close()
+                    self.opened -= 1
+                else:
+                    self.idle.put(conn)
+
+    def submit(self, job, script: bool = False) -> Future:
+        """ queues job(connection) on the writer thread """
+        with self.lock:
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(
+                    target=self._write,
+                    name=f'sqlite-writer-{os.path.basename(self.database)}',
+                    daemon=True)
+                self.writer.start()
+        future = Future()
+        self.jobs.put((job, script, future))
+        return future
+
+    def write(self, job, script: bool = False):
+        """ runs job(connection) on the writer thread and waits for it """
+        return self.submit(job, script=script).result()
+
+    def close(self):
+        """
+        stops the writer once it's done and closes the idle readers, readers
+        that are lent out are closed as they're given back
+        """
+        if self.writer is not None and self.writer.is_alive():
+            self.jobs.put(None)
+            self.writer.join()
+        with self.lock:
+            self.generation += 1
+            while not self.idle.empty():
+                self.idle.get().close()
+                self.opened -= 1
+
+    def _write(self):
+        conn = self.connect()
+        while True:
+            group = [self.jobs.get()]
+            while len(group) < self.batch:
+                try:
+                    group.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            done = []
+            try:
+                for item in group:
+                    if item is None:
+                        continue
+                    job, script, future = item
+                    if script:
+                        # executescript commits on its own, so it goes alone
+                        self._commit(conn)
+                        done.append(self._run(conn, job, future))
+                        continue
+                    if not conn.in_transaction:
+                        conn.execute('BEGIN')
+                    conn.execute('SAVEPOINT job')
+                    done.append(self._run(conn, job, future))
+                    if done[-1][2] is None:
+                        conn.execute('RELEASE job')
+                    else:
+                        conn.execute('ROLLBACK TO job')
+                        conn.execute('RELEASE job')
+                self._commit(conn)
+            except Exception as e:
+                try:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                except sqlite3.Error:
+                    pass
+                # the whole group is undone, including jobs it never reached
+                done = [(item[2], None, e) for item in group if item is not None]
+            for future, result, error in done:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+            if None in group:
+                conn.close()
+                return
+
+    @staticmethod
+    def _run(conn, job, future) -> tuple:
+        try:
+            return future, job(conn), None
+        except Exception as e:
+            return future, None, e
+
+    @staticmethod
+    def _commit(conn):
+        if conn.in_transaction:
+            conn.execute('COMMIT')
+
+
+pools: dict[str, Pool] = {}
+poolsLock = threading.Lock()
+
+
+def pool_for(database: str) -> Pool:
+    """ the shared pool for a database file """
+    key = os.path.abspath(database)
+    with poolsLock:
+        if key not in pools:
+            pools[key] = Pool(database)
+        return pools[key]
+
+
+def close(database: str = None):
+    """ shuts down the pool for one database, or all of them """
+    with poolsLock:
+        keys = (
+            [os.path.abspath(database)] if database is not None
+            else list(pools.keys()))
+        closing = [pools.pop(key) for key in keys if key in pools]
+    for pool in closing:
+        pool.close()
+
+
+def _sql_value(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+    return column
+
+
+def load(
+    conn: sqlite3.Connection,
+    data: pd.DataFrame,
+    table: str,
+    if_exists: str = 'append',
+    index_col: str = None,
+):
+    """ inserts a dataframe with one executemany, creating the table if need be """
+    if index_col:
+        data = data.rename_axis(index_col).reset_index()
+    exists = conn.execute(
+        "select 1 from sqlite_master where type='table' and name=?",
+        (table,)).fetchone() is not None
+    if exists and if_exists == 'fail':
+        raise ValueError(f"Table '{table}' already exists.")
+    if exists and if_exists == 'replace':
+        conn.execute(f'drop table "{table}"')
+        exists = False
+    if not exists:
+        conn.execute(get_schema(data, table, con=conn))
+    if data.empty:
+        return 0
+    rows = (
+        pd.DataFrame({c: _sql_value(data[c]) for c in data.columns})
+        .astype(object)
+        .where(data.notnull(), None)
+        .values
+        .tolist())
+    columns = ','.join(f'"{c}"' for c in data.columns)
+    marks = ','.join('?' for _ in data.columns)
+    conn.executemany(
+        f'insert into "{table}" ({columns}) values ({marks})',
+        rows)
+    return len(rows)
+
+
 def execute(
     query: str = None,
     params: list = None,
@@ -29,28 +289,20 @@ def execute(
 ):
     if not query and data is None:
         return
-    if lock is None:
-        from dask.distributed import Lock
-        lock = Lock('db-lock')
-        try:
-            with lock:
-                pass
-        except Exception:
-            lock = MockLock('db-lock')
-    with lock:
-        with sqlite3.connect(database) as conn:
-            if query:
-                if ';' in query and (params is None or params == []):
-                    return conn.executescript(query)
-                else:
-                    return conn.execute(query, params)
-            if data is not None and table:
-                if (not data.empty and data.columns.tolist() != [' ']) or data.empty:
-                    return data.to_sql(
-                        table, conn,
-                        if_exists=if_exists,
-                        index=True if index_col else False,
-                        index_label=index_col if index_col else None)
+    pool = pool_for(database)
+    with lock or nullcontext():
+        if query:
+            if ';' in query and (params is None or params == []):
+                return pool.write(
+                    lambda conn: Fetched(conn.executescript(query)),
+                    script=True)
+            return pool.write(lambda conn: Fetched(conn.execute(query, params or [])))
+        if data is not None and table:
+            if (not data.empty and data.columns.tolist() != [' ']) or data.empty:
+                return pool.write(lambda conn: load(
+                    conn, data, table,
+                    if_exists=if_exists,
+                    index_col=index_col))
 
 
 def write(
@@ -81,16 +333,8 @@ def read(
     lock=None,
 ):
     ''' returns dataframe '''
-    if lock is None:
-        from dask.distributed import Lock
-        lock = Lock('db-lock')
-        try:
-            with lock:
-                pass
-        except Exception:
-            lock = MockLock('db-lock')
-    with lock:
-        with sqlite3.connect(database) as conn:
+    with lock or nullcontext():
+        with pool_for(database).reader() as conn:
             if index_col:
                 return pd.read_sql(query, conn, params=params, index_col=index_col)
             else:
@@ -133,7 +377,8 @@ def update(
     columns: list,
     values: list,
     table: str,
-    database: str = None
+    database: str = None,
+    lock=None,
 ):
     ''' returns query for updates '''
     query = update_query(
@@ -55,6 +55,11 @@ class Sqlite:
     def __exit__(self, exc_type, exc_val, exc_tb):
         return
 
+    @property
+    def pool(self) -> sql_io.Pool:
+        ''' connections are shared by every Sqlite object on the same file '''
+        return sql_io.pool_for(self.database)
+
     def get_initialize(self):
         return self.initialize
 
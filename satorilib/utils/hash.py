@@ -1,9 +1,12 @@
 # mainly used for generating unique ids for data and model paths since they must be short
 
 from typing import Union
+import os
+import multiprocessing
 import base64
 import hashlib
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 # from satorilib.concepts import StreamId # recursive import
 
 
@@ -30,48 +33,91 @@ def hashIt(string: str) -> str:
         digest_size=8).hexdigest()  # 27mb / million rows
 
 
+### hash chain engine ###
+
+
+def chainInputs(df: pd.DataFrame) -> tuple[list[str], list[str]]:
+    ''' the index and value of every row as strings, in one pass '''
+    return (
+        list(map(str, df.index.tolist())),
+        list(map(str, df['value'].tolist())))
+
+
+def hashChain(
+    times: list[str],
+    values: list[str],
+    priorRowHash: str = '',
+) -> list[str]:
+    ''' the hash of every row, each based on the one before it '''
+    base = hashlib.blake2s(digest_size=8)
+    rowHashes = []
+    for ts, value in zip(times, values):
+        hasher = base.copy()
+        hasher.update((priorRowHash + ts + value).encode())
+        priorRowHash = hasher.hexdigest()
+        rowHashes.append(priorRowHash)
+    return rowHashes
+
+
+def walkChain(
+    times: list[str],
+    values: list[str],
+    hashes: list[str],
+    priorRowHash: str = '',
+) -> tuple[Union[int, None], str]:
+    '''
+    verifies the chain in one pass, returns the position of the first row that
+    doesn't match its hash (or None) and the last good hash. the last good row
+    is always the one just before the first bad one.
+    '''
+    base = hashlib.blake2s(digest_size=8)
+    for i, (ts, value, rowHash) in enumerate(zip(times, values, hashes)):
+        hasher = base.copy()
+        hasher.update((priorRowHash + ts + value).encode())
+        computed = hasher.hexdigest()
+        if computed != rowHash:
+            return i, priorRowHash
+        priorRowHash = computed
+    return None, priorRowHash
+
+
+def firstBadRow(df: pd.DataFrame, priorRowHash: str = None) -> Union[int, None]:
+    ''' position of the first row that doesn't pass the hash check or None '''
+    times, values = chainInputs(df)
+    return walkChain(
+        times=times,
+        values=values,
+        hashes=df['hash'].tolist(),
+        priorRowHash=priorRowHash or '')[0]
+
+
 def historyHashes(df: pd.DataFrame, priorRowHash: str = None) -> pd.DataFrame:
     ''' creates hashes of every row in the dataframe based on prior hash '''
-    priorRowHash = priorRowHash or ''
-    rowHashes = []
-    for index, row in df.iterrows():
-        rowStr = priorRowHash + str(index) + str(row['value'])
-        rowHash = hashIt(rowStr)
-        rowHashes.append(rowHash)
-        priorRowHash = rowHash
-    df['hash'] = rowHashes
+    times, values = chainInputs(df)
+    df['hash'] = hashChain(times, values, priorRowHash=priorRowHash or '')
     return df
 
 
 def verifyRoot(df: pd.DataFrame) -> bool:
     ''' returns true if root hash is empty string plus the first row '''
-    for index, row in df.iterrows():
-        rowStr = '' + str(index) + str(row['value'])
-        rowHash = hashIt(rowStr)
-        if rowHash == row['hash']:
-            return True
+    if df.empty:
         return False
-    return False
+    return firstBadRow(df.iloc[:1]) is None
 
 
 def verifyHashes(df: pd.DataFrame, priorRowHash: str = None) -> tuple[bool, Union[pd.DataFrame, None]]:
     '''
-    returns success flag and the first row as DataFrame that doesn't pass the
-    hash check or None
+    returns success flag and the last row as DataFrame that passed the hash
+    check before the first one that doesn't, or None
     priorRowHash isn't usually passed in because we do the verification on the
     entire dataframe, so by default the first priorRowHash is assumed to be an
     empty string because it's the first peice of data that was recorded. if new
     data was found before it, all the hashes change.
     '''
-    priorRowHash = priorRowHash or ''
-    priorRow = None
-    for index, row in df.iterrows():
-        rowHash = hashIt(priorRowHash + str(index) + str(row['value']))
-        if rowHash != row['hash']:
-            return False, priorRow.to_frame().T if isinstance(priorRow, pd.Series) else None
-        priorRowHash = rowHash
-        priorRow = row
-    return True, None
+    i = firstBadRow(df, priorRowHash)
+    if i is None:
+        return True, None
+    return False, df.iloc[[i-1]] if i > 0 else None
 
 
 def verifyHashesReturnError(df: pd.DataFrame, priorRowHash: str = None) -> tuple[bool, Union[pd.DataFrame, None]]:
@@ -83,59 +129,108 @@ def verifyHashesReturnError(df: pd.DataFrame, priorRowHash: str = None) -> tuple
     empty string because it's the first peice of data that was recorded. if new
     data was found before it, all the hashes change.
     '''
-    priorRowHash = priorRowHash or ''
-    for index, row in df.iterrows():
-        rowHash = hashIt(priorRowHash + str(index) + str(row['value']))
-        if rowHash != row['hash']:
-            return False, row.to_frame().T
-        priorRowHash = rowHash
-    return True, None
+    i = firstBadRow(df, priorRowHash)
+    if i is None:
+        return True, None
+    return False, df.iloc[[i]]
 
 # verifyHashes(pd.DataFrame({'value':[1,2,3,4,5,6], 'hash':['ce8efc6eeb9fc30b','e2cc1a4e70bdba14','42359a663f6c3e30','6278827c73894e0c','c7a6682880ee6f8d','d607268c4f2e75ed']}, index=[0,1,2,3,4,9,5]))
 
 
-def verifyHashesReturnLastGood(df: pd.DataFrame, priorRowHash: str = None) -> tuple[bool, Union[pd.DataFrame, None]]:
-    ''' returns success flag and the last known good row as DataFrame '''
+def verifyHashesReturnLastGood(df: pd.DataFrame, priorRowHash: str = None) -> tuple[bool, Union[pd.DataFrame, pd.Series, None]]:
+    '''
+    returns success flag and the last known good row as DataFrame, or the last
+    row as a Series if they're all good
+    '''
     if df.empty:
         return True, None
-    priorRowHash = priorRowHash or ''
-    for index, row in df.iterrows():
-        rowHash = hashIt(priorRowHash + str(index) + str(row['value']))
-        if rowHash != row['hash']:
-            return False, priorRow.to_frame().T
-        priorRowHash = rowHash
-        priorRow = row
-    return True, row
+    i = firstBadRow(df, priorRowHash)
+    if i is None:
+        return True, df.iloc[-1]
+    return False, df.iloc[[i-1]] if i > 0 else None
+
+
+def _poolContext() -> multiprocessing.context.BaseContext:
+    '''
+    workers are never forked, the caller usually has threads (and their locks)
+    which a forked child would inherit mid-use
+    '''
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _verifySegment(segment: tuple[list[str], list[str], list[str], str]) -> Union[int, None]:
+    ''' runs in a worker process, returns the first bad position or None '''
+    times, values, hashes, priorRowHash = segment
+    return walkChain(times, values, hashes, priorRowHash)[0]
+
+
+def verifyHashesParallel(
+    df: pd.DataFrame,
+    priorRowHash: str = None,
+    boundaries: list[int] = None,
+    workers: int = None,
+    minimum: int = 200000,
+) -> tuple[bool, Union[pd.DataFrame, pd.Series, None]]:
+    '''
+    same answer as verifyHashesReturnLastGood, but splits the chain into
+    segments which are verified in a process pool. each segment starts from the
+    recorded hash of the row before it (boundaries are usually checkpoints);
+    that hash is itself verified by the segment before, so the first bad row
+    of the first failing segment is the first bad row of the whole chain.
+    small frames aren't worth the pool so they're verified serially.
+    '''
+    if df.empty:
+        return True, None
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or df.shape[0] < minimum:
+        return verifyHashesReturnLastGood(df, priorRowHash)
+    times, values = chainInputs(df)
+    hashes = df['hash'].tolist()
+    size = -(-len(hashes) // (workers * 4))
+    cuts = sorted(
+        {b for b in (boundaries or []) if 0 < b < len(hashes)} |
+        set(range(size, len(hashes), size)))
+    starts = [0] + cuts
+    ends = cuts + [len(hashes)]
+    segments = [
+        (
+            times[start:end],
+            values[start:end],
+            hashes[start:end],
+            (priorRowHash or '') if start == 0 else hashes[start-1])
+        for start, end in zip(starts, ends)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_poolContext()) as pool:
+        results = list(pool.map(_verifySegment, segments))
+    for start, bad in zip(starts, results):
+        if bad is not None:
+            i = start + bad
+            return False, df.iloc[[i-1]] if i > 0 else None
+    return True, df.iloc[-1]
 
 
 def cleanHashes(df: pd.DataFrame) -> tuple[bool, Union[pd.DataFrame, None]]:
     '''
-    returns success flag and the cleaned DataFrame or None
+    returns success flag and the cleaned DataFrame
     success is true if the first hash is the first value plus ''.
-    if it is able to create a dataframe of all the other hashes from there and
-    that dataframe is different than the input dataframe, it returns it. if it's
-    unable to make a new dataframe or the one it makes matches the input, it
-    returns None.
+    the dataframe holds every row whose hash follows from the last good row
+    before it, so it's the whole input when nothing was wrong.
     '''
+    times, values = chainInputs(df)
+    hashes = df['hash'].tolist()
+    base = hashlib.blake2s(digest_size=8)
     priorRowHash = ''
-    i = 0
-    success = False
-    rows = []
-    for index, row in df.iterrows():
-        rowStr = priorRowHash + str(index) + str(row['value'])
-        rowHash = hashIt(rowStr)
-        if i == 0 and row['hash'] == rowHash:
-            success = True
-        i += 1
-        if rowHash != row['hash']:
+    keep = []
+    for i, (ts, value, rowHash) in enumerate(zip(times, values, hashes)):
+        hasher = base.copy()
+        hasher.update((priorRowHash + ts + value).encode())
+        if hasher.hexdigest() != rowHash:
             # skip this row
             continue
-        rows.append(row)
+        keep.append(i)
         priorRowHash = rowHash
-    dfReturn = pd.DataFrame(rows, columns=df.columns)
-    if dfReturn.equals(df):
-        return success, None
-    return success, dfReturn
+    return len(keep) > 0 and keep[0] == 0, df.iloc[keep]
 
 # cleanHashes(pd.DataFrame({'value':[1,2,3,4,5,6], 'hash':['ce8efc6eeb9fc30b','e2cc1a4e70bdba14','42359a663f6c3e30','6278827c73894e0c','c7a6682880ee6f8d','d607268c4f2e75ed']}, index=[0,1,2,3,4,9,5]))
 # cleanHashes(pd.DataFrame({'value':[1,2,3,4,5,9,6], 'hash':['ce8efc6eeb9fc30b','e2cc1a4e70bdba14','42359a663f6c3e30','6278827c73894e0c','c7a6682880ee6f8d','erroneous row','d607268c4f2e75ed']}, index=[0,1,2,3,4,9,5]))
@@ -115,7 +115,7 @@ class Memory(ModelMemoryApi, DiskMemory):
             df.loc[incremental.index, [
                 x for x in incremental.columns]] = incremental
         else:
-            df = df.append(incremental).sort_index()
+            df = pd.concat([df, incremental]).sort_index()
         return df.fillna(method='ffill')
 
     @staticmethod
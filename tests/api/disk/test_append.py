@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes, verifyHashes
+from satorilib.disk.cache import Cache
+from satorilib.disk.merkle import MerkleSummary
+
+
+def stamp(seconds: int) -> str:
+    return str(pd.Timestamp('2024-01-01') + pd.Timedelta(seconds=int(seconds))) + '.000000'
+
+
+class TestAppend(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.streamId = StreamId(source='s', author='a', stream='x', target='t')
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(100)]},
+            index=[stamp(60 * i) for i in range(100)]))
+        self.cache = Cache(id=self.streamId, loc=self.folder)
+        self.cache.write(self.df)
+        self.merkle = self.cache.merkle
+        self.rollups = self.cache.rollups
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def expected(self, *rows: tuple[int, float]) -> pd.DataFrame:
+        ''' the history with these (seconds, value) rows, hashed from scratch '''
+        return historyHashes(pd.concat([
+            self.df[['value']],
+            pd.DataFrame(
+                {'value': [value for _, value in rows]},
+                index=[stamp(seconds) for seconds, _ in rows])]).sort_index())
+
+    def assertKeptUp(self, expected: pd.DataFrame):
+        pd.testing.assert_frame_equal(self.cache.df, expected, check_names=False)
+        pd.testing.assert_frame_equal(
+            Cache(id=self.streamId, loc=self.folder).df, expected, check_names=False)
+        self.assertEqual(
+            self.cache.merkle.levels,
+            MerkleSummary.build(expected['hash'].tolist()).levels)
+        self.assertEqual(self.cache.rollups.rows, expected.shape[0])
+
+    def test_newest_rows_are_buffered(self):
+        for i in range(100, 110):
+            result = self.cache.appendByAttributes(value=float(i), timestamp=stamp(60 * i), hashThis=True)
+            self.assertTrue(result.success)
+            self.assertTrue(result.validated)
+        # nothing rebuilt, the rows wait in the buffer
+        self.assertEqual(len(self.cache._tail), 10)
+        self.assertIs(self.cache._merkle, self.merkle)
+        self.assertIs(self.cache._rollups, self.rollups)
+        self.assertKeptUp(self.expected(*[(60 * i, float(i)) for i in range(100, 110)]))
+
+    def test_frames_of_newest_rows_are_buffered(self):
+        for i in range(100, 110):
+            self.assertTrue(self.cache.append(
+                pd.DataFrame({'value': [float(i)]}, index=[stamp(60 * i)]), hashThis=True))
+        # the tail isn't folded into the frame between appends
+        self.assertEqual(len(self.cache._tail), 10)
+        self.assertKeptUp(self.expected(*[(60 * i, float(i)) for i in range(100, 110)]))
+
+    def test_late_row_falls_back_to_a_rewrite(self):
+        result = self.cache.appendByAttributes(value=-1.0, timestamp=stamp(60 * 50 + 30), hashThis=True)
+        self.assertTrue(result.success)
+        self.assertTrue(result.validated)
+        expected = self.expected((60 * 50 + 30, -1.0))
+        self.assertEqual(result.hash, expected['hash'].iloc[51])
+        self.assertEqual(verifyHashes(self.cache.df, ''), (True, None))
+        self.assertKeptUp(expected)
+        # an existing time isn't appended again
+        self.assertFalse(self.cache.appendByAttributes(value=1.0, timestamp=stamp(60), hashThis=True).success)
+
+    def test_validated_against_the_checked_row_alone(self):
+        self.assertEqual(self.cache.checkedIndex, self.df.index[-1])
+
+        def fullValidation(*args, **kwargs):
+            raise AssertionError('validated more than the new row')
+
+        self.cache.performValidation = fullValidation
+        result = self.cache.appendByAttributes(value=100.0, timestamp=stamp(6000), hashThis=True)
+        self.assertTrue(result.validated)
+        self.assertEqual((self.cache.checkedIndex, self.cache.checkedHash), (stamp(6000), result.hash))
+        result = self.cache.appendByAttributes(
+            value=101.0, timestamp=stamp(6060), observationHash='0000000000000000')
+        self.assertFalse(result.validated)
+        self.assertEqual(self.cache.checkedIndex, stamp(6000))
+        del self.cache.performValidation
+        # a validation from the checked row finds it too, it's the first one after it
+        self.assertEqual(self.cache.performValidation(), (False, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
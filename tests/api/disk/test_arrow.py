@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from satorilib.disk.filetypes.arrow import ArrowManager
+
+
+class TestArrowManager(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'aggregate.arrow')
+        self.manager = ArrowManager(compactAfter=3)
+        self.df = pd.DataFrame(
+            {
+                'value': [1.5, 2.5, 3.5, 4.5, 5.5],
+                'hash': ['4d8f695a04b7e36e', 'd4c54b832c15f52a', '', '00000000000000ff', '0000000000000a0b']},
+            index=[f'2024-01-01 00:00:0{i}.000000' for i in range(5)])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_write_read(self):
+        self.assertTrue(self.manager.write(self.path, self.df.copy()))
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+        arrays = self.manager.readArrays(self.path)
+        self.assertFalse(arrays['value'].flags.writeable)
+        self.assertEqual(arrays['value'].tolist(), self.df['value'].tolist())
+
+    def test_append_compacts(self):
+        self.manager.write(self.path, self.df.iloc[:1].copy())
+        for i in range(1, 5):
+            self.assertTrue(self.manager.append(self.path, self.df.iloc[i:i+1].copy()))
+        self.assertLessEqual(len(self.manager.files(self.path)), 3)
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+
+    def test_last_time_of_a_late_append(self):
+        self.assertIsNone(self.manager.lastTime(self.path))
+        self.manager.write(self.path, self.df.iloc[[0, 1, 3, 4]].copy())
+        self.manager.append(self.path, self.df.iloc[[2]].copy())
+        self.assertEqual(self.manager.lastTime(self.path), self.df.index[-1])
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+
+    def test_read_lines(self):
+        self.manager.write(self.path, self.df.iloc[:2].copy())
+        self.manager.append(self.path, self.df.iloc[2:].copy())
+        pd.testing.assert_frame_equal(
+            self.manager.readLines(self.path, 1, 4), self.df.iloc[1:4])
+        self.assertIsNone(self.manager.readLines(self.path, 5))
+
+    def test_mapped_files_are_never_replaced(self):
+        ''' as on windows, where a file something has mapped can't be replaced or removed '''
+        replace = os.replace
+
+        def replaceNew(source, target):
+            self.assertFalse(os.path.exists(target))
+            replace(source, target)
+
+        with mock.patch('os.remove', side_effect=PermissionError), \
+                mock.patch('os.replace', side_effect=replaceNew):
+            self.manager.write(self.path, self.df.iloc[:1].copy())
+            held = self.manager.readTable(self.path)
+            for i in range(1, 5):
+                self.assertTrue(self.manager.append(self.path, self.df.iloc[i:i+1].copy()))
+            # the files that were folded are still there, readers skip them
+            self.assertGreater(len(os.listdir(self.path)), len(self.manager.files(self.path)))
+            self.assertEqual(self.manager.readTable(self.path).num_rows, 5)
+            pd.testing.assert_frame_equal(self.manager.readLines(self.path, 0, 5), self.df)
+            self.assertTrue(self.manager.write(self.path, self.df.iloc[:3].copy()))
+            pd.testing.assert_frame_equal(self.manager.readLines(self.path, 0, 5), self.df.iloc[:3])
+        self.assertEqual(held.num_rows, 1)
+        del held
+        self.manager.append(self.path, self.df.iloc[3:].copy())
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+        self.assertEqual(sorted(os.listdir(self.path)), ['00000000-00000005.arrow', '00000006.arrow'])
+
+
+if __name__ == '__main__':
+    unittest.main()
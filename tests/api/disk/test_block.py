@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.filetypes.block import BlockManager, BlockHeader, encodeBlock, decodeBlock
+
+
+class TestBlockManager(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'aggregate.blk')
+        self.manager = BlockManager(blockRows=100)
+        rng = np.random.default_rng(2)
+        seconds = np.cumsum(rng.choice([60, 60, 60, 61, 3600], size=450))
+        self.df = historyHashes(pd.DataFrame(
+            {'value': np.round(rng.normal(size=len(seconds)), 3)},
+            index=[
+                str(pd.Timestamp('2024-01-01') + pd.Timedelta(seconds=int(s))) + '.000000'
+                for s in seconds]))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_codec_is_lossless(self):
+        rng = np.random.default_rng(4)
+        times = np.cumsum(rng.integers(-10**9, 10**12, size=500)).astype('int64')
+        hashes = rng.integers(0, 2**63, size=500).astype('uint64')
+        for values in [
+            rng.normal(size=500) * 1e6,
+            np.round(rng.normal(size=500), 2),
+            np.resize(np.array([0.0, -0.0, np.nan, np.inf, 1e300, -1.5]), 500),
+        ]:
+            encoded = encodeBlock(times, values, hashes)
+            header = BlockHeader.unpack(encoded)
+            decoded = decodeBlock(header, encoded[BlockHeader.layout.size:])
+            np.testing.assert_array_equal(decoded[0], times)
+            np.testing.assert_array_equal(decoded[1].view('uint64'), values.view('uint64'))
+            np.testing.assert_array_equal(decoded[2], hashes)
+
+    def test_write_append_read(self):
+        self.assertTrue(self.manager.write(self.path, self.df.iloc[:150].copy()))
+        self.assertTrue(self.manager.append(self.path, self.df.iloc[150:151].copy()))
+        self.assertTrue(self.manager.append(self.path, self.df.iloc[151:].copy()))
+        self.assertEqual([h.rows for h in self.manager.blocks(self.path)], [100, 100, 100, 100, 50])
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+        pd.testing.assert_frame_equal(self.manager.readLines(self.path, 95, 210), self.df.iloc[95:210])
+        pd.testing.assert_frame_equal(
+            pd.concat(self.manager.iterate(self.path, batchSize=200)), self.df)
+
+    def test_between_skips_other_blocks(self):
+        self.manager.write(self.path, self.df.copy())
+        with open(self.path, 'r+b') as f:
+            # spoil the first block, reads that don't need it don't notice
+            f.seek(BlockHeader.layout.size + 10)
+            f.write(b'\x00\x01\x02')
+        pd.testing.assert_frame_equal(
+            self.manager.between(self.path, self.df.index[220], self.df.index[330]),
+            self.df.iloc[220:330])
+
+    def test_torn_write(self):
+        self.manager.write(self.path, self.df.iloc[:250].copy())
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 5)
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df.iloc[:200])
+        self.manager.append(self.path, self.df.iloc[200:].copy())
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+
+    def test_crash_mid_append(self):
+
+        class Crashing(BlockManager):
+            def _replay(self, filePath: str):
+                if os.path.exists(self.journalPath(filePath)):
+                    # dies part way through rewriting the last block
+                    with open(filePath, 'r+b') as f:
+                        f.truncate(os.path.getsize(filePath) - 10)
+                    raise RuntimeError('crashed')
+                super()._replay(filePath)
+
+        self.manager.write(self.path, self.df.iloc[:150].copy())
+        self.assertFalse(Crashing(blockRows=100).append(self.path, self.df.iloc[150:160].copy()))
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df.iloc[:160])
+        self.assertFalse(os.path.exists(self.manager.journalPath(self.path)))
+        self.assertTrue(self.manager.append(self.path, self.df.iloc[160:].copy()))
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+
+    def test_append_after_a_corrupt_block(self):
+        self.manager.write(self.path, self.df.iloc[:250].copy())
+        last = self.manager.blocks(self.path)[-1]
+        with open(self.path, 'r+b') as f:
+            f.seek(last.offset + BlockHeader.layout.size + 3)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xff]))
+        self.assertTrue(self.manager.append(self.path, self.df.iloc[200:215].copy()))
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df.iloc[:215])
+        # a full last block that's corrupt is checked too
+        self.manager.write(self.path, self.df.iloc[:300].copy())
+        last = self.manager.blocks(self.path)[-1]
+        with open(self.path, 'r+b') as f:
+            f.seek(last.end - 1)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xff]))
+        self.assertTrue(self.manager.append(self.path, self.df.iloc[200:].copy()))
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+
+    def test_non_numeric(self):
+        df = pd.DataFrame(
+            {'value': [1.5, 'x'], 'hash': ['4d8f695a04b7e36e', '']},
+            index=['2024-01-01 00:00:00.000000', '2024-01-01 00:00:01.000000'])
+        self.manager.write(self.path, df.copy())
+        read = self.manager.read(self.path)
+        self.assertEqual(read['value'].iloc[0], 1.5)
+        self.assertTrue(np.isnan(read['value'].iloc[1]))
+        self.assertEqual(read['hash'].tolist(), ['4d8f695a04b7e36e', ''])
+
+    def test_missing(self):
+        self.assertIsNone(self.manager.read(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from satorilib.concepts import StreamId, Stream
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.registry import CacheRegistry
+from satorilib.disk.cadence import CadenceViews
+
+
+def stamp(seconds: int) -> str:
+    return str(pd.Timestamp('2024-01-01') + pd.Timedelta(seconds=int(seconds))) + '.000000'
+
+
+class TestCadenceViews(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.registry = CacheRegistry(loc=self.folder)
+        self.views = CadenceViews(registry=self.registry)
+        self.streamId = StreamId(source='s', author='a', stream='x', target='t')
+        rng = np.random.default_rng(5)
+        seconds = np.sort(rng.choice(20000, size=800, replace=False)) + 7
+        self.cache = self.registry.cacheOf(self.streamId)
+        self.cache.write(historyHashes(pd.DataFrame(
+            {'value': rng.normal(size=len(seconds))},
+            index=[stamp(s) for s in seconds])))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def expected(self, cadence: int, offset: int = 0) -> pd.DataFrame:
+        ''' resampled the long way: the latest value at or before each grid point '''
+        df = self.cache.df
+        series = pd.Series(
+            df['value'].astype('float64').to_numpy(),
+            index=pd.to_datetime(df.index))
+        shift = pd.Timedelta(seconds=offset)
+        grid = pd.date_range(
+            (series.index[0] - shift).ceil(f'{cadence}s') + shift,
+            (series.index[-1] - shift).floor(f'{cadence}s') + shift,
+            freq=f'{cadence}s')
+        return series.reindex(grid, method='ffill').to_frame('value')
+
+    def test_matches_pandas(self):
+        for cadence, offset in [(60, 0), (600, 90), (3600, 0)]:
+            pd.testing.assert_frame_equal(
+                self.views.resampled(self.streamId, cadence, offset),
+                self.expected(cadence, offset),
+                check_freq=False, check_names=False)
+
+    def test_extended_as_observations_arrive(self):
+        stream = Stream(streamId=self.streamId, cadence=300, offset=30)
+        self.views.ofStream(stream)
+        view = self.views.views[(self.streamId, 300, 30)]
+        for seconds in range(20100, 23000, 170):
+            self.cache.appendByAttributes(value=seconds / 1000, timestamp=stamp(seconds), hashThis=True)
+            self.assertTrue(view.refresh(self.cache.snapshot()))
+        pd.testing.assert_frame_equal(
+            self.views.ofStream(stream), self.expected(300, 30),
+            check_freq=False, check_names=False)
+        # a late row changes history, so the view is made again
+        self.cache.appendByAttributes(value=99.0, timestamp=stamp(3), hashThis=True)
+        self.assertFalse(view.refresh(self.cache.snapshot()))
+        pd.testing.assert_frame_equal(
+            self.views.ofStream(stream), self.expected(300, 30),
+            check_freq=False, check_names=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache
+from satorilib.disk.checkpoint import Checkpoints
+
+
+class TestCheckpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.streamId = StreamId(source='s', author='a', stream='x', target='t')
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(350)]},
+            index=[f'2024-01-01 00:{i // 60:02d}:{i % 60:02d}.000000' for i in range(350)]))
+        self.cache = Cache(id=self.streamId, loc=self.folder)
+        self.cache.write(self.df)
+        self.cache.checkpoints.every = 100
+        self.cache.modifyBasedValidation(*self.cache.performValidation())
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def replaceFile(self, df: pd.DataFrame):
+        ''' as another process (or a peer) would, without our cache knowing '''
+        self.cache.csv.write(filePath=self.cache.path(), data=df)
+
+    def test_persisted_outside_the_stream_folder(self):
+        self.cache.merkle
+        self.cache.rollup()
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(self.cache.path()))),
+            ['aggregate.csv', 'readme.md'])
+        checkpoints = Checkpoints.load(self.cache.sidecarPath('checkpoints.json'))
+        self.assertEqual([p[2] for p in checkpoints.points], [100, 200, 300])
+        self.assertEqual(checkpoints.tip[2], 350)
+
+    def test_old_sidecars_are_moved_out(self):
+        path = self.cache.sidecarPath('checkpoints.json')
+        os.replace(path, self.cache.path(filename='checkpoints.json'))
+        restarted = Cache(id=self.streamId, loc=self.folder)
+        self.assertFalse(restarted.exists('checkpoints.json'))
+        self.assertEqual(restarted.checkpoints.tip[2], 350)
+
+    def test_resumes_after_restart(self):
+        self.cache.appendByAttributes(value=1.5, timestamp='2024-01-01 01:00:00.000000', hashThis=True)
+        restarted = Cache(id=self.streamId, loc=self.folder)
+        self.assertEqual(restarted.checkpoints.resume(restarted.df), (350, self.df['hash'].iloc[-1]))
+        self.assertEqual(restarted.resumeValidation(), (True, None))
+        # a bad row after the checkpoint is still caught, the checkpoint is the last good one
+        tampered = restarted.df.copy()
+        tampered.iloc[-1, 0] = 2.5
+        self.replaceFile(tampered)
+        restarted = Cache(id=self.streamId, loc=self.folder)
+        success, df = restarted.resumeValidation()
+        self.assertFalse(success)
+        self.assertEqual(df.index[0], self.df.index[-1])
+
+    def test_rewritten_prefix_invalidates_checkpoints(self):
+        rewritten = self.df.copy()
+        rewritten.iloc[150, 0] = -1.0
+        rewritten = historyHashes(rewritten[['value']])
+        self.replaceFile(rewritten)
+        restarted = Cache(id=self.streamId, loc=self.folder)
+        # only the checkpoint before the change still matches
+        self.assertEqual(restarted.checkpoints.resume(restarted.df), (100, self.df['hash'].iloc[99]))
+        self.assertEqual(restarted.resumeValidation(), (True, None))
+        # a chain broken before the change isn't trusted past the checkpoint
+        broken = rewritten.copy()
+        broken.iloc[120, 0] = -2.0
+        self.replaceFile(broken)
+        restarted = Cache(id=self.streamId, loc=self.folder)
+        success, df = restarted.resumeValidation()
+        self.assertFalse(success)
+        self.assertEqual(df.index[0], self.df.index[119])
+
+
+if __name__ == '__main__':
+    unittest.main()
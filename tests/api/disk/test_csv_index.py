@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.disk.filetypes.csv import CSVManager
+
+
+class TestCSVLineIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'aggregate.csv')
+        self.df = pd.DataFrame(
+            {'value': [float(i) for i in range(250)], 'hash': [f'{i:016x}' for i in range(250)]},
+            index=[f'2024-01-01 00:00:{i:06d}' for i in range(250)])
+        self.manager = CSVManager(indexEvery=16)
+        self.manager.write(self.path, self.df.iloc[:100])
+        self.manager.append(self.path, self.df.iloc[100:])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_read_lines_matches_plain(self):
+        plain = CSVManager()
+        self.assertTrue(self.manager.readLines(self.path, 37, 90).equals(
+            plain.readLines(self.path, 37, 90)))
+        self.assertEqual(self.manager.readLines(self.path, 249).index[0], self.df.index[249])
+
+    def test_truncate(self):
+        self.assertTrue(self.manager.mirrors(self.path, 250))
+        self.assertTrue(self.manager.truncate(self.path, 123))
+        self.assertTrue(CSVManager().read(self.path).equals(self.df.iloc[:123]))
+        self.assertTrue(CSVManager(indexEvery=16).mirrors(self.path, 123))
+
+    def test_catches_up_with_outside_writes(self):
+        CSVManager().append(self.path, self.df.iloc[:1])
+        index = CSVManager(indexEvery=16).lineIndex(self.path)
+        self.assertEqual(index.rows, 251)
+        self.assertFalse(index.ordered)
+        CSVManager().write(self.path, self.df.iloc[:10])
+        index = self.manager.lineIndex(self.path)
+        self.assertEqual((index.rows, index.ordered), (10, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
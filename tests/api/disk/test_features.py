@@ -0,0 +1,68 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.registry import CacheRegistry
+from satorilib.disk.gather import GatherService
+from satorilib.disk.features import FeatureMatrix
+
+
+def stamp(seconds: int) -> str:
+    return str(pd.Timestamp('2024-01-01') + pd.Timedelta(seconds=int(seconds))) + '.000000'
+
+
+class TestFeatureMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.registry = CacheRegistry(loc=self.folder)
+        self.service = GatherService(registry=self.registry)
+        self.streamIds = [
+            StreamId(source='s', author='a', stream=f'x{i}', target='t')
+            for i in range(3)]
+        rng = np.random.default_rng(11)
+        for i, streamId in enumerate(self.streamIds):
+            seconds = np.sort(rng.choice(5000, size=300 + 100 * i, replace=False)) + 60 * i
+            self.registry.cacheOf(streamId).write(historyHashes(pd.DataFrame(
+                {'value': rng.normal(size=len(seconds))},
+                index=[stamp(s) for s in seconds])))
+        self.target = ('s', 'a', 'x1', 't')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def expected(self) -> pd.DataFrame:
+        return self.service.gather(self.target, self.streamIds).astype('float64')
+
+    def observe(self, matrix: FeatureMatrix, i: int, seconds: int, value: float) -> bool:
+        self.registry.cacheOf(self.streamIds[i]).appendByAttributes(
+            value=value, timestamp=stamp(seconds), hashThis=True)
+        return matrix.update(self.streamIds[i], stamp(seconds), value)
+
+    def test_matches_gather_as_observations_arrive(self):
+        matrix = FeatureMatrix.gather(self.target, self.streamIds, service=self.service, headroom=4)
+        pd.testing.assert_frame_equal(matrix.frame, self.expected(), check_names=False, check_freq=False)
+        rng = np.random.default_rng(3)
+        seconds = 6000
+        for _ in range(40):
+            seconds += int(rng.integers(1, 20))
+            self.assertTrue(self.observe(matrix, int(rng.integers(0, 3)), seconds, float(rng.normal())))
+        self.assertTrue(self.observe(matrix, 1, seconds + 5, 1.0))
+        # newer than anything else stream 0 has, but behind the last row
+        self.assertTrue(self.observe(matrix, 0, seconds + 2, 9.0))
+        pd.testing.assert_frame_equal(matrix.frame, self.expected(), check_names=False, check_freq=False)
+        self.assertEqual(matrix.latestRow.tolist(), matrix.frame.iloc[-1].tolist())
+
+    def test_older_than_its_stream_needs_a_rebuild(self):
+        matrix = FeatureMatrix.gather(self.target, self.streamIds, service=self.service)
+        before = matrix.frame.copy()
+        self.assertFalse(matrix.update(self.streamIds[1], stamp(10), 1.0))
+        self.assertFalse(matrix.update(StreamId(source='s', author='a', stream='y', target='t'), stamp(9000), 1.0))
+        pd.testing.assert_frame_equal(matrix.frame, before)
+
+
+if __name__ == '__main__':
+    unittest.main()
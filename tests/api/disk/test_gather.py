@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.utils.memory import Memory
+from satorilib.disk.registry import CacheRegistry
+from satorilib.disk.gather import GatherService
+
+
+class TestGatherService(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.registry = CacheRegistry(loc=self.folder)
+        self.service = GatherService(registry=self.registry)
+        self.streamIds = [
+            StreamId(source='s', author='a', stream=f'x{i}', target='t')
+            for i in range(3)]
+        rng = np.random.default_rng(7)
+        self.frames = []
+        for i, streamId in enumerate(self.streamIds):
+            seconds = np.sort(rng.choice(5000, size=400 + 100 * i, replace=False)) + 60 * i
+            df = historyHashes(pd.DataFrame(
+                {'value': rng.normal(size=len(seconds))},
+                index=[str(pd.Timestamp('2024-01-01') + pd.Timedelta(seconds=int(s))) + '.000000' for s in seconds]))
+            self.registry.cacheOf(streamId).write(df)
+            self.frames.append(df)
+        self.target = ('s', 'a', 'x1', 't')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def legacy(self) -> pd.DataFrame:
+        return Memory.merge(
+            dfs=[
+                Memory.expand(df=df.copy(), streamId=streamId)
+                for df, streamId in zip(self.frames, self.streamIds)],
+            targetColumn=self.target)
+
+    def test_matches_memory_merge(self):
+        joined = self.service.gather(self.target, self.streamIds)
+        pd.testing.assert_frame_equal(joined, self.legacy(), check_names=False, check_freq=False)
+
+    def test_memoized_until_an_input_changes(self):
+        self.service.gather(self.target, self.streamIds)
+        joined = self.service.joined[(tuple(self.streamIds), self.target)][1]
+        self.service.gather(self.target, self.streamIds)
+        self.assertIs(self.service.joined[(tuple(self.streamIds), self.target)][1], joined)
+        cache = self.registry.cacheOf(self.streamIds[2])
+        cache.appendByAttributes(value=1.5, timestamp='2024-01-02 00:00:00.000000', hashThis=True)
+        self.frames[2] = cache.df
+        again = self.service.gather(self.target, self.streamIds)
+        self.assertIsNot(self.service.joined[(tuple(self.streamIds), self.target)][1], joined)
+        pd.testing.assert_frame_equal(again, self.legacy(), check_names=False, check_freq=False)
+
+    def test_callers_can_modify_what_they_get(self):
+        first = self.service.gather(self.target, self.streamIds)
+        row = first.iloc[[20]].copy()
+        expected = row.copy()
+        row.iloc[0, :] = -1.0
+        Memory.appendInsert(first, row)
+        first.iloc[0, 0] = -2.0
+        again = self.service.gather(self.target, self.streamIds)
+        pd.testing.assert_frame_equal(again.iloc[[20]], expected, check_freq=False)
+        pd.testing.assert_frame_equal(again, self.legacy(), check_names=False, check_freq=False)
+
+    def test_single_stream(self):
+        joined = self.service.gather(self.target, self.streamIds[:1])
+        pd.testing.assert_frame_equal(
+            joined,
+            Memory.expand(df=self.frames[0].copy(), streamId=self.streamIds[0]),
+            check_names=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
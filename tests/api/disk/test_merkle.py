@@ -0,0 +1,46 @@
+import unittest
+from satorilib.utils.hash import hashIt
+from satorilib.disk.merkle import MerkleSummary
+
+
+class TestMerkleSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.hashes = [hashIt(str(i)) for i in range(1000)]
+        self.summary = MerkleSummary.build(self.hashes, blockSize=16)
+
+    def test_incremental_matches_build(self):
+        summary = MerkleSummary(blockSize=16)
+        for i in range(0, len(self.hashes), 7):
+            summary.extend(self.hashes[i:i+7])
+        self.assertEqual(summary.root, self.summary.root)
+        self.assertIsNone(summary.firstDivergence(self.summary))
+
+    def test_persistence(self):
+        copy = MerkleSummary.fromJson(self.summary.toJson())
+        self.assertEqual(copy.levels, self.summary.levels)
+        copy.extend(['abc'])
+        self.assertEqual(copy.firstDivergence(self.summary), 992)
+        # the partial block's running hash picks up where the saved tail left off
+        self.assertEqual(copy.levels, MerkleSummary.build(self.hashes + ['abc'], blockSize=16).levels)
+
+    def test_divergence(self):
+        changed = self.hashes[:500] + ['different'] + self.hashes[501:]
+        other = MerkleSummary.build(changed, blockSize=16)
+        self.assertEqual(self.summary.firstDivergence(other), 496)
+        self.assertEqual(other.firstDivergence(self.summary), 496)
+
+    def test_prefix(self):
+        prefix = MerkleSummary.build(self.hashes[:100], blockSize=16)
+        self.assertEqual(self.summary.firstDivergence(prefix), 96)
+
+    def test_truncate(self):
+        changed = self.hashes[:500] + ['different'] + self.hashes[501:]
+        kept = self.summary.truncate(500)
+        self.assertEqual(kept, 496)
+        self.summary.extend(changed[kept:])
+        self.assertEqual(self.summary.levels, MerkleSummary.build(changed, blockSize=16).levels)
+
+
+if __name__ == '__main__':
+    unittest.main()
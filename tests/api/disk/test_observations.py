@@ -0,0 +1,44 @@
+import unittest
+import pandas as pd
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.observations import Observations
+
+
+class TestObservations(unittest.TestCase):
+
+    def setUp(self):
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(20)]},
+            index=[f'2024-01-01 00:00:{i:02d}.000000' for i in range(20)]))
+
+    def test_round_trip(self):
+        observations = Observations.fromFrame(self.df)
+        self.assertEqual(len(observations), 20)
+        self.assertEqual(observations.nbytes, 20 * 24)
+        pd.testing.assert_frame_equal(observations.toFrame(), self.df)
+        pd.testing.assert_frame_equal(observations.toFrame(3, 7), self.df.iloc[3:7])
+        self.assertEqual(observations.row(-1), (
+            self.df.index[-1], self.df['value'].iloc[-1], self.df['hash'].iloc[-1]))
+
+    def test_keeps_values_exactly(self):
+        df = self.df.iloc[:4].copy()
+        df['value'] = pd.Series(['1.5', 'abc', 2.0, '1.50'], index=df.index, dtype='object')
+        observations = Observations.fromFrame(df)
+        self.assertEqual(observations.others, {1: 'abc', 3: '1.50'})
+        pd.testing.assert_frame_equal(observations.toFrame(), df)
+
+    def test_extend(self):
+        observations = Observations.fromFrame(self.df.iloc[:10])
+        rows = list(zip(self.df.index[10:], self.df['value'][10:], self.df['hash'][10:]))
+        self.assertTrue(observations.extend(rows))
+        pd.testing.assert_frame_equal(observations.toFrame(), self.df)
+        self.assertFalse(observations.extend([('2024-01-02 00:00:00.000000', 'text', '')]))
+
+    def test_refuses_lossy(self):
+        df = self.df.iloc[:2].copy()
+        df.index = ['2024-01-01', '2024-01-02']
+        self.assertIsNone(Observations.fromFrame(df))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.disk.filetypes.parquet import ParquetManager
+
+
+class TestParquetManager(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'aggregate.parquet')
+        # one row every 6 hours, a new row group every day
+        self.manager = ParquetManager(minGroupRows=1)
+        self.df = pd.DataFrame(
+            {
+                'value': [float(i) for i in range(12)],
+                'hash': [f'{i + 1:016x}' for i in range(12)]},
+            index=[
+                f'2024-01-0{1 + i // 4} {6 * (i % 4):02d}:00:00.000000'
+                for i in range(12)])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_write_read(self):
+        self.assertTrue(self.manager.write(self.path, self.df.copy()))
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+        self.assertEqual([g[2] for g in self.manager.groups(self.path)], [4, 4, 4])
+
+    def test_append(self):
+        self.manager.write(self.path, self.df.iloc[:5].copy())
+        self.assertTrue(self.manager.append(self.path, self.df.iloc[5:].copy()))
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+
+    def test_out_of_order_and_repeated_rows(self):
+        shuffled = self.df.iloc[[3, 0, 7, 1, 2, 11, 4, 5, 6, 8, 10, 9]].copy()
+        repeated = self.df.iloc[[2]].copy()
+        repeated['value'] = -1.0
+        # the later of two rows at the same time wins
+        self.manager.write(self.path, pd.concat([shuffled.iloc[:6], shuffled.iloc[[1]]]))
+        self.manager.append(self.path, pd.concat([shuffled.iloc[6:], repeated]))
+        expected = self.df.copy()
+        expected.iloc[2, 0] = -1.0
+        pd.testing.assert_frame_equal(self.manager.read(self.path), expected)
+        self.assertEqual([g[2] for g in self.manager.groups(self.path)], [4, 4, 4])
+        pd.testing.assert_frame_equal(
+            self.manager.readBetween(self.path, '2024-01-01 12:00:00', '2024-01-02 06:00:00'),
+            expected.iloc[2:5])
+        pd.testing.assert_frame_equal(self.manager.readLines(self.path, 1, 4), expected.iloc[1:4])
+
+    def test_ranges(self):
+        self.manager.write(self.path, self.df.copy())
+        pd.testing.assert_frame_equal(
+            self.manager.readBetween(self.path, '2024-01-02 06:00:00', '2024-01-03'),
+            self.df.iloc[5:8])
+        pd.testing.assert_frame_equal(
+            self.manager.readLines(self.path, 3, 9), self.df.iloc[3:9])
+        self.assertIsNone(self.manager.readBetween(self.path, '2025-01-01'))
+
+
+if __name__ == '__main__':
+    unittest.main()
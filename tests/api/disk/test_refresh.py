@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache
+from satorilib.disk.filetypes.csv import CSVManager
+
+
+class TestCacheRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(300)]},
+            index=[f'2024-01-01 00:{i // 60:02d}:{i % 60:02d}.000000' for i in range(300)]))
+        self.streamId = StreamId(source='s', author='a', stream='x', target='t')
+        Cache(id=self.streamId, loc=self.folder).write(self.df.iloc[:200])
+        self.cache = Cache(id=self.streamId, loc=self.folder)
+        self.cache.modifyBasedValidation(*self.cache.performValidation())
+        # another process writing to the same file
+        self.other = CSVManager()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_appended_rows(self):
+        self.assertEqual(self.cache.refresh(), 0)
+        self.other.append(self.cache.path(), self.df.iloc[200:250])
+        self.assertEqual(self.cache.refresh(), 50)
+        self.assertEqual(self.cache.checkedIndex, self.df.index[249])
+        self.assertEqual(self.cache.df['hash'].tolist(), self.df['hash'].iloc[:250].tolist())
+
+    def test_broken_chain(self):
+        appended = self.df.iloc[200:210].copy()
+        appended.iloc[4, 0] = -1.0
+        self.other.append(self.cache.path(), appended)
+        self.assertEqual(self.cache.refresh(), 4)
+        self.assertEqual(self.cache.rowCount, 204)
+
+    def test_rewritten(self):
+        self.other.write(self.cache.path(), self.df.iloc[:100])
+        self.assertIsNone(self.cache.refresh())
+        self.assertEqual(self.cache.rowCount, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import os
+import sys
+import types
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache, Cached
+from satorilib.disk.registry import CacheRegistry
+
+
+class TestCacheRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(1000)]},
+            index=[f'2024-01-01 00:{i // 60:02d}:{i % 60:02d}.000000' for i in range(1000)]))
+        self.ids = [
+            StreamId(source='s', author='a', stream=f'stream{i}', target='t')
+            for i in range(4)]
+        for streamId in self.ids:
+            Cache(id=streamId, loc=self.folder).write(self.df)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_compacts_before_evicting(self):
+        registry = CacheRegistry(budget=10**9, loc=self.folder)
+        caches = [registry.cacheOf(streamId) for streamId in self.ids]
+        self.assertFalse(any(c.isCompact or c.isEvicted for c in caches))
+        registry.budget = caches[-1].footprint + 3 * 24 * 1000
+        registry.enforce()
+        self.assertTrue(all(c.isCompact for c in caches[:-1]))
+        self.assertFalse(any(c.isEvicted for c in caches))
+
+    def test_evicts_and_reloads(self):
+        registry = CacheRegistry(budget=1, loc=self.folder)
+        caches = [registry.cacheOf(streamId) for streamId in self.ids]
+        self.assertTrue(all(c.isEvicted for c in caches[:-1]))
+        self.assertFalse(caches[-1].isEvicted)
+        first = caches[0]
+        self.assertEqual(first.rowCount, 1000)
+        self.assertEqual(first.tip[2], self.df['hash'].iloc[-1])
+        self.assertTrue(first.isEvicted)
+        pd.testing.assert_frame_equal(first.df, self.df, check_names=False)
+        self.assertIs(registry.cacheOf(self.ids[0]), first)
+        self.assertTrue(caches[-1].isEvicted)
+
+    def test_warm_most_recent_first(self):
+        for i, streamId in enumerate(self.ids):
+            path = Cache(id=streamId, loc=self.folder).path()
+            os.utime(path, (10**9 + i, 10**9 + i))
+        registry = CacheRegistry(loc=self.folder)
+        futures = registry.warm(self.ids, workers=2)
+        self.assertEqual(list(futures), list(reversed(self.ids)))
+        cache = registry.cacheOf(self.ids[1])
+        self.assertIs(cache, futures[self.ids[1]].result())
+        self.assertEqual(cache.checkedIndex, self.df.index[-1])
+        for future in futures.values():
+            future.result()
+        self.assertEqual(len(registry), 4)
+        self.assertEqual(registry.pending, {})
+
+    def test_warm_order_with_the_configured_data_folder(self):
+        for i, streamId in enumerate(self.ids):
+            os.utime(Cache.pathOf(streamId, loc=self.folder), (10**9 + i, 10**9 + i))
+
+        class Config:
+            @staticmethod
+            def dataPath():
+                return self.folder
+
+        prior = Cache.config
+        Cache.config = Config
+        try:
+            registry = CacheRegistry()
+            self.assertEqual(registry.lastActive(self.ids[2]), 10**9 + 2)
+            futures = registry.warm(self.ids, workers=1, validate=False)
+            self.assertEqual(list(futures), list(reversed(self.ids)))
+            for future in futures.values():
+                future.result()
+            self.assertEqual(registry.cacheOf(self.ids[0]).rowCount, 1000)
+        finally:
+            Cache.config = prior
+
+    def test_cold_loads_dont_hold_up_other_lookups(self):
+        registry = CacheRegistry(budget=10**9, loc=self.folder)
+        loaded = registry.cacheOf(self.ids[0])
+        started = threading.Event()
+        release = threading.Event()
+
+        class Slow(Cache):
+            def __init__(self, *args, **kwargs):
+                started.set()
+                release.wait(5)
+                super().__init__(*args, **kwargs)
+
+        with mock.patch('satorilib.disk.registry.Cache', Slow):
+            results = {}
+            cold = [
+                threading.Thread(target=lambda i=i: results.setdefault(i, registry.cacheOf(self.ids[1])))
+                for i in range(2)]
+            for thread in cold:
+                thread.start()
+            started.wait(5)
+            # answered while the cold load is still going
+            self.assertIs(registry.cacheOf(self.ids[0]), loaded)
+            self.assertFalse(release.is_set())
+            release.set()
+            for thread in cold:
+                thread.join()
+        # both asked for it, it was loaded once
+        self.assertIs(results[0], results[1])
+        self.assertIs(registry.cacheOf(self.ids[1]), results[0])
+        self.assertEqual(registry.pending, {})
+
+    def test_total_kept_as_caches_change(self):
+        registry = CacheRegistry(budget=10**9, loc=self.folder)
+        caches = registry.cachesOf(self.ids)
+
+        def measured():
+            return sum(
+                0 if c.isEvicted else c._measure()[0] + len(c._tail) * c._rowBytes
+                for c in caches)
+
+        self.assertEqual(registry.footprint, measured())
+        for i in range(10):
+            caches[0].appendByAttributes(
+                value=float(i), timestamp=f'2024-01-02 00:00:{i:02d}.000000', hashThis=True)
+        self.assertEqual(registry.footprint, measured())
+        caches[1].compact()
+        caches[2].evict()
+        self.assertEqual(registry.footprint, measured())
+        caches[2].df
+        self.assertEqual(registry.footprint, measured())
+        registry.remove(self.ids[3])
+        caches.pop()
+        self.assertEqual(registry.footprint, measured())
+
+    def test_idle_caches_are_not_measured_again(self):
+        registry = CacheRegistry(budget=10**9, loc=self.folder)
+        caches = registry.cachesOf(self.ids)
+        calls = []
+        for cache in caches:
+            measure = cache._measure
+            cache._measure = lambda measure=measure: calls.append(None) or measure()
+        for _ in range(5):
+            registry.cacheOf(self.ids[0])
+        self.assertEqual(calls, [])
+        caches[1].write(self.df.iloc[:10])
+        registry.cacheOf(self.ids[0])
+        self.assertEqual(len(calls), 1)
+
+    def test_cached_comes_from_the_registry(self):
+        registry = CacheRegistry(budget=10**9, loc=self.folder)
+        prior = CacheRegistry._instance
+        CacheRegistry.setInstance(registry)
+        try:
+            holder = Cached()
+            holder.streamId = self.ids[0]
+            self.assertIs(holder.disk, registry.cacheOf(self.ids[0]))
+            self.assertIs(holder.diskOf(self.ids[1]), registry.cacheOf(self.ids[1]))
+        finally:
+            CacheRegistry.setInstance(prior)
+
+    def test_cached_comes_from_the_neuron_if_there_is_one(self):
+        neuron = Cache(id=self.ids[0], loc=self.folder)
+
+        class Start:
+            def cacheOf(self, streamId):
+                return neuron
+
+        start = types.ModuleType('satorineuron.init.start')
+        start.getStart = lambda: Start()
+        modules = {
+            'satorineuron': types.ModuleType('satorineuron'),
+            'satorineuron.init': types.ModuleType('satorineuron.init'),
+            'satorineuron.init.start': start}
+        with mock.patch.dict(sys.modules, modules):
+            holder = Cached()
+            holder.streamId = self.ids[0]
+            self.assertIs(holder.disk, neuron)
+            self.assertIs(holder.diskOf(self.ids[0]), neuron)
+
+
+if __name__ == '__main__':
+    unittest.main()
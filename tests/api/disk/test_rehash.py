@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache
+from satorilib.disk.merkle import MerkleSummary
+from satorilib.disk.filetypes.csv import CSVManager
+
+
+class TestPartialRehash(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.times = [
+            f'2024-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}.000000'
+            for i in range(0, 6000, 2)]
+        self.cache = Cache(
+            id=StreamId(source='s', author='a', stream='x', target='t'),
+            loc=self.folder)
+        self.cache.write(pd.DataFrame(
+            {'value': [float(i) for i in range(len(self.times))]},
+            index=self.times))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def expected(self, late: pd.DataFrame) -> pd.DataFrame:
+        df = pd.concat([
+            pd.DataFrame(
+                {'value': [float(i) for i in range(len(self.times))]},
+                index=self.times),
+            late]).sort_index()
+        return historyHashes(df)
+
+    def assertConsistent(self, expected: pd.DataFrame):
+        pd.testing.assert_frame_equal(self.cache.df, expected, check_names=False)
+        pd.testing.assert_frame_equal(
+            CSVManager().read(self.cache.path()), expected, check_names=False)
+        self.assertEqual(
+            self.cache.merkle.levels,
+            MerkleSummary.build(expected['hash'].tolist()).levels)
+        self.assertTrue(self.cache.performValidation(entire=True)[0])
+
+    def test_merge_late_row(self):
+        late = pd.DataFrame({'value': [-1.0]}, index=['2024-01-01 01:30:01.000000'])
+        self.assertTrue(self.cache.merge(late.copy()))
+        self.assertConsistent(self.expected(late))
+        self.assertEqual(self.cache.checkedIndex, self.cache.df.index[-1])
+
+    def test_append_late_rows(self):
+        late = pd.DataFrame(
+            {'value': [-1.0, -2.0]},
+            index=['2024-01-01 01:00:01.000000', '2024-01-01 01:00:03.000000'])
+        self.assertTrue(self.cache.append(late.copy(), hashThis=True))
+        self.assertConsistent(self.expected(late))
+
+    def test_late_attributes(self):
+        result = self.cache.appendByAttributes(
+            value=-1.0,
+            timestamp='2024-01-01 00:00:01.000000',
+            hashThis=True)
+        self.assertTrue(result.success)
+        self.assertTrue(result.validated)
+        late = pd.DataFrame({'value': [-1.0]}, index=['2024-01-01 00:00:01.000000'])
+        expected = self.expected(late)
+        self.assertEqual(result.hash, expected['hash'].iloc[1])
+        self.assertConsistent(expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache
+from satorilib.disk.rollup import Rollups
+
+
+def stamp(seconds: int) -> str:
+    return str(pd.Timestamp('2024-01-01') + pd.Timedelta(seconds=int(seconds))) + '.000000'
+
+
+class TestRollups(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.streamId = StreamId(source='s', author='a', stream='x', target='t')
+        rng = np.random.default_rng(9)
+        seconds = np.sort(rng.choice(5 * 86400, size=3000, replace=False))
+        self.cache = Cache(id=self.streamId, loc=self.folder)
+        self.cache.write(historyHashes(pd.DataFrame(
+            {'value': rng.normal(size=len(seconds))},
+            index=[stamp(s) for s in seconds])))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def expected(self, frequency: str) -> pd.DataFrame:
+        ''' the long way: group every row by its bucket '''
+        values = pd.Series(
+            pd.to_numeric(self.cache.df['value'], errors='coerce').to_numpy(),
+            index=pd.to_datetime(self.cache.df.index)).dropna()
+        grouped = values.groupby(values.index.floor(frequency))
+        df = pd.DataFrame({
+            'count': grouped.count(),
+            'sum': grouped.sum(),
+            'min': grouped.min(),
+            'max': grouped.max(),
+            'last': grouped.last()})
+        df['mean'] = df['sum'] / df['count']
+        return df
+
+    def assertRolledUp(self, cache: Cache):
+        for resolution, frequency in [(3600, 'h'), (86400, 'D'), (2 * 86400, '2D')]:
+            pd.testing.assert_frame_equal(
+                cache.rollup(resolution),
+                self.expected(frequency),
+                check_names=False, check_freq=False, check_dtype=False)
+
+    def test_matches_a_full_scan(self):
+        self.assertRolledUp(self.cache)
+        hours = self.cache.rollup(3600, start='2024-01-02', end='2024-01-03')
+        self.assertEqual(hours.shape[0], 24)
+        self.assertEqual(hours.index[0], pd.Timestamp('2024-01-02'))
+
+    def test_kept_up_through_appends_and_late_rows(self):
+        self.cache.rollup()
+        rollups = self.cache._rollups
+        for seconds in range(5 * 86400, 5 * 86400 + 20000, 700):
+            self.cache.appendByAttributes(value=seconds / 1e5, timestamp=stamp(seconds), hashThis=True)
+            self.cache.appendByAttributes(value='not a number', timestamp=stamp(seconds + 1), hashThis=True)
+        self.assertIs(self.cache._rollups, rollups)
+        self.assertRolledUp(self.cache)
+        self.cache.appendByAttributes(value=50.0, timestamp=stamp(4 * 86400 + 17), hashThis=True)
+        self.assertRolledUp(self.cache)
+        # persisted with the stream, the open bucket caught up on load
+        self.assertEqual(Rollups.load(self.cache.sidecarPath('rollups.npz')).resolutions, (3600, 86400))
+        self.assertRolledUp(Cache(id=self.streamId, loc=self.folder))
+
+    def test_saved_every_so_many_buckets(self):
+        self.cache.rollup()
+        path = self.cache.sidecarPath('rollups.npz')
+        saved = Rollups.load(path).rows
+        self.cache._rollups.saveEvery = 4
+        for hour in range(3):
+            self.cache.appendByAttributes(value=1.0, timestamp=stamp(5 * 86400 + hour * 3600), hashThis=True)
+        self.assertEqual(Rollups.load(path).rows, saved)
+        # the fourth completed bucket (the first row closed the one before it)
+        self.cache.appendByAttributes(value=1.0, timestamp=stamp(5 * 86400 + 3 * 3600), hashThis=True)
+        self.assertEqual(Rollups.load(path).rows, saved + 4)
+        self.cache.appendByAttributes(value=2.0, timestamp=stamp(5 * 86400 + 5 * 3600), hashThis=True)
+        # what wasn't saved is caught up from the rows
+        self.assertRolledUp(Cache(id=self.streamId, loc=self.folder))
+
+
+if __name__ == '__main__':
+    unittest.main()
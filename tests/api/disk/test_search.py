@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache
+
+
+def stamp(second: int, micros: int = 0) -> str:
+    return f'2024-01-01 {second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}.{micros:06d}'
+
+
+class TestCacheSearch(unittest.TestCase):
+    ''' the bisecting paths give what masking the whole frame would '''
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(200)]},
+            index=[stamp(i) for i in range(200)]))
+        self.cache = Cache(
+            id=StreamId(source='s', author='a', stream='x', target='t'),
+            loc=self.folder)
+        self.cache.write(self.df.iloc[:150])
+        # kept up as rows are buffered rather than rebuilt from the frame
+        self.cache.merkle
+        self.cache.rollup()
+        # before, at and after the edges, between rows and inside the buffer
+        self.probes = [
+            '2023-12-31 23:59:59.000000',
+            stamp(0), stamp(0, 1), stamp(1), stamp(75), stamp(75, 500000),
+            stamp(149), stamp(149, 1), stamp(150), stamp(160), stamp(199),
+            stamp(199, 1), '2024-01-02 00:00:00.000000']
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def buffer(self):
+        ''' appended in order, left in the buffer rather than the frame '''
+        self.cache.appendNewest(list(zip(
+            self.df.index[150:],
+            self.df['value'].iloc[150:],
+            self.df['hash'].iloc[150:])))
+        self.assertEqual(len(self.cache._tail), 50)
+
+    def assertMatchesMasks(self, df: pd.DataFrame):
+        probes = self.probes
+        for start in [None] + probes:
+            for end in [None] + probes:
+                mask = np.ones(df.shape[0], dtype=bool)
+                if start is not None:
+                    mask &= df.index >= start
+                if end is not None:
+                    mask &= df.index < end
+                expected = df[mask]
+                pd.testing.assert_frame_equal(
+                    self.cache.between(start, end), expected,
+                    check_names=False, obj=f'between({start}, {end})')
+        for time in probes:
+            for kind, expected in [
+                ('before', df[df.index < time]),
+                ('after', df[df.index > time]),
+                ('exact', df[df.index == time]),
+            ]:
+                pd.testing.assert_frame_equal(
+                    self.cache.search(time, **{kind: True}), expected,
+                    check_names=False, obj=f'search({time}, {kind})')
+        self.assertIsNone(self.cache.search(stamp(5)))
+        self.assertIsNone(self.cache.search(None, before=True))
+
+    def test_bisected(self):
+        self.assertIsNotNone(self.cache.times)
+        self.assertMatchesMasks(self.df.iloc[:150])
+
+    def test_unconsolidated_buffer(self):
+        self.buffer()
+        self.assertMatchesMasks(self.df)
+        self.assertEqual(len(self.cache._tail), 50)
+
+    def test_compact_with_buffer(self):
+        self.assertTrue(self.cache.compact())
+        self.buffer()
+        self.assertMatchesMasks(self.df)
+        self.assertTrue(self.cache.isCompact)
+
+    def test_unparsable_times_fall_back_to_masks(self):
+        self.buffer()
+        self.assertIsNone(self.cache.positionsOf('not a time'))
+        self.probes = ['', 'not a time', '2024-13-45 00:00:00.000000', 'zzz']
+        self.assertMatchesMasks(self.df)
+
+    def test_unordered_index_falls_back_to_masks(self):
+        unordered = self.df.iloc[[5, 1, 7, 3, 150, 2]]
+        self.cache.df = unordered
+        self.assertIsNone(self.cache.times)
+        self.assertMatchesMasks(unordered)
+
+
+if __name__ == '__main__':
+    unittest.main()
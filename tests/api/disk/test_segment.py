@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.disk.filetypes.segment import SegmentManager
+
+
+class TestSegmentManager(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'aggregate.seg')
+        self.manager = SegmentManager(segmentRows=2)
+        self.df = pd.DataFrame(
+            {
+                'value': [1.5, 2.5, 3.5],
+                'hash': ['4d8f695a04b7e36e', 'd4c54b832c15f52a', '']},
+            index=[
+                '2024-01-01 00:00:00.000000',
+                '2024-01-01 00:00:01.000000',
+                '2024-01-01 00:00:02.000000'])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_write_read(self):
+        self.assertTrue(self.manager.write(self.path, self.df.copy()))
+        self.assertEqual(len(self.manager.segments(self.path)), 2)
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+
+    def test_append_rolls_segments(self):
+        self.manager.write(self.path, self.df.iloc[:1].copy())
+        self.manager.append(self.path, self.df.iloc[1:].copy())
+        self.assertEqual(len(self.manager.segments(self.path)), 2)
+        pd.testing.assert_frame_equal(self.manager.read(self.path), self.df)
+
+    def test_read_lines(self):
+        self.manager.write(self.path, self.df.copy())
+        pd.testing.assert_frame_equal(
+            self.manager.readLines(self.path, 1, 3),
+            self.df.iloc[1:3])
+
+    def test_missing(self):
+        self.assertIsNone(self.manager.read(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import shutil
+import tempfile
+import threading
+import unittest
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache
+
+
+class TestCacheSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(600)]},
+            index=[f'2024-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}.000000' for i in range(600)]))
+        self.cache = Cache(
+            id=StreamId(source='s', author='a', stream='x', target='t'),
+            loc=self.folder)
+        self.cache.write(self.df.iloc[:100])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def append(self, first: int, last: int):
+        return self.cache.appendNewest(list(zip(
+            self.df.index[first:last],
+            self.df['value'].iloc[first:last],
+            self.df['hash'].iloc[first:last])))
+
+    def test_snapshot_is_unaffected_by_writes(self):
+        before = self.cache.snapshot()
+        self.assertIs(self.cache.snapshot(), before)
+        self.append(100, 110)
+        after = self.cache.snapshot()
+        self.assertIsNot(after, before)
+        self.assertEqual(before.rowCount, 100)
+        self.assertEqual(after.rowCount, 110)
+        self.cache.write(self.df.iloc[:50])
+        pd.testing.assert_frame_equal(before.df, self.df.iloc[:100], check_names=False)
+        pd.testing.assert_frame_equal(after.df, self.df.iloc[:110], check_names=False)
+
+    def test_buffered_rows_are_found(self):
+        self.append(100, 110)
+        self.assertTrue(self.cache.contains(self.df.index[105]))
+        self.assertEqual(self.cache.getHashBefore(self.df.index[105]), self.df['hash'].iloc[104])
+        self.assertEqual(self.cache.getLatestObservationTime(), self.df.index[109])
+        pd.testing.assert_frame_equal(
+            self.cache.between(self.df.index[95], self.df.index[105]),
+            self.df.iloc[95:105],
+            check_names=False)
+
+    def test_readers_during_ingest(self):
+        failures = []
+
+        def read():
+            for _ in range(200):
+                snapshot = self.cache.snapshot()
+                latest = snapshot.latestTime()
+                rows = snapshot.search(latest, before=True)
+                if rows.shape[0] != snapshot.rowCount - 1:
+                    failures.append((rows.shape[0], snapshot.rowCount))
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for i in range(100, 600, 5):
+            self.append(i, i + 5)
+        for reader in readers:
+            reader.join()
+        self.assertEqual(failures, [])
+        self.assertEqual(self.cache.rowCount, 600)
+
+    def test_df_during_evict_and_append(self):
+        failures = []
+        done = threading.Event()
+
+        def read():
+            while not done.is_set():
+                df = self.cache.df
+                if df is None or df.shape[0] < 100:
+                    failures.append(None if df is None else df.shape[0])
+
+        def evict():
+            while not done.is_set():
+                self.cache.evict()
+                self.cache.snapshot()
+
+        threads = [threading.Thread(target=read) for _ in range(3)]
+        threads.append(threading.Thread(target=evict))
+        for thread in threads:
+            thread.start()
+        for i in range(100, 600, 5):
+            self.append(i, i + 5)
+        done.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+        pd.testing.assert_frame_equal(self.cache.df, self.df, check_names=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.disk.filetypes.sqlite import SqliteManager
+
+
+class TestSqliteManager(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.manager = SqliteManager(os.path.join(self.folder, 'streams.db'))
+        self.df = pd.DataFrame(
+            {
+                'value': [float(i) for i in range(10)],
+                'hash': [f'{i + 1:x}' * 16 for i in range(10)]},
+            index=[f'2024-01-01 00:00:0{i}.000000' for i in range(10)])
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_write_read(self):
+        self.assertTrue(self.manager.write('stream', self.df.copy()))
+        pd.testing.assert_frame_equal(self.manager.read('stream'), self.df)
+        self.assertIsNone(self.manager.read('missing'))
+
+    def test_append_replaces_same_time(self):
+        self.manager.append('stream', self.df.iloc[:6].copy())
+        self.manager.append('stream', self.df.iloc[5:].copy())
+        pd.testing.assert_frame_equal(self.manager.read('stream'), self.df)
+        self.assertEqual(self.manager.count('stream'), 10)
+        self.assertEqual(self.manager.lastTime('stream'), self.df.index[-1])
+        self.assertIsNone(self.manager.lastTime('missing'))
+
+    def test_lookups(self):
+        self.manager.write('stream', self.df.copy())
+        pd.testing.assert_frame_equal(
+            self.manager.lookup('stream', self.df.index[3]), self.df.iloc[3:4])
+        pd.testing.assert_frame_equal(
+            self.manager.readBetween('stream', self.df.index[2], self.df.index[5]),
+            self.df.iloc[2:5])
+        pd.testing.assert_frame_equal(
+            self.manager.readLines('stream', 4, 7), self.df.iloc[4:7])
+        pages = list(self.manager.iterate('stream', batchSize=4))
+        self.assertEqual([p.shape[0] for p in pages], [4, 4, 2])
+        pd.testing.assert_frame_equal(pd.concat(pages), self.df)
+
+
+if __name__ == '__main__':
+    unittest.main()
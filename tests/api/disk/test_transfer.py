@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache
+from satorilib.disk.filetypes.csv import CSVManager
+from satorilib.disk.filetypes.sqlite import SqliteManager
+from satorilib.disk.filetypes.arrow import ArrowManager
+from satorilib.disk.filetypes.block import BlockManager
+from satorilib.disk.filetypes.segment import SegmentManager
+from satorilib.disk.merkle import MerkleSummary
+from satorilib.disk import transfer
+
+
+class TestTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [i / 4 for i in range(2500)]},
+            index=[f'2024-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}.000000' for i in range(2500)]))
+        self.source = os.path.join(self.folder, 'export.csv')
+        CSVManager().write(self.source, self.df)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_readers_agree(self):
+        arrow = list(transfer._readChunksArrow(self.source, 300))
+        pandas = list(transfer._readChunksPandas(self.source, 300))
+        self.assertEqual(max(chunk.shape[0] for chunk in arrow), 300)
+        pd.testing.assert_frame_equal(pd.concat(arrow), pd.concat(pandas))
+        pd.testing.assert_frame_equal(pd.concat(arrow), self.df, check_names=False)
+
+    def test_round_trip(self):
+        target = os.path.join(self.folder, 'stream.csv')
+        result = transfer.importHistory(self.source, CSVManager(indexEvery=100), target, chunkRows=300)
+        self.assertTrue(result.complete)
+        self.assertEqual(result.rows, 2500)
+        pd.testing.assert_frame_equal(CSVManager().read(target), self.df, check_names=False)
+        sqlite = SqliteManager(os.path.join(self.folder, 'streams.db'))
+        sqlite.write('stream', self.df)
+        exported = os.path.join(self.folder, 'again.csv')
+        result = transfer.exportHistory(sqlite, 'stream', exported, chunkRows=300)
+        sqlite.close()
+        self.assertTrue(result.complete)
+        with open(self.source, 'rb') as a, open(exported, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_stops_at_broken_chain(self):
+        broken = self.df.copy()
+        broken.iloc[1234, 0] = -1.0
+        CSVManager().write(self.source, broken)
+        target = os.path.join(self.folder, 'stream.csv')
+        manager = CSVManager(indexEvery=100)
+        manager.write(target, self.df.iloc[:50])
+        result = transfer.importHistory(self.source, manager, target, chunkRows=300)
+        self.assertFalse(result.complete)
+        self.assertEqual(result.rows, 1234)
+        self.assertEqual(result.tip[0], self.df.index[1233])
+        # what we had is left alone
+        pd.testing.assert_frame_equal(manager.read(target), self.df.iloc[:50], check_names=False)
+        self.assertEqual(manager.lineIndex(target).rows, 50)
+        self.assertEqual(sorted(os.listdir(self.folder)), ['export.csv', 'stream.csv'])
+
+    def test_swapped_in_for_every_format(self):
+        CSVManager().write(self.source, self.df.iloc[:700])
+        for name, manager in [
+            ('stream.csv', CSVManager(indexEvery=100)),
+            ('stream.arrow', ArrowManager()),
+            ('stream.blk', BlockManager(blockRows=100)),
+            ('stream.seg', SegmentManager()),
+            ('stream', SqliteManager(os.path.join(self.folder, 'streams.db'))),
+        ]:
+            target = name if isinstance(manager, SqliteManager) else os.path.join(self.folder, name)
+            manager.write(target, self.df.iloc[1000:1100].copy())
+            manager.append(target, self.df.iloc[1100:1110].copy())
+            result = transfer.importHistory(self.source, manager, target, chunkRows=300)
+            self.assertTrue(result.complete)
+            pd.testing.assert_frame_equal(
+                manager.read(target), self.df.iloc[:700], check_names=False, obj=name)
+            self.assertEqual(manager.lastTime(target), self.df.index[699])
+            self.assertTrue(manager.append(target, self.df.iloc[700:710].copy()))
+            pd.testing.assert_frame_equal(
+                manager.read(target), self.df.iloc[:710], check_names=False, obj=name)
+            if isinstance(manager, SqliteManager):
+                self.assertEqual(manager.streams(), ['stream'])
+                manager.close()
+        self.assertEqual(
+            sorted(os.listdir(self.folder)),
+            ['export.csv', 'stream.arrow', 'stream.blk', 'stream.csv', 'stream.seg', 'streams.db'])
+
+    def test_cache_import(self):
+        cache = Cache(id=StreamId(source='s', author='a', stream='x', target='t'), loc=self.folder)
+        result = cache.importFrom(self.source, chunkRows=300)
+        self.assertTrue(result.complete)
+        self.assertTrue(cache.isEvicted)
+        self.assertEqual(cache.rowCount, 2500)
+        self.assertEqual(cache.checkedIndex, self.df.index[-1])
+        self.assertEqual(cache.merkle.root, MerkleSummary.build(self.df['hash'].tolist()).root)
+        pd.testing.assert_frame_equal(cache.df, self.df, check_names=False)
+
+    def test_cache_keeps_its_history_when_the_import_is_bad(self):
+        cache = Cache(id=StreamId(source='s', author='a', stream='x', target='t'), loc=self.folder)
+        cache.write(self.df.iloc[:50])
+        cache.evict()
+        broken = self.df.copy()
+        broken.iloc[3, 0] = -1.0
+        CSVManager().write(self.source, broken)
+        result = cache.importFrom(self.source, chunkRows=300)
+        self.assertFalse(result.complete)
+        self.assertEqual(result.rows, 3)
+        # not reloaded just to find the block size
+        self.assertTrue(cache.isEvicted)
+        self.assertEqual(cache.rowCount, 50)
+        pd.testing.assert_frame_equal(cache.df, self.df.iloc[:50], check_names=False)
+        pd.testing.assert_frame_equal(
+            Cache(id=cache.id, loc=self.folder).df, self.df.iloc[:50], check_names=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import pandas as pd
+from satorilib.concepts import StreamId
+from satorilib.utils.hash import historyHashes
+from satorilib.disk.cache import Cache
+from satorilib.disk.wal import WriteAheadLog
+from satorilib.disk.filetypes import fileManagerFor
+from satorilib.disk.filetypes.csv import CSVManager
+
+
+class TestWriteAheadLog(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.logPath = os.path.join(self.folder, 'wal.log')
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(40)]},
+            index=[f'2024-01-01 00:00:{i:02d}.000000' for i in range(40)]))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def rows(self, first: int, last: int):
+        return list(zip(
+            self.df.index[first:last],
+            self.df['value'].iloc[first:last],
+            self.df['hash'].iloc[first:last]))
+
+    def test_caches_share_the_log(self):
+        wal = WriteAheadLog(self.logPath, foldInterval=3600)
+        caches = [
+            Cache(id=StreamId(source='s', author='a', stream=str(i), target='t'), loc=self.folder, wal=wal)
+            for i in range(3)]
+        for cache in caches:
+            cache.write(self.df.iloc[:10])
+        for i in range(10, 40):
+            for cache in caches:
+                self.assertTrue(cache.appendNewest(self.rows(i, i + 1)))
+        self.assertGreater(wal.pending, 0)
+        self.assertEqual(wal.fold(), 90)
+        self.assertEqual(wal.pending, 0)
+        for cache in caches:
+            pd.testing.assert_frame_equal(
+                CSVManager().read(cache.path()), self.df, check_names=False)
+        wal.close()
+
+    def test_replay_after_crash(self):
+        path = os.path.join(self.folder, 'stream.csv')
+        CSVManager().write(path, self.df.iloc[:10])
+        wal = WriteAheadLog(self.logPath, foldInterval=3600)
+        wal.append(path, self.df.iloc[10:20], durable=True)
+        wal.append(path, self.df.iloc[20:30], durable=True)
+        # die without folding, the second batch already made it to the file
+        wal.stopped.set()
+        wal.thread.join()
+        CSVManager().append(path, self.df.iloc[10:20])
+        with open(self.logPath, 'ab') as f:
+            f.write(b'["torn')
+        wal = WriteAheadLog(self.logPath, foldInterval=3600)
+        pd.testing.assert_frame_equal(
+            CSVManager().read(path), self.df.iloc[:30], check_names=False)
+        wal.close()
+
+    def test_replay_skips_what_any_format_already_has(self):
+        for ext in ['seg', 'arrow', 'parquet', 'blk']:
+            path = os.path.join(self.folder, f'stream.{ext}')
+            manager = fileManagerFor(ext)
+            manager.write(path, self.df.iloc[:10].copy())
+            wal = WriteAheadLog(self.logPath, foldInterval=3600)
+            wal.append(path, self.df.iloc[10:20], durable=True)
+            wal.append(path, self.df.iloc[20:30], durable=True)
+            wal.stopped.set()
+            wal.thread.join()
+            manager.append(path, self.df.iloc[10:20].copy())
+            wal = WriteAheadLog(self.logPath, foldInterval=3600)
+            # as stored, reads would hide duplicates
+            stored = manager.readLines(path, 0, 100)
+            self.assertEqual(stored.index.tolist(), self.df.index[:30].tolist(), ext)
+            wal.close()
+
+    def test_durable_appends_through_folds(self):
+        path = os.path.join(self.folder, 'stream.csv')
+        CSVManager().write(path, self.df.iloc[:1])
+        wal = WriteAheadLog(self.logPath, syncInterval=3600, foldInterval=3600)
+        for i in range(1, 40):
+            # a fold that starts the log over while an appender waits
+            appender = threading.Thread(
+                target=wal.append,
+                args=(path, self.df.iloc[i:i + 1]),
+                kwargs={'durable': True})
+            appender.start()
+            while wal.pending == 0:
+                pass
+            wal.fold()
+            appender.join(timeout=5)
+            self.assertFalse(appender.is_alive())
+        pd.testing.assert_frame_equal(CSVManager().read(path), self.df, check_names=False)
+        wal.stopped.set()
+        wal.thread.join()
+
+    def test_late_rows_reach_the_file(self):
+        wal = WriteAheadLog(self.logPath, foldInterval=3600)
+        cache = Cache(id=StreamId(source='s', author='a', stream='x', target='t'), loc=self.folder, wal=wal)
+        cache.write(self.df.iloc[[0, 1, 2, 4, 5, 6, 7, 8, 9, 10]][['value']].assign(hash=''))
+        late = pd.DataFrame({'value': [3.0]}, index=[self.df.index[3]])
+        self.assertTrue(cache.append(late))
+        wal.fold()
+        stored = CSVManager().readLines(cache.path(), 0, 100)
+        self.assertEqual(sorted(stored.index.tolist()), self.df.index[:11].tolist())
+        self.assertEqual(CSVManager().read(cache.path()).loc[self.df.index[3], 'value'], 3.0)
+        # a late row folded right before a crash isn't replayed twice
+        path = os.path.join(self.folder, 'stream.csv')
+        CSVManager().write(path, self.df.iloc[[0, 1, 2, 4, 5]])
+        wal.append(path, self.df.iloc[[3]], durable=True)
+        wal.stopped.set()
+        wal.thread.join()
+        CSVManager().append(path, self.df.iloc[[3]])
+        wal = WriteAheadLog(self.logPath, foldInterval=3600)
+        self.assertEqual(CSVManager().readLines(path, 0, 100).shape[0], 6)
+        wal.close()
+
+if __name__ == '__main__':
+    unittest.main()
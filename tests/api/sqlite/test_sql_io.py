@@ -0,0 +1,201 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+import pandas as pd
+from satorilib.sqlite import sql_io
+from satorilib.sqlite.sql_io import Pool
+
+
+class CountingPool(Pool):
+    ''' counts the transactions the writer commits '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commits = 0
+
+    def _commit(self, conn):
+        if conn.in_transaction:
+            self.commits += 1
+        super()._commit(conn)
+
+
+class FailingBegin:
+    ''' a connection whose BEGIN fails while armed '''
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.armed = False
+
+    def execute(self, sql: str, *args):
+        if self.armed and sql == 'BEGIN':
+            raise sqlite3.OperationalError('begin failed')
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name: str):
+        return getattr(self.conn, name)
+
+
+class FailingBeginPool(Pool):
+    ''' hands the writer a connection whose BEGIN can be made to fail '''
+
+    def connect(self):
+        self.writerConn = FailingBegin(super().connect())
+        return self.writerConn
+
+
+class TestPool(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.database = os.path.join(self.folder, 'test.db')
+        self.pool = CountingPool(self.database)
+        self.pool.write(lambda conn: conn.execute('create table t (i integer)'))
+
+    def tearDown(self):
+        self.pool.close()
+        sql_io.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def count(self) -> int:
+        with self.pool.reader() as conn:
+            return conn.execute('select count(*) from t').fetchone()[0]
+
+    def test_writes_queued_together_commit_once(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def hold(conn):
+            started.set()
+            release.wait()
+
+        commits = self.pool.commits
+        first = self.pool.submit(hold)
+        started.wait()
+        futures = []
+        threads = [
+            threading.Thread(target=lambda i=i: futures.append(self.pool.submit(
+                lambda conn: conn.execute('insert into t values (?)', (i,)))))
+            for i in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        release.set()
+        first.result()
+        for future in futures:
+            future.result()
+        self.assertEqual(self.pool.commits - commits, 2)
+        self.assertEqual(self.count(), 50)
+
+    def test_a_failed_write_only_fails_itself(self):
+        started = threading.Event()
+        release = threading.Event()
+        self.pool.submit(lambda conn: started.set() or release.wait())
+        started.wait()
+        good = self.pool.submit(lambda conn: conn.execute('insert into t values (1)'))
+        bad = self.pool.submit(lambda conn: (
+            conn.execute('insert into t values (2)'),
+            conn.execute('insert into missing values (3)')))
+        after = self.pool.submit(lambda conn: conn.execute('insert into t values (4)'))
+        release.set()
+        good.result()
+        after.result()
+        with self.assertRaises(sqlite3.OperationalError):
+            bad.result()
+        with self.pool.reader() as conn:
+            self.assertEqual(
+                [row[0] for row in conn.execute('select i from t order by i')],
+                [1, 4])
+        with self.assertRaises(sqlite3.OperationalError):
+            self.pool.write(lambda conn: conn.executescript('insert into missing values (5);'), script=True)
+        self.pool.write(lambda conn: conn.execute('insert into t values (6)'))
+        self.assertEqual(self.count(), 3)
+
+    def test_a_failed_begin_fails_the_whole_group(self):
+        pool = FailingBeginPool(self.database)
+        self.addCleanup(pool.close)
+        started = threading.Event()
+        release = threading.Event()
+        pool.submit(lambda conn: started.set() or release.wait())
+        started.wait()
+        futures = [
+            pool.submit(lambda conn, i=i: conn.execute('insert into t values (?)', (i,)))
+            for i in range(3)]
+        pool.writerConn.armed = True
+        release.set()
+        for future in futures:
+            with self.assertRaises(sqlite3.OperationalError):
+                future.result(timeout=5)
+        pool.writerConn.armed = False
+        pool.write(lambda conn: conn.execute('insert into t values (3)'))
+        self.assertEqual(self.count(), 1)
+
+    def test_close_closes_lent_readers(self):
+        with self.pool.reader() as lent:
+            with self.pool.reader() as idle:
+                pass
+            self.pool.close()
+            with self.assertRaises(sqlite3.ProgrammingError):
+                idle.execute('select 1')
+            self.assertEqual(lent.execute('select count(*) from t').fetchone()[0], 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            lent.execute('select 1')
+        self.assertEqual(self.pool.opened, 0)
+        # still usable afterwards
+        self.pool.write(lambda conn: conn.execute('insert into t values (1)'))
+        self.assertEqual(self.count(), 1)
+
+    def test_readers_wait_for_room(self):
+        pool = Pool(self.database, readers=1)
+        results = []
+
+        def read():
+            with pool.reader() as conn:
+                results.append(conn.execute('select 1').fetchone()[0])
+
+        with pool.reader():
+            waiting = threading.Thread(target=read)
+            waiting.start()
+            waiting.join(0.3)
+            self.assertEqual(results, [])
+            pool.close()
+        waiting.join()
+        self.assertEqual(results, [1])
+        pool.close()
+
+
+class TestExecute(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.database = os.path.join(self.folder, 'test.db')
+
+    def tearDown(self):
+        sql_io.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_rows_fetched_on_the_writer(self):
+        sql_io.execute(query='create table t (i integer, s text);', database=self.database)
+        inserted = sql_io.execute(
+            query='insert into t values (?, ?)', params=[1, 'a'], database=self.database)
+        self.assertEqual(inserted.rowcount, 1)
+        sql_io.write(
+            data=pd.DataFrame({'i': [2, 3], 's': ['b', 'c']}),
+            table='t', database=self.database)
+        fetched = sql_io.execute(query='select i, s from t order by i', database=self.database)
+        self.assertNotIsInstance(fetched, sqlite3.Cursor)
+        self.assertEqual([d[0] for d in fetched.description], ['i', 's'])
+        self.assertEqual(fetched.fetchone(), (1, 'a'))
+        self.assertEqual(fetched.fetchmany(1), [(2, 'b')])
+        self.assertEqual(fetched.fetchall(), [(3, 'c')])
+        self.assertIsNone(fetched.fetchone())
+        self.assertEqual(
+            sql_io.read('select s from t', database=self.database)['s'].tolist(),
+            ['a', 'b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
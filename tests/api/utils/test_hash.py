@@ -0,0 +1,131 @@
+import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from satorilib.utils.hash import (
+    hashIt,
+    historyHashes,
+    verifyRoot,
+    verifyHashes,
+    verifyHashesReturnError,
+    verifyHashesReturnLastGood,
+    verifyHashesParallel,
+    cleanHashes)
+
+
+class TestHashChain(unittest.TestCase):
+
+    def setUp(self):
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [1.5, 2.5, 3.5, 4.5, 5.5]},
+            index=[f'2024-01-01 00:00:0{i}.000000' for i in range(5)]))
+
+    def test_history_hashes(self):
+        priorRowHash = ''
+        for index, row in self.df.iterrows():
+            priorRowHash = hashIt(priorRowHash + str(index) + str(row['value']))
+            self.assertEqual(row['hash'], priorRowHash)
+        self.assertTrue(verifyRoot(self.df))
+
+    def test_verify_good(self):
+        self.assertEqual(verifyHashes(self.df), (True, None))
+        self.assertEqual(verifyHashesReturnError(self.df), (True, None))
+        success, row = verifyHashesReturnLastGood(self.df)
+        self.assertTrue(success)
+        self.assertEqual(row.hash, self.df.iloc[-1].hash)
+        success, cleaned = cleanHashes(self.df)
+        self.assertTrue(success)
+        self.assertTrue(cleaned.equals(self.df))
+
+    def test_verify_bad(self):
+        bad = self.df.copy()
+        bad.iloc[2, 0] = 9.9
+        success, lastGood = verifyHashes(bad)
+        self.assertFalse(success)
+        self.assertEqual(lastGood.index[0], bad.index[1])
+        success, error = verifyHashesReturnError(bad)
+        self.assertEqual(error.index[0], bad.index[2])
+        success, lastGood = verifyHashesReturnLastGood(bad)
+        self.assertEqual(lastGood.index[0], bad.index[1])
+        success, cleaned = cleanHashes(bad)
+        self.assertTrue(success)
+        self.assertEqual(list(cleaned.index), list(bad.index[:2]))
+
+    def test_continues_from_prior(self):
+        tail = self.df.iloc[3:].copy()
+        self.assertTrue(verifyHashes(tail, priorRowHash=self.df.iloc[2].hash)[0])
+        self.assertFalse(verifyHashes(tail)[0])
+
+
+
+class TestVerifyHashesParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.df = historyHashes(pd.DataFrame(
+            {'value': [float(i) for i in range(1000)]},
+            index=[f'2024-01-01 00:{i // 60:02d}:{i % 60:02d}.000000' for i in range(1000)]))
+
+    def assertSame(self, df: pd.DataFrame, **kwargs):
+        ''' the pool's answer is the serial one, whatever the segments '''
+        success, row = verifyHashesParallel(df, workers=2, minimum=0, **kwargs)
+        expected, lastGood = verifyHashes(df, priorRowHash=kwargs.get('priorRowHash'))
+        self.assertEqual(success, expected)
+        if success:
+            self.assertEqual(row.name, df.index[-1])
+        elif lastGood is None:
+            self.assertIsNone(row)
+        else:
+            pd.testing.assert_frame_equal(row, lastGood)
+        return success, row
+
+    def tampered(self, *rows: int, column: int = 0) -> pd.DataFrame:
+        df = self.df.copy()
+        for i in rows:
+            df.iloc[i, column] = 'ffffffffffffffff' if column == 1 else -1.0
+        return df
+
+    def test_good(self):
+        self.assertSame(self.df)
+        self.assertSame(self.df, boundaries=[1, 300, 999, 5000])
+        self.assertSame(self.df.iloc[400:], priorRowHash=self.df['hash'].iloc[399], boundaries=[100])
+
+    def test_bad_row_in_first_and_later_segments(self):
+        for rows in [(0,), (3,), (3, 600), (600,), (999,)]:
+            success, row = self.assertSame(self.tampered(*rows), boundaries=[300, 700])
+            self.assertFalse(success)
+            if rows[0] == 0:
+                self.assertIsNone(row)
+            else:
+                self.assertEqual(row.index[0], self.df.index[rows[0] - 1])
+
+    def test_segments_seeded_from_the_row_before(self):
+        # segments are every 125 rows plus the boundaries, whichever side of
+        # a cut the bad row is on the first one is found
+        for i in [124, 125, 126, 299, 300, 301]:
+            self.assertSame(self.tampered(i), boundaries=[300])
+            self.assertSame(self.tampered(i, column=1), boundaries=[300])
+        # a wrong hash before a cut is what the next segment starts from
+        success, row = self.assertSame(self.tampered(299, column=1), boundaries=[300])
+        self.assertEqual(row.index[0], self.df.index[298])
+        self.assertFalse(verifyHashesParallel(
+            self.df.iloc[300:], priorRowHash='ffffffffffffffff', workers=2, minimum=0)[0])
+
+    def test_small_frames_are_verified_serially(self):
+        with mock.patch('satorilib.utils.hash.ProcessPoolExecutor', side_effect=AssertionError):
+            success, row = verifyHashesParallel(self.tampered(500), workers=2)
+            self.assertEqual((success, row.index[0]), (False, self.df.index[499]))
+            self.assertTrue(verifyHashesParallel(self.df, workers=1, minimum=0)[0])
+            self.assertEqual(verifyHashesParallel(self.df.iloc[:0]), (True, None))
+
+    def test_workers_are_not_forked(self):
+        with mock.patch(
+            'satorilib.utils.hash.ProcessPoolExecutor',
+            wraps=ProcessPoolExecutor,
+        ) as pool:
+            self.assertSame(self.df)
+        self.assertNotEqual(
+            pool.call_args.kwargs['mp_context'].get_start_method(), 'fork')
+
+
+if __name__ == '__main__':
+    unittest.main()